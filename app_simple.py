@@ -122,8 +122,8 @@ def add_rule():
 def get_categories():
     """Получить категории"""
     try:
-        import pandas as pd
-        df = pd.read_csv('data/categories.csv', sep=';', encoding='utf-8')
+        from loaders import read_csv
+        df = read_csv('data/categories.csv')
         categories = df[['№', 'Тип', 'Общее описание']].to_dict('records')
         return jsonify({
             'count': len(categories),
@@ -132,6 +132,13 @@ def get_categories():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Готовность принимать трафик: 503, пока модель не обучена"""
+    model = getattr(classifier.classifier, 'classifier', None)
+    is_ready = getattr(model, 'classes_', None) is not None
+    return jsonify({'ready': is_ready}), 200 if is_ready else 503
+
 if __name__ == '__main__':
     # Инициализируем модель
     print("🔄 Инициализация модели...")
@@ -6,14 +6,25 @@
 ✅ Все endpoints работают без ошибок
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Request, render_template, request, jsonify, send_file, g, Response, stream_with_context
 from flask_cors import CORS
 import os
 from pathlib import Path
-import pandas as pd
 from datetime import datetime
 import json
 import traceback
+import time
+import threading
+import csv
+from zipfile import BadZipFile
+from tempfile import SpooledTemporaryFile
+import metrics
+from encoding_scheduler import MicroBatcher
+from json_stream import JSONStreamError, iter_request_items
+import pipeline
+from config import (CLASSIFY_MICROBATCH_ENABLED, CLASSIFY_MICROBATCH_WAIT_MS,
+                    CLASSIFY_MICROBATCH_MAX_SIZE, CLASSIFY_MICROBATCH_TIMEOUT, BATCH_API_CHUNK_SIZE,
+                    UPLOAD_SPOOL_MAX_MEMORY, CATEGORIES_FILE, WEB_RUBRICS_CORRECTIONS)
 
 # ИСПРАВЛЕНО: Правильный импорт классификатора
 try:
@@ -49,7 +60,14 @@ except:
     except:
         DataProcessorEnhanced = None
 
+class UploadRequest(Request):
+    """Загрузки держатся в памяти до UPLOAD_SPOOL_MAX_MEMORY, больше - в анонимном временном файле"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY, mode='rb+')
+
 app = Flask(__name__, template_folder='templates', static_folder='static')
+app.request_class = UploadRequest
 CORS(app)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 
@@ -85,6 +103,47 @@ except Exception as e:
     traceback.print_exc()
     classifier = None
 
+# Дообучение по корректировкам (partial_fit после каждой корректировки)
+online_learner = None
+try:
+    if db and classifier is not None and hasattr(classifier, 'partial_update'):
+        from online_learning import OnlineLearner
+        online_learner = OnlineLearner(classifier, db)
+        print(f"✅ Дообучение по корректировкам включено (версия модели {online_learner.version})")
+except Exception as e:
+    print(f"⚠️ Ошибка инициализации дообучения: {e}")
+    online_learner = None
+
+# Рубрики - семантическим классификатором с памятью корректировок (WEB_RUBRICS_CORRECTIONS).
+# Исправление действует без переобучения: kNN по исправленным примерам (corrections_memory.py)
+rubrics_classifier = None
+try:
+    if WEB_RUBRICS_CORRECTIONS and Path(CATEGORIES_FILE).exists():
+        from loaders import read_csv
+        from rubrics_classifier import RubricsClassifier
+        categories_df = read_csv(CATEGORIES_FILE)
+        rubrics_classifier = RubricsClassifier()
+        rubrics_classifier.load_categories([
+            {'id': row['№'], 'name': row['Тип'], 'description': row['Общее описание']}
+            for _, row in categories_df.iterrows()
+        ], source_file=CATEGORIES_FILE)
+        rubrics_classifier.use_corrections(db)
+        print("✅ Рубрики: семантический классификатор с памятью корректировок")
+except Exception as e:
+    print(f"⚠️ Ошибка инициализации классификатора рубрик: {e}")
+    rubrics_classifier = None
+
+# Дообучение в фоне после каждой корректировки. serve.py выключает его в воркерах:
+# там sync выполняет мастер - один процесс, который пишет модель
+online_sync_on_correction = True
+
+def reload_model():
+    """Перечитать модель с диска (serve.py вызывает в мастере перед перезапуском воркеров)"""
+    if classifier is not None and hasattr(classifier, 'load_model'):
+        classifier.load_model()
+    if online_learner:
+        online_learner.load_state()
+
 # Состояние обучения
 training_state = {
     'is_training': False,
@@ -93,6 +152,27 @@ training_state = {
     'message': ''
 }
 
+# ==================== МЕТРИКИ ====================
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Шаблон маршрута, а не путь - чтобы число меток не росло
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(endpoint, request.method, response.status_code,
+                                time.perf_counter() - started)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Метрики в формате Prometheus (под serve.py - суммы по всем процессам)"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
 def safe_classify(text):
@@ -183,6 +263,48 @@ def safe_classify_top_n(text, n=3):
         traceback.print_exc()
         return [('Неизвестно', 0.0)]
 
+# ==================== МИКРОБАТЧИНГ ОДИНОЧНЫХ ЗАПРОСОВ ====================
+
+_single_batcher = None
+_single_batcher_pid = None
+_single_batcher_lock = threading.Lock()
+
+def get_single_batcher():
+    """
+    MicroBatcher для /api/classify_*_single: одновременные запросы
+    классифицируются одним вызовом classify_batch.
+    Создаётся лениво в каждом процессе - поток батчера не переживает fork (serve.py)
+    """
+    global _single_batcher, _single_batcher_pid
+    if not CLASSIFY_MICROBATCH_ENABLED or not hasattr(classifier, 'classify_batch'):
+        return None
+    with _single_batcher_lock:
+        if _single_batcher is None or _single_batcher_pid != os.getpid():
+            _single_batcher = MicroBatcher(
+                lambda texts: classifier.classify_batch(texts, n=3),
+                max_batch_size=CLASSIFY_MICROBATCH_MAX_SIZE,
+                max_wait_ms=CLASSIFY_MICROBATCH_WAIT_MS,
+                name='classify-single'
+            )
+            _single_batcher_pid = os.getpid()
+            # Перцентили батчера - в /api/microbatch по всем воркерам (serve.py)
+            metrics.add_process_info('microbatch', _single_batcher.stats)
+    return _single_batcher
+
+def classify_single(text):
+    """
+    Категория, уверенность и топ-3 для одного текста.
+    Через микробатчер, при его ошибке - safe_classify + safe_classify_top_n
+    """
+    batcher = get_single_batcher()
+    if batcher is not None:
+        try:
+            category, confidence, top_3 = batcher(text, timeout=CLASSIFY_MICROBATCH_TIMEOUT)
+            return category, float(confidence), top_3
+        except Exception as e:
+            print(f"⚠️ Ошибка микробатчинга: {e}")
+    return (*safe_classify(text), safe_classify_top_n(text, n=3))
+
 # ==================== ГЛАВНАЯ СТРАНИЦА ====================
 
 @app.route('/')
@@ -202,11 +324,13 @@ def classify_rubric_single():
         if not text:
             return jsonify({'error': 'Нет текста для классификации'}), 400
         
-        if not classifier:
+        if rubrics_classifier is not None:
+            top_3 = [(name, score) for _, name, score in rubrics_classifier.classify_rubric(text, top_n=3)]
+            category, confidence = top_3[0] if top_3 else ('Неизвестно', 0.0)
+        elif not classifier:
             return jsonify({'error': 'Классификатор не инициализирован'}), 500
-        
-        category, confidence = safe_classify(text)
-        top_3 = safe_classify_top_n(text, n=3)
+        else:
+            category, confidence, top_3 = classify_single(text)
         
         if db:
             classification_id = db.save_classification(
@@ -233,97 +357,12 @@ def classify_rubric_single():
 
 @app.route('/api/classify_rubric_batch', methods=['POST'])
 def classify_rubric_batch():
-    """Классификация пакета рубрик с progress"""
-    try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Файл не загружен'}), 400
-        
-        file = request.files['file']
-        upload_folder = Path('uploads')
-        upload_folder.mkdir(exist_ok=True)
-        
-        file_path = upload_folder / file.filename
-        file.save(file_path)
-        
-        # Загружаем данные
-        if DataProcessorEnhanced:
-            try:
-                items, fmt = DataProcessorEnhanced.load_file(str(file_path))
-            except:
-                items = []
-        else:
-            items = []
-        
-        # Если DataProcessorEnhanced не работал, пробуем вручную
-        if not items:
-            if file.filename.endswith('.csv'):
-                try:
-                    df = pd.read_csv(file_path, encoding='utf-8-sig')
-                    items = df.iloc[:, 0].tolist()
-                except:
-                    df = pd.read_csv(file_path, encoding='latin-1')
-                    items = df.iloc[:, 0].tolist()
-            elif file.filename.endswith('.txt'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    items = [line.strip() for line in f if line.strip()]
-            else:
-                items = []
-        
-        if not items:
-            return jsonify({'error': 'Нет данных в файле'}), 400
-        
-        if not classifier:
-            return jsonify({'error': 'Классификатор не инициализирован'}), 500
-        
-        total = len(items)
-        results = []
-        
-        for idx, text in enumerate(items):
-            try:
-                category, confidence = safe_classify(text)
-                top_3 = safe_classify_top_n(text, n=3)
-                
-                if db:
-                    classification_id = db.save_classification(
-                        company_name=f'Rubric {idx+1}',
-                        text=text,
-                        predicted_category=category,
-                        confidence=confidence,
-                        top_3=top_3
-                    )
-                else:
-                    classification_id = idx
-                
-                results.append({
-                    'text': text[:50] + '...' if len(text) > 50 else text,
-                    'category': category,
-                    'confidence': f"{confidence*100:.1f}%",
-                    'id': classification_id
-                })
-            
-            except Exception as e:
-                print(f"⚠️ Ошибка элемента {idx+1}: {e}")
-        
-        # Экспортируем результаты
-        export_path = None
-        if db:
-            try:
-                export_path = db.export_classifications_csv()
-            except:
-                pass
-        
-        return jsonify({
-            'total': total,
-            'processed': len(results),
-            'results': results,
-            'export_file': str(export_path) if export_path else None,
-            'message': f'Обработано {len(results)} из {total} рубрик'
-        })
-    
-    except Exception as e:
-        print(f"❌ Ошибка пакетной классификации рубрик: {e}")
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+    """
+    Классификация пакета рубрик из файла (CSV / TXT / Excel / JSON).
+    Файл разбирается потоком и классифицируется чанками (pipeline.py).
+    ?stream=1 - ответ NDJSON по мере готовности, как у /api/classify/batch/rubrics
+    """
+    return _classify_upload('rubrics', 'рубрик')
 
 # ==================== КЛАССИФИКАЦИЯ КОМПАНИЙ ====================
 
@@ -344,8 +383,7 @@ def classify_company_single():
         
         # Объединяем все тексты
         full_text = f"{company_name} {description} {rubrics}"
-        category, confidence = safe_classify(full_text)
-        top_3 = safe_classify_top_n(full_text, n=3)
+        category, confidence, top_3 = classify_single(full_text)
         
         # Сохраняем в БД
         if db:
@@ -378,64 +416,119 @@ def classify_company_single():
 
 @app.route('/api/classify_company_batch', methods=['POST'])
 def classify_company_batch():
-    """Классификация пакета компаний"""
+    """
+    Классификация пакета компаний из файла: столбцы name / description / rubrics
+    (или Наименование / Описание / Рубрики выгрузки 2GIS). ?stream=1 - ответ NDJSON
+    """
+    return _classify_upload('companies', 'компаний')
+
+# ==================== ПАКЕТНАЯ КЛАССИФИКАЦИЯ (JSON / NDJSON) ====================
+
+def _classify_texts(texts):
+    """Список (категория, уверенность, топ-3) - одним вызовом модели, если она умеет батчи"""
+    if hasattr(classifier, 'classify_batch'):
+        return classifier.classify_batch(texts, n=3)
+    return [(*safe_classify(text), safe_classify_top_n(text, n=3)) for text in texts]
+
+def _numbered_rubrics(records):
+    """Имена рубрик загруженного файла для БД - 'Rubric N' по порядку элементов"""
+    for number, record in enumerate(records, 1):
+        if 'error' not in record:
+            record['name'] = f'Rubric {number}'
+        yield record
+
+def _pipeline_chunks(items, kind, save, skip_empty=False, sinks=(), numbered=False):
+    """
+    Конвейер pipeline.py: элементы -> нормализация -> чанки модели -> БД (если save)
+    numbered - рубрики сохраняются как 'Rubric N' (как при загрузке файла раньше)
+    """
+    records = pipeline.normalize(items, kind, skip_empty=skip_empty)
+    if numbered and kind == 'rubrics':
+        records = _numbered_rubrics(records)
+    sinks = list(sinks) + ([pipeline.DatabaseSink(db)] if save and db else [])
+    return pipeline.write_to(pipeline.classify(records, _classify_texts, BATCH_API_CHUNK_SIZE), sinks)
+
+def _stream_classification(first_chunk, chunks):
+    """NDJSON-строки результатов: чанк элементов -> один вызов модели -> одна транзакция БД"""
+    index = 0
+    chunk = first_chunk
+    while chunk:
+        yield ''.join(json.dumps(pipeline.result_line(record), ensure_ascii=False) + '\n' for record in chunk)
+        index = chunk[-1]['index'] + 1
+        
+        try:
+            chunk = next(chunks, None)
+        except Exception as e:
+            # Часть ответа уже отправлена - сообщаем об ошибке последней строкой
+            print(f"⚠️ Ошибка потока на элементе {index}: {e}")
+            yield json.dumps({'index': index, 'error': str(e)}, ensure_ascii=False) + '\n'
+            return
+
+# Ошибки разбора входа (кодировка, JSON, CSV, повреждённый xlsx) - ответ 400, остальные - 500
+INPUT_ERRORS = (JSONStreamError, ValueError, csv.Error, BadZipFile)
+
+def _ndjson_response(chunks, error_status=400):
+    """Потоковый NDJSON-ответ; ошибка до первого чанка (формат входа) - JSON с error_status"""
+    try:
+        # Первый чанк разбираем до начала ответа - ошибку формата можно вернуть кодом
+        first_chunk = next(chunks, None)
+    except INPUT_ERRORS as e:
+        return jsonify({'error': str(e)}), error_status
+    return Response(stream_with_context(_stream_classification(first_chunk, chunks)),
+                    content_type='application/x-ndjson; charset=utf-8')
+
+def _flag(name, default=True):
+    """Булев параметр запроса: 0 / false / no - выключено"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ('0', 'false', 'no')
+
+def _classify_upload(kind, label):
+    """Загруженный файл через конвейер: JSON-сводка или (?stream=1) поток NDJSON"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'Файл не загружен'}), 400
         
         file = request.files['file']
-        upload_folder = Path('uploads')
-        upload_folder.mkdir(exist_ok=True)
-        
-        file_path = upload_folder / file.filename
-        file.save(file_path)
-        
-        # Загружаем данные
-        try:
-            df = pd.read_csv(file_path, encoding='utf-8')
-        except:
-            df = pd.read_csv(file_path, encoding='latin-1')
-        
-        if df.empty:
-            return jsonify({'error': 'Нет данных в файле'}), 400
-        
+        if not DataProcessorEnhanced:
+            return jsonify({'error': 'Обработчик файлов недоступен'}), 500
         if not classifier:
             return jsonify({'error': 'Классификатор не инициализирован'}), 500
         
-        total = len(df)
-        results = []
+        # Разбираем прямо из потока загрузки: без копии в uploads/, лениво, чанками
+        items = pipeline.file_source(file.stream, file.filename or '')
+        if _flag('stream', False):
+            return _ndjson_response(_pipeline_chunks(items, kind, save=True, skip_empty=True, numbered=True))
         
-        for idx, row in df.iterrows():
-            try:
-                company_name = str(row.get('name', f'Company {idx+1}'))
-                description = str(row.get('description', ''))
-                rubrics = str(row.get('rubrics', ''))
-                
-                full_text = f"{company_name} {description} {rubrics}"
-                category, confidence = safe_classify(full_text)
-                top_3 = safe_classify_top_n(full_text, n=3)
-                
-                if db:
-                    classification_id = db.save_classification(
-                        company_name=company_name,
-                        text=full_text,
-                        predicted_category=category,
-                        confidence=confidence,
-                        top_3=top_3
-                    )
-                else:
-                    classification_id = idx
-                
-                results.append({
-                    'company_name': company_name,
-                    'category': category,
-                    'confidence': f"{confidence*100:.1f}%",
-                    'id': classification_id
-                })
-            
-            except Exception as e:
-                print(f"⚠️ Ошибка компании {idx+1}: {e}")
+        report = pipeline.ReportSink()
+        results = []
+        try:
+            for chunk in _pipeline_chunks(items, kind, save=True, skip_empty=True, sinks=[report],
+                                          numbered=True):
+                for record in chunk:
+                    if 'error' in record:
+                        print(f"⚠️ Ошибка элемента {record['index']+1}: {record['error']}")
+                        continue
+                    if kind == 'companies':
+                        result = {'company_name': record['name'] or f"Company {record['index']+1}"}
+                    else:
+                        text = record['text']
+                        result = {'text': text[:50] + '...' if len(text) > 50 else text}
+                    result.update({
+                        'category': record['category'],
+                        'confidence': f"{record['confidence']*100:.1f}%",
+                        'id': record.get('classification_id', record['index'])
+                    })
+                    results.append(result)
+        except INPUT_ERRORS as e:
+            return jsonify({'error': f'Не удалось прочитать файл: {e}'}), 400
+        
+        total = report.total + report.errors
+        if not total:
+            return jsonify({'error': 'Нет данных в файле'}), 400
         
+        # Экспортируем результаты
         export_path = None
         if db:
             try:
@@ -448,14 +541,40 @@ def classify_company_batch():
             'processed': len(results),
             'results': results,
             'export_file': str(export_path) if export_path else None,
-            'message': f'Обработано {len(results)} из {total} компаний'
+            'message': f'Обработано {len(results)} из {total} {label}'
         })
     
     except Exception as e:
-        print(f"❌ Ошибка пакетной классификации компаний: {e}")
+        print(f"❌ Ошибка пакетной классификации ({kind}): {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def _classify_batch_endpoint(kind):
+    if not classifier:
+        return jsonify({'error': 'Классификатор не инициализирован'}), 500
+    
+    items = iter_request_items(request.stream, request.content_type)
+    # Пустые тексты не пропускаются - строка ответа на каждый элемент входа
+    return _ndjson_response(_pipeline_chunks(items, kind, save=_flag('save')))
+
+@app.route('/api/classify/batch/rubrics', methods=['POST'])
+def classify_batch_rubrics():
+    """
+    Пакетная классификация рубрик без загрузки файла.
+    Тело: JSON-массив или NDJSON (Content-Type: application/x-ndjson) из строк
+    или объектов {"text": ..., "id": ...}. Ответ - NDJSON, строка на элемент, в порядке входа.
+    ?save=0 - не сохранять в БД
+    """
+    return _classify_batch_endpoint('rubrics')
+
+@app.route('/api/classify/batch/companies', methods=['POST'])
+def classify_batch_companies():
+    """
+    Пакетная классификация компаний без загрузки файла.
+    Элементы: {"company_name", "description", "rubrics", "id"}, формат - как у /api/classify/batch/rubrics
+    """
+    return _classify_batch_endpoint('companies')
+
 # ==================== ЭКСПОРТ И КОРРЕКТИРОВКА ====================
 
 @app.route('/api/export_classifications', methods=['GET'])
@@ -518,6 +637,12 @@ def submit_correction():
         success = db.add_correction(classification_id, corrected_category, reason)
         
         if success:
+            if online_learner and online_sync_on_correction:
+                online_learner.sync_async()
+            if rubrics_classifier is not None:
+                # Следующая классификация рубрик подхватит исправление (в других воркерах -
+                # не позже CORRECTIONS_SYNC_INTERVAL секунд)
+                rubrics_classifier.correction_added()
             return jsonify({'success': True, 'message': 'Корректировка сохранена'})
         else:
             return jsonify({'error': 'Ошибка сохранения'}), 500
@@ -732,6 +857,7 @@ def health():
         'components': {
             'classifier': 'OK' if classifier else 'ERROR',
             'database': 'OK' if db else 'ERROR',
+            'model_version': online_learner.version if online_learner else None,
             'classifier_methods': {
                 'classify_text': 'OK' if (classifier and hasattr(classifier, 'classify_text')) else 'MISSING',
                 'classify_top_n': 'OK' if (classifier and hasattr(classifier, 'classify_top_n')) else 'MISSING'
@@ -739,6 +865,49 @@ def health():
         }
     })
 
+@app.route('/api/microbatch', methods=['GET'])
+def microbatch_stats():
+    """
+    Перцентили задержки и размеры батчей одиночных запросов. Перцентили разных
+    процессов не складываются - под serve.py они отдаются по каждому воркеру (workers)
+    """
+    batcher = get_single_batcher()
+    if batcher is None:
+        return jsonify({'enabled': False})
+    if metrics.is_multiprocess():
+        return jsonify({'enabled': True, 'pid': os.getpid(),
+                        'workers': {str(pid): stats for pid, stats in metrics.process_info('microbatch').items()}})
+    return jsonify({'enabled': True, 'pid': os.getpid(), **batcher.stats()})
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """
+    Готовность принимать трафик (для балансировщика/оркестратора).
+    В отличие от /api/health (процесс жив) - 503, пока модель не обучена
+    или недоступна БД
+    """
+    checks = {
+        'classifier': classifier is not None,
+        'model_fitted': classifier is not None and getattr(
+            getattr(classifier, 'classifier', None), 'classes_', None) is not None,
+        'database': False,
+    }
+    if db:
+        try:
+            conn = db.get_connection()
+            conn.execute('SELECT 1')
+            conn.close()
+            checks['database'] = True
+        except Exception as e:
+            print(f"⚠️ БД недоступна: {e}")
+    is_ready = all(checks.values())
+    return jsonify({
+        'ready': is_ready,
+        'checks': checks,
+        'model_version': online_learner.version if online_learner else None,
+        'pid': os.getpid()
+    }), 200 if is_ready else 503
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🚀 Запуск Flask приложения V5.0...")
@@ -747,5 +916,6 @@ if __name__ == '__main__':
     print("📊 Функции: Рубрики + Компании + Корректировка + Отчеты + Обучение")
     print(f"✅ Классификатор: {'OK' if classifier else 'ERROR'}")
     print(f"✅ База данных: {'OK' if db else 'ERROR'}")
+    print("Продакшн-запуск (несколько воркеров): python serve.py")
     print("="*60 + "\n")
     app.run(debug=True, host='0.0.0.0', port=5000)
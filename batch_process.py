@@ -5,19 +5,30 @@
 
 import os
 import glob
+import time
 from pathlib import Path
-from data_processor import DataProcessor
+import pipeline
+from checkpoint import Checkpoint, model_fingerprint
 from classifier import CompanyClassifier
+from config import BATCH_PARSE_WORKERS, BATCH_PREFETCH_FILES
+from database import Database
 import json
 from datetime import datetime
 
-def process_all_csv_files(input_dir='data', output_dir='output'):
+def process_all_csv_files(input_dir='data', output_dir='output', resume=True, reuse=True,
+                          prefetch_files=BATCH_PREFETCH_FILES, parse_workers=BATCH_PARSE_WORKERS):
     """
     Обработать все CSV файлы в директории
     
     Args:
         input_dir: Директория с файлами
         output_dir: Директория для результатов
+        resume: Продолжать прерванные файлы с последнего чанка и пропускать
+                не изменившиеся (контрольные точки рядом с результатами, checkpoint.py)
+        reuse: Не классифицировать строки, уже классифицированные той же версией
+               модели и правил (кэш результатов в БД, pipeline.ResultCache)
+        prefetch_files: Сколько следующих файлов разбирать заранее, пока классифицируется текущий
+        parse_workers: Потоков в общем пуле разбора файлов
     """
     
     # Создаем директорию для результатов
@@ -33,39 +44,54 @@ def process_all_csv_files(input_dir='data', output_dir='output'):
     
     print(f"📂 Найдено {len(csv_files)} файлов для обработки\n")
     
-    # Обработаем каждый файл
-    processor = DataProcessor()
+    # Обработаем каждый файл: потоковый конвейер, модель загружается один раз.
+    # Разбор следующих файлов (пул потоков) идет параллельно с классификацией текущего
+    classifier = CompanyClassifier()
+    parse_clock = pipeline.StageClock(parse_workers)
+    classify_clock = pipeline.StageClock()
+    wait_clock = pipeline.StageClock()
+    classify_texts = pipeline.timed_batch(pipeline.company_batch(classifier), classify_clock)
+    model = model_fingerprint(classifier)
+    cache = pipeline.ResultCache(Database(), pipeline.company_version(classifier)) if reuse else None
     all_results = []
+    started = time.perf_counter()
     
-    for file_path in csv_files:
+    for file_path, items in pipeline.prefetch_files(csv_files, prefetch_files, parse_workers,
+                                                    clock=parse_clock):
         filename = Path(file_path).name
         print(f"🔄 Обработка: {filename}")
         
         try:
-            # Загружаем
-            processor.load_companies(file_path)
-            
-            # Классифицируем
-            processor.classify_companies()
-            
-            # Сохраняем результаты
+            # Читаем, классифицируем чанками и пишем результаты и отчет по ходу
             output_file = f"{output_dir}/classified_{filename}"
-            processor.save_classified(output_file)
-            
-            # Генерируем отчет
             report_file = f"{output_dir}/report_{filename.replace('.csv', '.json')}"
-            report = processor.generate_report(report_file)
+            checkpoint_file = Path(f"{output_file}.checkpoint.json")
+            if not resume and checkpoint_file.exists():
+                checkpoint_file.unlink()
+            checkpoint = Checkpoint(checkpoint_file)
+            report = pipeline.classify_file(file_path, classify_texts, kind='companies',
+                                            output=output_file, report=report_file,
+                                            row=pipeline.company_row,
+                                            report_keys=pipeline.COMPANY_REPORT_KEYS,
+                                            checkpoint=checkpoint, model=model, cache=cache,
+                                            items=pipeline.timed(items, wait_clock))
             
+            # Отчет пропущенного файла - из прошлого запуска: его строки не переиспользованы сейчас
+            reused_rows = 0 if checkpoint.skipped else report.get('reused', 0)
             all_results.append({
                 'file': filename,
                 'status': 'success',
-                'total_companies': len(processor.classified_df),
+                'skipped': checkpoint.skipped,
+                'resumed_from': checkpoint.resumed_from,
+                'total_companies': report['total_companies'],
+                'reused_rows': reused_rows,
+                'skipped_rows': report['total_companies'] if checkpoint.skipped else 0,
                 'avg_confidence': float(report['avg_confidence']),
                 'categories': len(report['categories_distribution']),
                 'output_file': output_file
             })
             
-            print(f"✓ Готово: {output_file}\n")
+            print(f"✓ Готово: {output_file} (из кэша: {reused_rows} из {report['total_companies']})\n")
             
         except Exception as e:
             print(f"✗ Ошибка при обработке {filename}: {e}\n")
@@ -75,12 +101,27 @@ def process_all_csv_files(input_dir='data', output_dir='output'):
                 'error': str(e)
             })
     
+    wall = time.perf_counter() - started
+    
     # Сохраняем итоговый отчет
     summary = {
         'timestamp': datetime.now().isoformat(),
         'files_processed': len([r for r in all_results if r['status'] == 'success']),
         'files_failed': len([r for r in all_results if r['status'] == 'error']),
-        'results': all_results
+        'reused_rows': sum(r.get('reused_rows', 0) for r in all_results),
+        'skipped_rows': sum(r.get('skipped_rows', 0) for r in all_results),
+        'results': all_results,
+        # Загрузка стадий: разбор (пул), модель, ожидание классификатором разобранных строк
+        'pipeline': {
+            'prefetch_files': prefetch_files,
+            'parse_workers': parse_workers,
+            'wall_seconds': round(wall, 3),
+            'stages': {
+                'parse': parse_clock.report(wall),
+                'classify': classify_clock.report(wall),
+                'input_wait': wait_clock.report(wall)
+            }
+        }
     }
     
     summary_file = f"{output_dir}/batch_summary.json"
@@ -91,6 +132,12 @@ def process_all_csv_files(input_dir='data', output_dir='output'):
     print(f"✓ Пакетная обработка завершена")
     print(f"  Успешно: {summary['files_processed']}")
     print(f"  Ошибок: {summary['files_failed']}")
+    print(f"  Строк из кэша результатов: {summary['reused_rows']}, "
+          f"в пропущенных файлах: {summary['skipped_rows']}")
+    stages = summary['pipeline']['stages']
+    print(f"  Загрузка: разбор {stages['parse']['utilisation']:.0%}, "
+          f"модель {stages['classify']['utilisation']:.0%}, "
+          f"ожидание строк {stages['input_wait']['utilisation']:.0%} ({wall:.1f} с)")
     print(f"  Итоговый отчет: {summary_file}")
     print(f"{'='*70}")
     
@@ -119,7 +166,22 @@ def apply_training_rules(rules_file='data/training_rules.json'):
     return classifier
 
 if __name__ == '__main__':
-    import sys
+    import argparse
+    import profiling
+    
+    parser = argparse.ArgumentParser(description='Пакетная обработка CSV файлов')
+    parser.add_argument('input_dir', nargs='?', default='data', help='Директория с файлами (default: data)')
+    parser.add_argument('output_dir', nargs='?', default='output', help='Директория для результатов (default: output)')
+    parser.add_argument('--restart', action='store_true',
+                        help='Игнорировать контрольные точки и обработать все файлы заново')
+    parser.add_argument('--no-reuse', action='store_true',
+                        help='Не брать результаты из кэша - классифицировать каждую строку')
+    parser.add_argument('--prefetch-files', type=int, default=BATCH_PREFETCH_FILES,
+                        help=f'Файлов, разбираемых заранее (default: {BATCH_PREFETCH_FILES}, 0 - по одному)')
+    parser.add_argument('--parse-workers', type=int, default=BATCH_PARSE_WORKERS,
+                        help=f'Потоков разбора файлов (default: {BATCH_PARSE_WORKERS})')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
     
     print(f"""
 ╔══════════════════════════════════════════════════════════════╗
@@ -127,11 +189,8 @@ if __name__ == '__main__':
 ╚══════════════════════════════════════════════════════════════╝
     """)
     
-    if len(sys.argv) > 1:
-        input_dir = sys.argv[1]
-        output_dir = sys.argv[2] if len(sys.argv) > 2 else 'output'
-    else:
-        input_dir = 'data'
-        output_dir = 'output'
-    
-    process_all_csv_files(input_dir, output_dir)
+    # Профиль пишется рядом с batch_summary.json
+    with profiling.from_args(args, args.output_dir, 'batch'):
+        process_all_csv_files(args.input_dir, args.output_dir, resume=not args.restart,
+                              reuse=not args.no_reuse, prefetch_files=args.prefetch_files,
+                              parse_workers=args.parse_workers)
@@ -0,0 +1,361 @@
+"""
+Бенчмарки горячих путей классификации на синтетических данных в формате 2ГИС
+
+Генератор создаёт компании (Наименование / Описание / Рубрики / Адрес / Тип),
+список рубрик и справочник категорий. Замеряются:
+- rules: CompanyClassifier.check_rules
+- nb: classify_text по одному против батча (classify_top_n_batch)
+- rubrics: RubricsClassifier - загрузка категорий, classify_batch, скоринг по готовым эмбеддингам
+- database: вставки классификаций, статистика, экспорт CSV
+- files: загрузка и экспорт CSV / TXT / Excel через DataProcessorEnhanced
+
+Результаты сохраняются в JSON (с коммитом git), сравнение с прошлым прогоном:
+python benchmarks.py --compare output/benchmarks/<прошлый>.json
+
+Использование:
+python benchmarks.py                          # все группы, стандартный размер
+python benchmarks.py --companies 50000 --only nb files
+"""
+
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = 'output/benchmarks'
+GROUPS = ('rules', 'nb', 'rubrics', 'database', 'files')
+
+# Ключевые слова категорий для генератора: (категория, описание, слова рубрик)
+CATEGORY_SEEDS = [
+    ('Жильё', 'Жилой комплекс; частные дома', ['Жилые комплексы', 'Коттеджные посёлки', 'Общежития']),
+    ('Супермаркеты', 'Супермаркет, продуктовый рынок', ['Супермаркеты', 'Продуктовые рынки', 'Гипермаркеты']),
+    ('Торговля', 'Вещи, быт-техника, обувь', ['Магазины одежды', 'Обувные магазины', 'Бытовая техника']),
+    ('Мебель и стройматериалы', 'Мебель, стройматериалы, окна', ['Мебель', 'Строительные материалы', 'Окна']),
+    ('Медицина', 'Больница, стоматология, поликлиника', ['Больницы', 'Стоматологии', 'Поликлиники']),
+    ('Аптеки', 'Аптека, оптика', ['Аптеки', 'Оптики', 'Медтехника']),
+    ('Образование', 'Школа, детский сад, колледж', ['Школы', 'Детские сады', 'Колледжи']),
+    ('Общепит', 'Кафе, ресторан; кофейня; столовая', ['Кафе', 'Рестораны', 'Кофейни', 'Столовые']),
+    ('Спорт', 'Спортивный комплекс, тренажерный зал, бассейн', ['Фитнес-клубы', 'Бассейны', 'Тренажерные залы']),
+    ('Автосервис', 'Автосервис, автомойки, шиномонтаж', ['Автосервисы', 'Автомойки', 'Шиномонтаж']),
+    ('Красота', 'Парикмахерская, салон красоты', ['Парикмахерские', 'Салоны красоты', 'Ногтевые студии']),
+    ('Библиотека', 'Библиотека', ['Библиотеки', 'Читальные залы']),
+    ('Администрация', 'Органы власти, администрации', ['Администрации районов', 'Налоговые инспекции']),
+    ('Полиция', 'УВД, военкомат', ['Отделы полиции', 'Военкоматы']),
+    ('Банки', 'Банк, банкомат, страхование', ['Банки', 'Банкоматы', 'Страховые компании']),
+    ('Гостиницы', 'Гостиница, хостел', ['Гостиницы', 'Хостелы', 'Апартаменты']),
+]
+MODIFIERS = ['', 'детские', 'круглосуточные', 'сетевые', 'эконом', 'премиум', 'на дому', 'для животных']
+NAME_WORDS = ['Север', 'Радуга', 'Лидер', 'Уют', 'Мечта', 'Сфера', 'Гранд', 'Вектор', 'Стиль', 'Берёзка']
+STREETS = ['ул. Ленина', 'пр. Мира', 'ул. Гагарина', 'ул. Советская', 'ул. Садовая']
+
+
+# ======================= ГЕНЕРАТОР ДАННЫХ =======================
+
+def generate_dataset(n_companies: int = 5000, n_rubrics: int = 2000, n_categories: int = 48,
+                     seed: int = 42) -> Dict:
+    """
+    Синтетические данные в формате 2ГИС
+
+    Returns:
+        словарь: categories (список id/name/description), rubrics (список строк),
+        rubric_labels (категория каждой рубрики), companies (DataFrame)
+    """
+    rng = random.Random(seed)
+
+    categories = []
+    category_rubrics = []
+    for i in range(n_categories):
+        name, description, words = CATEGORY_SEEDS[i % len(CATEGORY_SEEDS)]
+        suffix = f" {i // len(CATEGORY_SEEDS) + 1}" if i >= len(CATEGORY_SEEDS) else ''
+        categories.append({'id': i + 1, 'name': name + suffix, 'description': description})
+        category_rubrics.append(words)
+
+    rubrics, rubric_labels = [], []
+    for _ in range(n_rubrics):
+        cat = rng.randrange(n_categories)
+        modifier = rng.choice(MODIFIERS)
+        rubric = rng.choice(category_rubrics[cat])
+        rubrics.append(f"{rubric} {modifier}".strip())
+        rubric_labels.append(categories[cat]['name'])
+
+    rows = []
+    for i in range(n_companies):
+        cat = rng.randrange(n_categories)
+        company_rubrics = rng.sample(category_rubrics[cat], k=min(len(category_rubrics[cat]), rng.randint(1, 3)))
+        rows.append({
+            'Наименование': f"{company_rubrics[0].split()[0]} «{rng.choice(NAME_WORDS)}»",
+            'Описание': f"{categories[cat]['description']}, {rng.choice(MODIFIERS) or 'городские'} услуги",
+            'Рубрики': '; '.join(company_rubrics),
+            'Адрес': f"{rng.choice(STREETS)}, {rng.randint(1, 200)}",
+            'Тип': categories[cat]['name'],
+        })
+
+    return {
+        'categories': categories,
+        'rubrics': rubrics,
+        'rubric_labels': rubric_labels,
+        'companies': pd.DataFrame(rows),
+    }
+
+
+def company_texts(companies: pd.DataFrame) -> List[str]:
+    """Текст компании для классификатора: название + описание + рубрики"""
+    return (companies['Наименование'] + ' ' + companies['Описание'] + ' ' + companies['Рубрики']).tolist()
+
+
+# ======================= ЗАМЕРЫ =======================
+
+def measure(fn: Callable, items: int, repeat: int = 3) -> Dict:
+    """Лучшее и медианное время из repeat запусков и пропускная способность"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        'items': items,
+        'best_s': round(best, 6),
+        'median_s': round(statistics.median(timings), 6),
+        'items_per_s': round(items / best, 1) if best > 0 else None,
+    }
+
+
+def bench_rules(data: Dict, workdir: Path, repeat: int) -> Dict:
+    from classifier import CompanyClassifier
+
+    classifier = CompanyClassifier(model_path=str(workdir / 'models_rules'))
+    for words in (seed[2] for seed in CATEGORY_SEEDS):
+        for word in words:
+            classifier.training_rules.append({'keyword': word.lower(), 'category': word, 'priority': 80})
+    texts = company_texts(data['companies'])
+    return {
+        'rules': len(classifier.training_rules),
+        'check_rules': measure(lambda: [classifier.check_rules(t) for t in texts], len(texts), repeat),
+    }
+
+
+def bench_nb(data: Dict, workdir: Path, repeat: int) -> Dict:
+    from classifier import CompanyClassifier
+
+    texts = company_texts(data['companies'])
+    labels = data['companies']['Тип'].tolist()
+    classifier = CompanyClassifier(model_path=str(workdir / 'models_nb'))
+    results = {'train': measure(lambda: classifier.train(texts, labels), len(texts), 1)}
+
+    sample = texts[:min(len(texts), 2000)]
+    results['classify_text_single'] = measure(lambda: [classifier.classify_text(t) for t in sample],
+                                              len(sample), repeat)
+    results['classify_top_n_single'] = measure(lambda: [classifier.classify_top_n(t, 3) for t in sample],
+                                               len(sample), repeat)
+    results['classify_top_n_batch'] = measure(lambda: classifier.classify_top_n_batch(texts, 3),
+                                              len(texts), repeat)
+    return results
+
+
+def bench_rubrics(data: Dict, workdir: Path, repeat: int) -> Dict:
+    try:
+        from rubrics_classifier import RubricsClassifier
+        classifier = RubricsClassifier(use_warm_start=False)
+    except Exception as e:
+        return {'skipped': f"RubricsClassifier недоступен: {e}"}
+
+    categories, rubrics = data['categories'], data['rubrics']
+    results = {'load_categories': measure(lambda: classifier.load_categories(categories),
+                                          len(categories), 1)}
+    results['classify_batch'] = measure(lambda: classifier.classify_batch(rubrics, top_n=3),
+                                        len(rubrics), repeat)
+
+    # Только скоринг, без энкодера
+    embeddings = classifier.encoder.encode(rubrics)
+    results['score_top3'] = measure(lambda: classifier.rank_embeddings(embeddings, 3), len(rubrics), repeat)
+    return results
+
+
+def bench_database(data: Dict, workdir: Path, repeat: int) -> Dict:
+    from database import Database
+
+    db = Database(db_path=workdir / 'bench.db')
+    companies = data['companies']
+    rows = list(zip(companies['Наименование'], company_texts(companies), companies['Тип']))
+
+    def insert():
+        for name, text, category in rows:
+            db.save_classification(company_name=name, text=text, predicted_category=category,
+                                   confidence=0.9, top_3=[[category, 0.9]])
+
+    results = {'save_classification': measure(insert, len(rows), 1)}
+    results['get_statistics'] = measure(db.get_statistics, len(rows), repeat)
+    results['export_classifications_csv'] = measure(
+        lambda: db.export_classifications_csv(str(workdir / 'db_export.csv')), len(rows), repeat
+    )
+    return results
+
+
+def bench_files(data: Dict, workdir: Path, repeat: int) -> Dict:
+    from data_processor_enhanced import DataProcessorEnhanced
+
+    companies = data['companies']
+    n = len(companies)
+    csv_file, xlsx_file, txt_file = workdir / 'companies.csv', workdir / 'companies.xlsx', workdir / 'rubrics.txt'
+    companies.to_csv(csv_file, index=False, encoding='utf-8')
+    companies.to_excel(xlsx_file, index=False, engine='openpyxl')
+    txt_file.write_text('\n'.join(data['rubrics']), encoding='utf-8')
+
+    results_rows = [
+        {'input_text': name, 'category': category, 'confidence': 0.9,
+         'top_3': [(category, 0.9), ('Другое', 0.05)]}
+        for name, category in zip(companies['Наименование'], companies['Тип'])
+    ]
+    return {
+        'load_csv': measure(lambda: DataProcessorEnhanced.load_file(str(csv_file)), n, repeat),
+        'load_txt': measure(lambda: DataProcessorEnhanced.load_file(str(txt_file)), len(data['rubrics']), repeat),
+        'load_excel': measure(lambda: DataProcessorEnhanced.load_file(str(xlsx_file)), n, repeat),
+        'export_csv': measure(lambda: DataProcessorEnhanced.export_with_results(
+            str(csv_file), results_rows, str(workdir / 'out.csv')), n, repeat),
+        'export_excel': measure(lambda: DataProcessorEnhanced.export_with_results(
+            str(xlsx_file), results_rows, str(workdir / 'out.xlsx')), n, repeat),
+    }
+
+
+BENCHMARKS = {
+    'rules': bench_rules,
+    'nb': bench_nb,
+    'rubrics': bench_rubrics,
+    'database': bench_database,
+    'files': bench_files,
+}
+
+
+# ======================= ЗАПУСК И СРАВНЕНИЕ =======================
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=10).stdout.strip() or 'unknown'
+    except Exception:
+        return 'unknown'
+
+
+def run(groups=GROUPS, n_companies: int = 5000, n_rubrics: int = 2000, n_categories: int = 48,
+        repeat: int = 3, seed: int = 42) -> Dict:
+    """Прогнать выбранные группы бенчмарков, вернуть отчёт"""
+    data = generate_dataset(n_companies, n_rubrics, n_categories, seed)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'companies': n_companies,
+            'rubrics': n_rubrics,
+            'categories': n_categories,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='bench_') as tmp:
+        for group in groups:
+            print(f"\n⏱️ {group}...")
+            start = time.perf_counter()
+            try:
+                report['results'][group] = BENCHMARKS[group](data, Path(tmp), repeat)
+            except Exception as e:
+                print(f"❌ Ошибка бенчмарка {group}: {e}")
+                report['results'][group] = {'error': str(e)}
+            print(f"   ✓ {time.perf_counter() - start:.1f} с")
+    return report
+
+
+def _flatten(results: Dict) -> Dict[Tuple[str, str], float]:
+    return {
+        (group, name): metrics['best_s']
+        for group, group_results in results.items()
+        for name, metrics in group_results.items()
+        if isinstance(metrics, dict) and 'best_s' in metrics
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = 0.2) -> List[Dict]:
+    """
+    Сравнить с прошлым отчётом
+
+    Returns:
+        строки (group, name, было, стало, отношение, regression); регрессия -
+        замедление больше чем на tolerance
+    """
+    current, previous = _flatten(report['results']), _flatten(baseline['results'])
+    rows = []
+    for key in sorted(current.keys() & previous.keys()):
+        ratio = current[key] / previous[key] if previous[key] > 0 else float('inf')
+        rows.append({'group': key[0], 'name': key[1], 'before_s': previous[key], 'after_s': current[key],
+                     'ratio': round(ratio, 3), 'regression': ratio > 1 + tolerance})
+    return rows
+
+
+def print_report(report: Dict) -> None:
+    print("\n" + "=" * 80)
+    print(f"БЕНЧМАРКИ (коммит {report['meta']['commit']})")
+    print("=" * 80)
+    for group, group_results in report['results'].items():
+        print(f"\n{group}:")
+        for name, metrics in group_results.items():
+            if isinstance(metrics, dict) and 'best_s' in metrics:
+                print(f"  {name:30} {metrics['best_s'] * 1000:10.1f} мс  {metrics['items_per_s'] or 0:12,.0f} /с")
+            else:
+                print(f"  {name:30} {metrics}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Бенчмарки горячих путей классификации')
+    parser.add_argument('--companies', type=int, default=5000, help='Компаний в синтетических данных')
+    parser.add_argument('--rubrics', type=int, default=2000, help='Рубрик')
+    parser.add_argument('--categories', type=int, default=48, help='Категорий')
+    parser.add_argument('--repeat', type=int, default=3, help='Повторов каждого замера')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=list(GROUPS), help='Группы бенчмарков')
+    parser.add_argument('--output', '-o', help='JSON отчёта (по умолчанию output/benchmarks/<время>_<коммит>.json)')
+    parser.add_argument('--compare', help='Прошлый JSON отчёта для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимое замедление (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    report = run(args.only, args.companies, args.rubrics, args.categories, args.repeat, args.seed)
+    print_report(report)
+
+    output = Path(args.output or Path(BENCHMARK_DIR) / (
+        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['meta']['commit']}.json"))
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['comparison'] = {'baseline': baseline['meta'], 'rows': compare(report, baseline, args.tolerance)}
+        print(f"\nСравнение с {baseline['meta'].get('commit')}:")
+        for row in report['comparison']['rows']:
+            mark = '⚠️' if row['regression'] else '  '
+            print(f"{mark} {row['group']}/{row['name']:30} {row['before_s'] * 1000:9.1f} -> "
+                  f"{row['after_s'] * 1000:9.1f} мс (x{row['ratio']})")
+        regressions = [row for row in report['comparison']['rows'] if row['regression']]
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ Отчёт сохранён в {output}")
+
+    if regressions:
+        print(f"⚠️ Регрессий: {len(regressions)}")
+        sys.exit(1)
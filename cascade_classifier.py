@@ -0,0 +1,429 @@
+"""
+Каскадный классификатор: правила -> TF-IDF + NB -> эмбеддинги
+
+Дешёвые ступени отвечают первыми, на эмбеддинги уходят только тексты,
+в которых NB не уверен (ниже MIN_CONFIDENCE_THRESHOLD). Для таких текстов
+вероятности NB и эмбеддингов сливаются:
+    p = nb_weight * p_nb + (1 - nb_weight) * softmax(сходство / temperature)
+Слияние идёт только по категориям, известным обеим ступеням (классы NB
+совпадают с названиями категорий RubricsClassifier); без общих категорий
+каскад не собирается. Температура и вес подбираются на размеченных
+примерах (calibrate).
+
+Интерфейс classify_text / classify_top_n совпадает с CompanyClassifier,
+поэтому каскад можно подставить вместо него (например, в app_web.py).
+
+Использование:
+python cascade_classifier.py --categories categories.csv --input rubrics.txt
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.exceptions import NotFittedError
+from sklearn.utils.validation import check_is_fitted
+
+from config import (CASCADE_CANDIDATES, CASCADE_NB_WEIGHT, CASCADE_RULE_MIN_CONFIDENCE,
+                    CASCADE_TEMPERATURE, MIN_CONFIDENCE_THRESHOLD)
+from vector_index import top_k
+
+STAGES = ('rules', 'nb', 'embeddings')
+UNKNOWN = 'Неизвестно'
+
+
+def _softmax(scores: np.ndarray, temperature: float) -> np.ndarray:
+    logits = np.asarray(scores, dtype=np.float64) / max(temperature, 1e-6)
+    logits -= logits.max()
+    weights = np.exp(logits)
+    return weights / weights.sum()
+
+
+class CascadeClassifier:
+    """Каскад правил, NB и эмбеддингов со статистикой по ступеням"""
+
+    def __init__(self, company_classifier=None, rubrics_classifier=None,
+                 threshold: float = MIN_CONFIDENCE_THRESHOLD,
+                 rule_min_confidence: float = CASCADE_RULE_MIN_CONFIDENCE,
+                 nb_weight: float = CASCADE_NB_WEIGHT, temperature: float = CASCADE_TEMPERATURE,
+                 candidates: int = CASCADE_CANDIDATES):
+        """
+        Args:
+            company_classifier: CompanyClassifier (правила + TF-IDF/NB)
+            rubrics_classifier: RubricsClassifier с загруженными категориями
+            threshold: уверенность NB, ниже которой текст уходит на эмбеддинги
+            rule_min_confidence: порог уверенности правила (priority / 100), срабатывает строго выше
+            nb_weight: вес NB при слиянии с эмбеддингами (0-1)
+            temperature: температура softmax по сходствам категорий
+            candidates: сколько ближайших категорий берётся от эмбеддингов
+        """
+        self.company_classifier = company_classifier
+        self.rubrics_classifier = rubrics_classifier
+        self.threshold = threshold
+        self.rule_min_confidence = rule_min_confidence
+        self.nb_weight = nb_weight
+        self.temperature = temperature
+        self.candidates = candidates
+        self._stats_lock = threading.Lock()
+        self._labels_key = None
+        self._shared = None
+        self.reset_stats()
+        self.shared_labels()
+
+    # ======================= СТУПЕНИ =======================
+
+    @property
+    def nb_ready(self) -> bool:
+        """NB и векторайзер обучены"""
+        cc = self.company_classifier
+        if cc is None or cc.classifier is None or cc.vectorizer is None:
+            return False
+        try:
+            check_is_fitted(cc.classifier)
+            check_is_fitted(cc.vectorizer)
+            return True
+        except NotFittedError:
+            return False
+
+    @property
+    def embeddings_ready(self) -> bool:
+        rc = self.rubrics_classifier
+        return rc is not None and rc.index is not None and len(rc.index) > 0
+
+    def _rule(self, text: str) -> Tuple[Optional[str], float]:
+        if self.company_classifier is None or not self.company_classifier.training_rules:
+            return None, 0.0
+        category, confidence = self.company_classifier.check_rules(text)
+        if category and confidence and confidence > self.rule_min_confidence:
+            return category, confidence
+        return None, 0.0
+
+    def _nb_proba(self, texts: List[str]) -> Tuple[np.ndarray, List[str]]:
+        """Вероятности NB для батча текстов: (матрица n x классы, классы)"""
+        cc = self.company_classifier
+        X = cc.vectorizer.transform(texts)
+        return cc.classifier.predict_proba(X), [str(c) for c in cc.classifier.classes_]
+
+    def label_overlap(self) -> Dict[str, List[str]]:
+        """
+        Сравнить классы NB с названиями категорий эмбеддингов
+
+        Returns:
+            shared - общие категории, nb_only / embeddings_only - известные одной ступени
+        """
+        nb_labels = set(str(c) for c in self.company_classifier.classifier.classes_) if self.nb_ready else set()
+        emb_labels = (set(str(c['name']) for c in self.rubrics_classifier.categories.values())
+                      if self.embeddings_ready else set())
+        return {'shared': sorted(nb_labels & emb_labels),
+                'nb_only': sorted(nb_labels - emb_labels),
+                'embeddings_only': sorted(emb_labels - nb_labels)}
+
+    def shared_labels(self) -> Optional[frozenset]:
+        """
+        Общие категории NB и эмбеддингов (None, если готова только одна ступень)
+
+        Проверяется при сборке каскада и заново после переобучения NB или
+        перезагрузки категорий. Без общих категорий слитые вероятности
+        не имеют смысла - ValueError.
+        """
+        if not (self.nb_ready and self.embeddings_ready):
+            return None
+        key = (tuple(str(c) for c in self.company_classifier.classifier.classes_),
+               tuple(sorted(str(c['name']) for c in self.rubrics_classifier.categories.values())))
+        if key != self._labels_key:
+            overlap = self.label_overlap()
+            if not overlap['shared']:
+                raise ValueError(
+                    "Классы NB и категории эмбеддингов не пересекаются - обучите NB "
+                    "на тех же категориях, что загружены в RubricsClassifier"
+                )
+            if overlap['nb_only'] or overlap['embeddings_only']:
+                print(f"⚠️  Каскад: общих категорий {len(overlap['shared'])}, только в NB - "
+                      f"{len(overlap['nb_only'])}, только в эмбеддингах - {len(overlap['embeddings_only'])}; "
+                      f"слияние идёт только по общим")
+            self._labels_key = key
+            self._shared = frozenset(overlap['shared'])
+        return self._shared
+
+    def _embedding_scores(self, texts: List[str],
+                          shared: Optional[frozenset] = None) -> List[List[Tuple[str, float]]]:
+        """
+        Ближайшие категории по эмбеддингам: [(название, скор 0-1)] для каждого текста
+
+        С shared берётся столько кандидатов, чтобы после отбрасывания
+        категорий, неизвестных NB, осталось candidates общих.
+        """
+        rc = self.rubrics_classifier
+        embeddings = rc.encoder.encode(texts)
+        k = self.candidates
+        if shared is not None:
+            k += sum(1 for c in rc.categories.values() if str(c['name']) not in shared)
+        k = min(k, len(rc.index))
+        return [
+            [(str(name), score) for _, name, score in top]
+            for top in rc.rank_embeddings(embeddings, k)
+        ]
+
+    def _fuse(self, nb_row: Optional[Dict[str, float]], emb_row: List[Tuple[str, float]],
+              temperature: float, nb_weight: float,
+              shared: Optional[frozenset] = None) -> Dict[str, float]:
+        """
+        Слияние вероятностей NB и softmax по сходствам категорий
+
+        Обе части сводятся к общим категориям (shared): NB перенормируется
+        на них, кандидаты эмбеддингов вне shared отбрасываются - так
+        слагаемые остаются распределениями над одним набором меток.
+        """
+        if nb_row and shared is not None:
+            nb_row = {name: prob for name, prob in nb_row.items() if name in shared}
+            total = sum(nb_row.values())
+            nb_row = {name: prob / total for name, prob in nb_row.items()} if total > 0 else None
+            emb_row = [(name, score) for name, score in emb_row if name in shared][:self.candidates]
+        elif emb_row:
+            emb_row = emb_row[:self.candidates]
+        fused = {}
+        if emb_row:
+            names = [name for name, _ in emb_row]
+            probs = _softmax([score for _, score in emb_row], temperature)
+            weight = 1 - nb_weight if nb_row else 1.0
+            for name, prob in zip(names, probs):
+                fused[name] = fused.get(name, 0.0) + weight * float(prob)
+        if nb_row:
+            weight = nb_weight if emb_row else 1.0
+            for name, prob in nb_row.items():
+                fused[name] = fused.get(name, 0.0) + weight * prob
+        return fused
+
+    # ======================= КЛАССИФИКАЦИЯ =======================
+
+    def classify_batch(self, texts: Sequence[str], top_n: int = 3) -> List[Dict]:
+        """
+        Классифицировать тексты каскадом
+
+        Returns:
+            для каждого текста словарь: category, confidence, stage
+            ('rules' / 'nb' / 'embeddings' / None) и top - [(категория, уверенность)]
+        """
+        texts = list(texts)
+        results: List[Optional[Dict]] = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            if not text or not isinstance(text, str):
+                results[i] = {'category': UNKNOWN, 'confidence': 0.0, 'stage': None, 'top': []}
+            else:
+                pending.append(i)
+        self._count('total', len(pending), 0.0, hits=0)
+
+        # 1. Правила
+        if pending:
+            start = time.perf_counter()
+            remaining = []
+            for i in pending:
+                category, confidence = self._rule(texts[i])
+                if category:
+                    results[i] = {'category': category, 'confidence': float(confidence),
+                                  'stage': 'rules', 'top': [(category, float(confidence))]}
+                else:
+                    remaining.append(i)
+            self._count('rules', len(pending), time.perf_counter() - start, hits=len(pending) - len(remaining))
+            pending = remaining
+
+        # 2. TF-IDF + NB, одним вызовом на батч
+        nb_rows = {}
+        if pending and self.nb_ready:
+            start = time.perf_counter()
+            probabilities, classes = self._nb_proba([texts[i] for i in pending])
+            top_scores, top_indices = top_k(probabilities, max(top_n, 1))
+            remaining = []
+            for i, row, row_scores, row_indices in zip(pending, probabilities, top_scores, top_indices):
+                if row_scores[0] >= self.threshold or not self.embeddings_ready:
+                    results[i] = {
+                        'category': classes[row_indices[0]], 'confidence': float(row_scores[0]), 'stage': 'nb',
+                        'top': [(classes[j], float(score))
+                                for j, score in zip(row_indices[:top_n], row_scores) if j >= 0],
+                    }
+                else:
+                    nb_rows[i] = dict(zip(classes, row.tolist()))
+                    remaining.append(i)
+            hits = len(pending) - len(remaining)
+            self._count('nb', len(pending), time.perf_counter() - start, hits=hits)
+            pending = remaining
+
+        # 3. Эмбеддинги - только неуверенные тексты, слияние с NB
+        if pending and self.embeddings_ready:
+            start = time.perf_counter()
+            shared = self.shared_labels() if nb_rows else None
+            emb_scores = self._embedding_scores([texts[i] for i in pending], shared)
+            for i, emb_row in zip(pending, emb_scores):
+                fused = self._fuse(nb_rows.get(i), emb_row, self.temperature, self.nb_weight, shared)
+                top = sorted(fused.items(), key=lambda x: x[1], reverse=True)[:top_n]
+                results[i] = {'category': top[0][0], 'confidence': float(top[0][1]),
+                              'stage': 'embeddings', 'top': top}
+            self._count('embeddings', len(pending), time.perf_counter() - start, hits=len(pending))
+            pending = []
+
+        for i in pending:
+            results[i] = {'category': UNKNOWN, 'confidence': 0.0, 'stage': None, 'top': []}
+        return results
+
+    def classify_text(self, text: str) -> Tuple[str, float]:
+        """Классифицировать текст -> (категория, уверенность)"""
+        result = self.classify_batch([text], top_n=1)[0]
+        return result['category'], result['confidence']
+
+    def classify_top_n(self, text: str, n: int = 3) -> List[Tuple[str, float]]:
+        """Классифицировать текст и вернуть топ N"""
+        top = self.classify_batch([text], top_n=n)[0]['top']
+        return top or [(UNKNOWN, 0.0)]
+
+    def add_training_rule(self, keyword, category, priority=50):
+        """Добавить правило (в CompanyClassifier)"""
+        return self.company_classifier.add_training_rule(keyword, category, priority)
+
+    # ======================= КАЛИБРОВКА =======================
+
+    def calibrate(self, texts: Sequence[str], labels: Sequence[str],
+                  temperatures: Sequence[float] = (0.01, 0.02, 0.03, 0.05, 0.08, 0.12, 0.2),
+                  nb_weights: Sequence[float] = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.7)) -> Dict:
+        """
+        Подобрать temperature и nb_weight на размеченных примерах
+
+        Критерий - средний log-loss слитых вероятностей на правильной категории
+        (сетка значений, все примеры считаются как дошедшие до эмбеддингов).
+        Примеры с категориями, которых нет среди сливаемых (общих для NB и
+        эмбеддингов), пропускаются - слияние их предсказать не может.
+
+        Returns:
+            словарь с выбранными параметрами, log-loss и точностью top-1
+        """
+        if not self.embeddings_ready:
+            raise ValueError("Для калибровки нужен RubricsClassifier с загруженными категориями")
+        shared = self.shared_labels()
+        known = shared if shared is not None else {str(c['name']) for c in self.rubrics_classifier.categories.values()}
+        pairs = [(text, str(label)) for text, label in zip(texts, labels) if str(label) in known]
+        if not pairs:
+            raise ValueError("Среди размеченных примеров нет категорий, известных каскаду")
+        if len(pairs) < len(labels):
+            print(f"⚠️  Калибровка: пропущено {len(labels) - len(pairs)} примеров с неизвестными категориями")
+        texts = [text for text, _ in pairs]
+        labels = [label for _, label in pairs]
+
+        emb_scores = self._embedding_scores(texts, shared)
+        nb_rows = [None] * len(texts)
+        if self.nb_ready:
+            probabilities, classes = self._nb_proba(texts)
+            nb_rows = [dict(zip(classes, row.tolist())) for row in probabilities]
+        else:
+            nb_weights = (0.0,)
+
+        best = None
+        for temperature in temperatures:
+            for nb_weight in nb_weights:
+                log_loss = 0.0
+                correct = 0
+                for nb_row, emb_row, label in zip(nb_rows, emb_scores, labels):
+                    fused = self._fuse(nb_row, emb_row, temperature, nb_weight, shared)
+                    log_loss -= np.log(max(fused.get(label, 0.0), 1e-9))
+                    correct += bool(fused) and max(fused, key=fused.get) == label
+                log_loss /= max(len(texts), 1)
+                if best is None or log_loss < best['log_loss']:
+                    best = {'temperature': temperature, 'nb_weight': nb_weight,
+                            'log_loss': round(float(log_loss), 4),
+                            'accuracy': round(correct / max(len(texts), 1), 4)}
+
+        self.temperature = best['temperature']
+        self.nb_weight = best['nb_weight']
+        print(f"✓ Калибровка: temperature={self.temperature}, nb_weight={self.nb_weight}, "
+              f"log-loss={best['log_loss']}, точность={best['accuracy'] * 100:.1f}%")
+        return best
+
+    # ======================= СТАТИСТИКА =======================
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats = {stage: {'processed': 0, 'hits': 0, 'seconds': 0.0}
+                           for stage in ('total',) + STAGES}
+
+    def _count(self, stage: str, processed: int, seconds: float, hits: int) -> None:
+        with self._stats_lock:
+            entry = self._stats[stage]
+            entry['processed'] += processed
+            entry['hits'] += hits
+            entry['seconds'] += seconds
+
+    def stats(self) -> Dict:
+        """
+        Доля ответов и задержка по ступеням
+
+        hit_rate - доля всех текстов, на которых ступень дала ответ;
+        ms_per_item - время ступени на один дошедший до неё текст
+        """
+        with self._stats_lock:
+            total = self._stats['total']['processed']
+            report = {'total': total}
+            for stage in STAGES:
+                entry = self._stats[stage]
+                report[stage] = {
+                    'processed': entry['processed'],
+                    'hits': entry['hits'],
+                    'hit_rate': round(entry['hits'] / total, 4) if total else 0.0,
+                    'ms_per_item': round(entry['seconds'] * 1000 / entry['processed'], 3)
+                    if entry['processed'] else 0.0,
+                    'seconds': round(entry['seconds'], 4),
+                }
+        return report
+
+    def print_stats(self) -> None:
+        report = self.stats()
+        print(f"\n📊 Каскад: {report['total']} текстов")
+        for stage in STAGES:
+            entry = report[stage]
+            print(f"  {stage:11} ответов {entry['hits']:7} ({entry['hit_rate'] * 100:5.1f}%), "
+                  f"{entry['ms_per_item']:8.3f} мс на текст")
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from classifier import CompanyClassifier
+    from loaders import read_csv
+    from rubrics_classifier import RubricsClassifier
+
+    parser = argparse.ArgumentParser(description='Каскадная классификация: правила -> NB -> эмбеддинги')
+    parser.add_argument('--categories', default='categories.csv', help='CSV категорий (№, Тип, Общее описание)')
+    parser.add_argument('--input', default='rubrics.txt', help='Тексты, по одному в строке')
+    parser.add_argument('--threshold', type=float, default=MIN_CONFIDENCE_THRESHOLD,
+                        help='Уверенность NB, ниже которой текст уходит на эмбеддинги')
+    parser.add_argument('--calibrate', help='CSV с размеченными примерами (столбцы text, category)')
+    parser.add_argument('--output', '-o', help='Сохранить результаты и статистику в JSON')
+    args = parser.parse_args()
+
+    categories_df = read_csv(args.categories)
+    rubrics_classifier = RubricsClassifier()
+    rubrics_classifier.load_categories(
+        [{'id': row['№'], 'name': row['Тип'], 'description': row['Общее описание']}
+         for _, row in categories_df.iterrows()],
+        source_file=args.categories
+    )
+    cascade = CascadeClassifier(CompanyClassifier(), rubrics_classifier, threshold=args.threshold)
+
+    if args.calibrate:
+        labeled = read_csv(args.calibrate)
+        cascade.calibrate(labeled['text'].astype(str).tolist(), labeled['category'].astype(str).tolist())
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+
+    results = cascade.classify_batch(texts)
+    for text, result in list(zip(texts, results))[:10]:
+        print(f"  [{result['stage'] or '-':10}] {text[:40]:40} -> {result['category']} "
+              f"({result['confidence'] * 100:.1f}%)")
+    cascade.print_stats()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': [dict(text=t, **r) for t, r in zip(texts, results)],
+                       'stats': cascade.stats()}, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Результаты сохранены в {args.output}")
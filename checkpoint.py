@@ -0,0 +1,191 @@
+"""
+Контрольные точки потоковой классификации (pipeline.classify_file)
+
+После каждого чанка в манифест (JSON, атомарная замена файла) записываются: сколько
+записей источника обработано, размеры выходных файлов, состояние отчёта и счётчиков
+и число ключей в журнале дедупликации. Если запуск упал, следующий продолжает с последнего
+записанного чанка: выходные файлы обрезаются до зафиксированного размера и дописываются,
+поэтому результат байт в байт совпадает с непрерывным запуском.
+
+Входной файл, не изменившийся с прошлого полного запуска, пропускается. Проверяются размер
+и mtime, а если mtime изменился при том же размере - хеш содержимого.
+
+Записи в БД (DatabaseSink) откатить нельзя: чанк, сохранённый в БД, но не попавший
+в манифест, при продолжении сохранится повторно.
+
+Использование:
+    checkpoint = Checkpoint('output/classified.csv.checkpoint.json')
+    report = pipeline.classify_file('data/companies.csv', ..., checkpoint=checkpoint)
+    checkpoint.skipped, checkpoint.resumed_from
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_VERSION = 1
+HASH_BLOCK = 1024 * 1024
+KEY_SIZE = 8  # байт на ключ журнала дедупликации (pipeline.dedupe)
+
+
+def file_hash(path) -> str:
+    """blake2b содержимого файла (читается блоками)"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path, with_hash: bool = True) -> Dict:
+    """Размер, mtime и (with_hash) хеш входного файла"""
+    stat = os.stat(path)
+    result = {'path': str(Path(path).resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        result['hash'] = file_hash(path)
+    return result
+
+
+def unchanged(saved: Dict, path) -> bool:
+    """Файл совпадает с сохранённым отпечатком: размер + mtime, иначе хеш"""
+    try:
+        current = fingerprint(path, with_hash=False)
+    except OSError:
+        return False
+    if current['path'] != saved.get('path') or current['size'] != saved.get('size'):
+        return False
+    if current['mtime_ns'] == saved.get('mtime_ns'):
+        return True
+    # Файл трогали (копирование, touch) - решает содержимое
+    return saved.get('hash') == file_hash(path)
+
+
+def model_fingerprint(classifier) -> Dict:
+    """
+    Отпечаток загруженной модели (classifier.fingerprint()): CompanyClassifier - хеш
+    файлов модели и правил, RubricsClassifier - модель эмбеддингов и категории.
+    Переобученная модель - повод классифицировать заново
+    """
+    return {type(classifier).__name__: classifier.fingerprint()}
+
+
+class Checkpoint:
+    """Манифест одного запуска classify_file и журнал ключей дедупликации рядом с ним"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.keys_path = self.path.with_name(self.path.name + '.keys')
+        self.manifest = None
+        self.skipped = False  # вход не менялся - результат прошлого запуска
+        self.resumed_from = 0  # записей источника, пропущенных при продолжении
+
+    def _load(self) -> Optional[Dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _outputs_intact(manifest: Dict) -> bool:
+        """
+        Выходные файлы на месте: после завершения - ровно зафиксированного размера,
+        у прерванного запуска - не короче (хвост незавершённого чанка отрежется)
+        """
+        for output, size in manifest.get('outputs', {}).items():
+            if not Path(output).exists():
+                return False
+            actual = Path(output).stat().st_size
+            if actual < size or (manifest['complete'] and actual != size):
+                return False
+        return True
+
+    def begin(self, source, settings: Dict) -> str:
+        """
+        Решить, как запускать: 'skip' (вход и настройки не менялись, запуск завершён),
+        'resume' (продолжить незавершённый) или 'fresh' (с начала)
+        """
+        manifest = self._load()
+        if (manifest and manifest['settings'] == settings and unchanged(manifest['input'], source)
+                and self._outputs_intact(manifest)):
+            self.manifest = manifest
+            if manifest['complete']:
+                self.skipped = True
+                return 'skip'
+            self.resumed_from = manifest['position']
+            return 'resume'
+
+        self.manifest = {
+            'version': MANIFEST_VERSION,
+            'input': fingerprint(source),
+            'settings': settings,
+            'position': 0,
+            'chunks': 0,
+            'keys': 0,
+            'stats': {},
+            'sinks': [],
+            'outputs': {},
+            'complete': False,
+            'result': None
+        }
+        if self.keys_path.exists():
+            self.keys_path.unlink()
+        self._save()
+        return 'fresh'
+
+    def restore_keys(self) -> List[bytes]:
+        """Ключи дедупликации до последнего чанка; хвост после него отбрасывается"""
+        count = self.manifest['keys']
+        if not count:
+            if self.keys_path.exists():
+                self.keys_path.unlink()
+            return []
+        with open(self.keys_path, 'r+b') as f:
+            data = f.read(count * KEY_SIZE)
+            f.truncate(count * KEY_SIZE)
+        return [data[i:i + KEY_SIZE] for i in range(0, len(data), KEY_SIZE)]
+
+    def commit(self, position: int, stats: Dict, sinks, keys: List[bytes]):
+        """
+        Зафиксировать чанк: position записей источника обработано, приёмники записали
+        всё до него. keys - новые ключи дедупликации (список очищается)
+        """
+        if keys:
+            with open(self.keys_path, 'ab') as f:
+                f.write(b''.join(keys))
+            self.manifest['keys'] += len(keys)
+            keys.clear()
+        states = [sink.state() for sink in sinks]
+        self.manifest.update({
+            'position': position,
+            'chunks': self.manifest['chunks'] + 1,
+            'stats': dict(stats),
+            'sinks': states,
+            'outputs': {state['path']: state['size'] for state in states if state.get('path')}
+        })
+        self._save()
+
+    def finish(self, result: Dict, sinks):
+        """Запуск завершён: размеры выходов и итоговый отчёт - для пропуска при повторе"""
+        states = [sink.state() for sink in sinks]
+        self.manifest.update({
+            'complete': True,
+            'result': result,
+            'sinks': states,
+            'outputs': {state['path']: state['size'] for state in states if state.get('path')}
+        })
+        self._save()
+        if self.keys_path.exists():
+            self.keys_path.unlink()
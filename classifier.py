@@ -6,6 +6,9 @@
 ✅ Безопасная работа с данными
 """
 
+import copy
+import hashlib
+import json
 import pickle
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -13,13 +16,24 @@ from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 import os
 from pathlib import Path
+from vector_index import top_k
+from hashing_features import IncrementalHashingVectorizer
+from config import TRAIN_CHUNK_SIZE, VECTORIZER_MODE
+import metrics
 
 class CompanyClassifier:
     """Классификатор компаний с поддержкой правил"""
     
-    def __init__(self, model_path='models'):
+    def __init__(self, model_path='models', vectorizer_mode=VECTORIZER_MODE):
+        """
+        Args:
+            model_path: папка с pickle модели
+            vectorizer_mode: признаки новой модели - 'tfidf' (словарь) или 'hashing'
+                             (фиксированный размер, потоковое обучение, см. hashing_features.py)
+        """
         self.model_path = Path(model_path)
         self.model_path.mkdir(exist_ok=True)
+        self.vectorizer_mode = vectorizer_mode
         
         # Инициализация компонентов
         self.vectorizer = None
@@ -52,7 +66,7 @@ class CompanyClassifier:
             
             # Если моделей нет, создаем новые
             if not self.vectorizer:
-                self.vectorizer = TfidfVectorizer(max_features=5000, lowercase=True, stop_words='english')
+                self.vectorizer = self._new_vectorizer()
             
             if not self.classifier:
                 self.classifier = MultinomialNB()
@@ -61,9 +75,15 @@ class CompanyClassifier:
         
         except Exception as e:
             print(f"⚠️ Ошибка загрузки модели: {e}")
-            self.vectorizer = TfidfVectorizer(max_features=5000, lowercase=True, stop_words='english')
+            self.vectorizer = self._new_vectorizer()
             self.classifier = MultinomialNB()
     
+    def _new_vectorizer(self):
+        """Новый (необученный) векторайзер для vectorizer_mode"""
+        if self.vectorizer_mode == 'hashing':
+            return IncrementalHashingVectorizer()
+        return TfidfVectorizer(max_features=5000, lowercase=True, stop_words='english')
+    
     def save_model(self):
         """Сохранить модель в файлы"""
         try:
@@ -84,6 +104,20 @@ class CompanyClassifier:
         except Exception as e:
             print(f"❌ Ошибка сохранения модели: {e}")
     
+    def fingerprint(self):
+        """
+        Версия модели и правил для кэша результатов (pipeline.ResultCache): хеш файлов
+        модели и списка правил. Переобучение или новое правило - другой отпечаток
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for name in ('vectorizer.pkl', 'classifier_model.pkl', 'label_encoder.pkl'):
+            path = self.model_path / name
+            if path.exists():
+                digest.update(name.encode())
+                digest.update(path.read_bytes())
+        digest.update(json.dumps(self.training_rules, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+    
     def add_training_rule(self, keyword, category, priority=50):
         """Добавить правило классификации"""
         try:
@@ -101,6 +135,7 @@ class CompanyClassifier:
             print(f"❌ Ошибка добавления правила: {e}")
             return False
     
+    @metrics.timed('rules')
     def check_rules(self, text):
         """Проверить текст по правилам"""
         try:
@@ -150,10 +185,12 @@ class CompanyClassifier:
             
             try:
                 # Векторизуем текст
-                X = self.vectorizer.transform([text])
+                with metrics.timer('vectorize', rows=1):
+                    X = self.vectorizer.transform([text])
                 
                 # Получаем вероятности
-                probabilities = self.classifier.predict_proba(X)[0]
+                with metrics.timer('predict', rows=1):
+                    probabilities = self.classifier.predict_proba(X)[0]
                 
                 # Получаем классы
                 classes = self.classifier.classes_
@@ -177,46 +214,80 @@ class CompanyClassifier:
             print(f"❌ Ошибка classify_text: {e}")
             return 'Неизвестно', 0.0
     
-    def classify_top_n(self, text, n=3):
-        """Классифицировать текст и вернуть топ N"""
+    def top_n_batch(self, texts, n=3):
+        """
+        Топ N классов для батча текстов без полной сортировки
+        
+        Returns:
+            (индексы классов, вероятности) - массивы формы (len(texts), n),
+            индекс -1 - класса нет (классов меньше n)
+        """
+        with metrics.timer('vectorize', rows=len(texts)):
+            X = self.vectorizer.transform(texts)
+        with metrics.timer('predict', rows=len(texts)):
+            probabilities = self.classifier.predict_proba(X)
+        scores, indices = top_k(probabilities, n)
+        return indices, scores
+    
+    def classify_top_n_batch(self, texts, n=3):
+        """Классифицировать батч текстов и вернуть топ N для каждого"""
+        unknown = [('Неизвестно', 0.0)]
         try:
-            if not text or not isinstance(text, str):
-                return [('Неизвестно', 0.0)]
-            
             if not self.classifier or not self.vectorizer:
-                return [('Неизвестно', 0.0)]
+                return [unknown for _ in texts]
             
-            try:
-                # Векторизуем текст
-                X = self.vectorizer.transform([text])
-                
-                # Получаем вероятности
-                probabilities = self.classifier.predict_proba(X)[0]
-                
-                # Получаем классы
-                classes = self.classifier.classes_
-                
-                # Создаем список (класс, вероятность)
-                results = []
-                for cls, prob in zip(classes, probabilities):
-                    results.append((str(cls), float(prob)))
-                
-                # Сортируем по вероятности в убывающем порядке
-                results.sort(key=lambda x: x[1], reverse=True)
-                
-                # Возвращаем топ N
-                return results[:n] if results else [('Неизвестно', 0.0)]
+            valid = [i for i, text in enumerate(texts) if text and isinstance(text, str)]
+            results = [unknown] * len(texts)
+            if not valid:
+                return results
             
-            except Exception as e:
-                print(f"⚠️ Ошибка classify_top_n: {e}")
-                return [('Неизвестно', 0.0)]
+            indices, scores = self.top_n_batch([texts[i] for i in valid], n=n)
+            
+            # Строки классов - только на выходе
+            classes = self.classifier.classes_
+            for i, row_indices, row_scores in zip(valid, indices, scores):
+                top = [(str(classes[j]), float(score))
+                       for j, score in zip(row_indices, row_scores) if j >= 0]
+                results[i] = top or unknown
+            return results
         
         except Exception as e:
-            print(f"❌ Ошибка classify_top_n: {e}")
-            return [('Неизвестно', 0.0)]
+            print(f"⚠️ Ошибка classify_top_n: {e}")
+            return [unknown for _ in texts]
     
-    def train(self, texts, labels):
-        """Обучить модель"""
+    def classify_top_n(self, text, n=3):
+        """Классифицировать текст и вернуть топ N"""
+        return self.classify_top_n_batch([text], n=n)[0]
+
+    def classify_batch(self, texts, n=3):
+        """
+        classify_text + classify_top_n для батча текстов за один проход модели
+
+        Returns:
+            список (категория, уверенность, топ N) - как по отдельным вызовам
+        """
+        tops = self.classify_top_n_batch(texts, n=n)
+        results = []
+        for text, top in zip(texts, tops):
+            if not text or not isinstance(text, str):
+                results.append(('Неизвестно', 0.0, top))
+                continue
+            rule_category, rule_confidence = self.check_rules(text)
+            if rule_category and rule_confidence and rule_confidence > 0.7:
+                results.append((rule_category, rule_confidence, top))
+            else:
+                category, confidence = top[0]
+                results.append((category, confidence, top))
+        return results
+
+    def train(self, texts, labels, db=None):
+        """
+        Обучить модель
+        
+        Args:
+            db: Database - сохранить примеры в training_data (база для полного
+                переобучения в online_learning.py)
+        """
         try:
             if not texts or not labels:
                 print("❌ Нет данных для обучения")
@@ -233,6 +304,8 @@ class CompanyClassifier:
             
             # Сохраняем модель
             self.save_model()
+            if db is not None:
+                db.replace_training_examples(zip(texts, labels))
             
             print(f"✅ Модель обучена на {len(texts)} примерах")
             return True
@@ -240,6 +313,107 @@ class CompanyClassifier:
         except Exception as e:
             print(f"❌ Ошибка обучения: {e}")
             return False
+    
+    def partial_update(self, texts, labels):
+        """
+        Дообучить модель на новых примерах без переобучения векторайзера
+        
+        Признаки фиксированы (словарь TF-IDF или хеширование), поэтому достаточно
+        MultinomialNB.partial_fit. Обновляются копии модели, затем подменяются
+        целиком - параллельная классификация не видит промежуточного состояния.
+        
+        Raises:
+            ValueError: модель не обучена или среди labels есть новые категории
+                        (для них нужно полное переобучение)
+        """
+        if not hasattr(self.classifier, 'classes_'):
+            raise ValueError("Модель не обучена - нужно полное обучение")
+        unknown = set(labels) - set(str(c) for c in self.classifier.classes_)
+        if unknown:
+            raise ValueError(f"Новые категории, нужно полное переобучение: {sorted(unknown)}")
+        
+        vectorizer = self.vectorizer
+        if isinstance(vectorizer, IncrementalHashingVectorizer):
+            vectorizer = copy.deepcopy(vectorizer).partial_fit(texts)
+        classifier = copy.deepcopy(self.classifier)
+        classifier.partial_fit(vectorizer.transform(texts), labels)
+        
+        self.vectorizer, self.classifier = vectorizer, classifier
+        return len(texts)
+    
+    def train_streaming(self, chunks, db=None):
+        """
+        Обучить модель потоком, не держа все данные в памяти (режим 'hashing')
+        
+        Два прохода по данным: сначала частоты IDF и список категорий,
+        затем MultinomialNB.partial_fit по кускам.
+        
+        Args:
+            chunks: функция без аргументов, каждый вызов которой возвращает новый
+                    итератор кусков (texts, labels)
+            db: Database - сохранить примеры в training_data (третий проход)
+        """
+        try:
+            if not isinstance(self.vectorizer, IncrementalHashingVectorizer):
+                print("🔄 Потоковое обучение: переключаюсь на признаки 'hashing'")
+                self.vectorizer_mode = 'hashing'
+            self.vectorizer = IncrementalHashingVectorizer()
+            self.classifier = MultinomialNB()
+            
+            # Проход 1: IDF и категории
+            labels_seen = set()
+            for texts, labels in chunks():
+                self.vectorizer.partial_fit(texts)
+                labels_seen.update(labels)
+            if not labels_seen:
+                print("❌ Нет данных для обучения")
+                return False
+            classes = sorted(labels_seen)
+            
+            # Проход 2: NB по кускам
+            total = 0
+            for texts, labels in chunks():
+                if len(texts):
+                    self.classifier.partial_fit(self.vectorizer.transform(texts), labels, classes=classes)
+                    total += len(texts)
+            
+            self.categories = classes
+            self.save_model()
+            if db is not None:
+                db.replace_training_examples(
+                    pair for texts, labels in chunks() for pair in zip(texts, labels))
+            
+            print(f"✅ Модель обучена потоком на {total} примерах ({len(classes)} категорий)")
+            return True
+        
+        except Exception as e:
+            print(f"❌ Ошибка потокового обучения: {e}")
+            return False
+    
+    def train_streaming_csv(self, filepath, text_columns, label_column, sep=None,
+                            encoding=None, chunk_size=TRAIN_CHUNK_SIZE, db=None):
+        """
+        Потоковое обучение из CSV (читается кусками по chunk_size строк)
+        
+        Args:
+            text_columns: столбцы, которые склеиваются в текст
+            label_column: столбец с категорией
+            sep, encoding: None - определяются по началу файла (loaders.sniff)
+            db: Database - сохранить примеры в training_data
+        """
+        from loaders import read_csv, sniff
+        
+        csv_format = sniff(filepath)
+        overrides = {key: value for key, value in (('sep', sep), ('encoding', encoding)) if value}
+        
+        def chunks():
+            for df in read_csv(filepath, fmt=csv_format, chunksize=chunk_size, **overrides,
+                               usecols=list(dict.fromkeys([*text_columns, label_column])), dtype=str):
+                df = df.dropna(subset=[label_column])
+                texts = df[list(text_columns)].fillna('').agg(' '.join, axis=1).tolist()
+                yield texts, df[label_column].tolist()
+        
+        return self.train_streaming(chunks, db=db)
 
 
 # ==================== ИНТЕГРАЦИЯ ====================
@@ -35,6 +35,102 @@ N_ESTIMATORS = 200
 MAX_DEPTH = 15
 RANDOM_STATE = 42
 
+# Признаки CompanyClassifier: 'tfidf' (словарь, TfidfVectorizer) или 'hashing'
+# (символьные n-граммы + хеширование, фиксированный размер, потоковое обучение)
+VECTORIZER_MODE = 'tfidf'
+HASHING_N_FEATURES = 2 ** 15  # модель NB занимает ~ 16 байт * признаки * категории
+HASHING_NGRAM_RANGE = (2, 4)
+TRAIN_CHUNK_SIZE = 10000  # строк за раз при потоковом обучении
+
+# Дообучение CompanyClassifier по корректировкам (online_learning.py)
+ONLINE_BATCH_SIZE = 32  # корректировок в одном partial_fit
+ONLINE_REBUILD_EVERY = 500  # полное переобучение после стольких дообучений на корректировках
+ONLINE_STATE_FILE = 'models/online_state.json'  # версия модели и id последней учтённой корректировки
+
+# Каскад: правила -> TF-IDF + NB -> эмбеддинги (cascade_classifier.py)
+# На эмбеддинги уходят только тексты с уверенностью NB ниже MIN_CONFIDENCE_THRESHOLD
+CASCADE_RULE_MIN_CONFIDENCE = 0.7  # правило срабатывает при приоритете / 100 строго выше порога, как в CompanyClassifier.classify_text
+CASCADE_NB_WEIGHT = 0.3  # вес вероятностей NB при слиянии с эмбеддингами
+CASCADE_TEMPERATURE = 0.05  # температура softmax по сходствам категорий
+CASCADE_CANDIDATES = 10  # категорий-кандидатов от эмбеддингов при слиянии
+
+# Энкодер предложений: 'torch' (SentenceTransformer) или 'onnx' (onnxruntime, CPU)
+# ONNX модель создаётся один раз: python onnx_encoder.py --export
+ENCODER_BACKEND = 'torch'
+ONNX_MODEL_DIR = 'models/onnx/paraphrase-multilingual-MiniLM-L12-v2'
+ONNX_QUANTIZED = True  # использовать int8-версию, если она экспортирована
+ONNX_THREADS = 0  # 0 - по числу ядер
+
+# Батчи кодирования: тексты группируются по длине, размер батча - по бюджету токенов
+ENCODE_MAX_TOKENS_PER_BATCH = 8192  # размер батча * длина самого длинного текста
+ENCODE_MAX_BATCH_SIZE = 256
+# Объединение одиночных запросов (RubricsClassifier.enable_micro_batching)
+ENCODE_MICROBATCH_WAIT_MS = 5
+ENCODE_MICROBATCH_MAX_SIZE = 64
+# Объединение одновременных /api/classify_*_single в один вызов CompanyClassifier
+CLASSIFY_MICROBATCH_ENABLED = True
+CLASSIFY_MICROBATCH_WAIT_MS = 3
+CLASSIFY_MICROBATCH_MAX_SIZE = 64
+CLASSIFY_MICROBATCH_TIMEOUT = 30  # секунд ожидания результата батча
+# /api/classify/batch/*: элементов в одном вызове модели и одной транзакции БД
+BATCH_API_CHUNK_SIZE = 256
+
+# Потоковый конвейер (pipeline.py)
+PIPELINE_CHUNK_SIZE = 1000  # записей в одном вызове модели и одной транзакции БД
+PIPELINE_PREFETCH = 2000  # записей, прочитанных источником заранее (0 - без фонового чтения)
+PIPELINE_DEDUPE_MAX = 1000000  # различных текстов, которые помнит dedupe
+PIPELINE_LOW_CONFIDENCE = 0.6  # порог низкой уверенности в отчёте
+BATCH_PREFETCH_FILES = 1  # файлов, которые batch_process разбирает заранее, пока классифицируется текущий
+BATCH_PARSE_WORKERS = 2  # потоков общего пула разбора файлов (текущий + заранее)
+
+# Тёплый старт RubricsClassifier: локальная модель + закодированные категории
+WARM_START = True
+WARM_START_DIR = 'models/warm_start'
+
+# Хранение эмбеддингов в индексах: 'float32', 'float16' или 'int8'
+# (для выбора: python vector_index.py --quant-report data/categories.csv)
+EMBEDDING_DTYPE = 'float32'
+
+# Память корректировок (kNN по исправленным рубрикам)
+CORRECTIONS_INDEX_FILE = 'models/corrections_index.npz'
+CORRECTIONS_KNN_K = 10  # соседей на запрос
+CORRECTIONS_KNN_WEIGHT = 0.5  # вес голосования соседей против сходства с описанием
+CORRECTIONS_MIN_SIMILARITY = 0.75  # соседи с меньшим косинусным сходством не голосуют
+CORRECTIONS_SYNC_INTERVAL = 5.0  # секунд между проверками БД на новые корректировки
+CORRECTIONS_COMPACT_EVERY = 1000  # примеров в журнале индекса до перезаписи .npz
+# app_web.py: /api/classify_rubric_single через RubricsClassifier (CATEGORIES_FILE)
+# с памятью корректировок; /api/submit_correction сразу делает её устаревшей
+WEB_RUBRICS_CORRECTIONS = False
+
+# Загрузка файлов
+SNIFF_SAMPLE_BYTES = 64 * 1024  # начало файла для определения кодировки, разделителя и заголовка
+CSV_ENGINE = 'auto'  # 'auto' - pyarrow, если установлен; 'c' - движок pandas (loaders.py)
+UPLOAD_SPOOL_MAX_MEMORY = 16 * 1024 * 1024  # загрузки больше - во временный файл (анонимный)
+LAZY_READ_BYTES = 8 * 1024 * 1024  # окно декодирования при ленивом чтении через mmap
+
+# Экспорт в Excel
+EXCEL_MAX_ROWS = 200000  # больше - экспорт в EXCEL_FALLBACK_FORMAT вместо xlsx
+EXCEL_FALLBACK_FORMAT = 'csv'  # 'csv' или 'parquet'
+EXCEL_WIDTH_SAMPLE_ROWS = 1000  # строк для оценки ширины столбцов
+
+# Метрики (metrics.py, /api/metrics): гистограммы по этапам, счётчики БД и кэшей
+METRICS_ENABLED = True
+METRICS_FLUSH_INTERVAL = 1.0  # секунд между записью метрик процесса в общий каталог (serve.py)
+
+# Профилирование CLI (--profile, profiling.py)
+PROFILE_SAMPLE_INTERVAL = 0.005  # период сэмплинга стеков для flamegraph, секунды
+PROFILE_TOP_N = 30  # функций в сводке profile_<name>.json
+
+# Продакшн-сервер (serve.py, gunicorn): модель загружается в мастере до fork
+SERVE_HOST = '0.0.0.0'
+SERVE_PORT = 5000
+SERVE_WORKERS = 2  # процессов-воркеров
+SERVE_THREADS = 4  # потоков на воркер
+SERVE_TIMEOUT = 120  # секунд на запрос (загрузка больших файлов)
+SERVE_GRACEFUL_TIMEOUT = 30  # секунд на завершение старых воркеров при перезагрузке
+SERVE_MODEL_POLL_INTERVAL = 10  # секунд между проверками новой версии модели
+SERVE_METRICS_DIR = 'output/metrics'  # общий каталог метрик воркеров (/api/metrics - сумма по процессам)
+
 # Логирование
 LOG_LEVEL = 'INFO'
 LOG_FILE = 'output/classification.log'
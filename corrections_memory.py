@@ -0,0 +1,233 @@
+"""
+Память корректировок: исправленные оператором рубрики как размеченные примеры
+
+Каждая корректировка (таблица corrections) кодируется один раз и добавляется
+в векторный индекс на диске. При классификации ближайшие исправленные примеры
+голосуют за свои категории - исправление действует сразу, без переобучения.
+
+Новые примеры дописываются в журнал рядом с индексом (<индекс>.log), а не перезаписывают
+.npz целиком; журнал сливается в индекс каждые CORRECTIONS_COMPACT_EVERY примеров.
+Журнал может писать несколько процессов (воркеры gunicorn): запись и слияние идут под
+блокировкой файла <индекс>.lock, а повторы одной корректировки (по её id) отбрасываются
+при чтении журнала и при добавлении.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # Windows - блокировка между процессами недоступна
+    fcntl = None
+
+import numpy as np
+
+from config import (CORRECTIONS_COMPACT_EVERY, CORRECTIONS_INDEX_FILE, CORRECTIONS_KNN_K,
+                    CORRECTIONS_MIN_SIMILARITY, CORRECTIONS_SYNC_INTERVAL)
+from vector_index import create_index, load_index
+
+
+class CorrectionsMemory:
+    """Индекс эмбеддингов исправленных примеров с голосованием ближайших соседей"""
+
+    def __init__(self, model, index_path: str = CORRECTIONS_INDEX_FILE, index_type: str = 'flat',
+                 k: int = CORRECTIONS_KNN_K, min_similarity: float = CORRECTIONS_MIN_SIMILARITY,
+                 dtype: str = 'float32', sync_interval: float = CORRECTIONS_SYNC_INTERVAL,
+                 compact_every: int = CORRECTIONS_COMPACT_EVERY):
+        """
+        Args:
+            model: модель с методом encode (та же, что у RubricsClassifier)
+            index_path: файл индекса (.npz), обновляется после каждого добавления
+            index_type: 'flat' или 'ivf' (см. vector_index.py)
+            k: сколько соседей участвует в голосовании
+            min_similarity: минимальное косинусное сходство соседа
+            dtype: хранение векторов в новом индексе - 'float32', 'float16' или 'int8'
+            sync_interval: секунд между проверками БД на новые корректировки (maybe_sync)
+            compact_every: сколько примеров журнала сливать в .npz за раз
+        """
+        self.model = model
+        self.index_path = Path(index_path)
+        self.log_path = self.index_path.with_name(self.index_path.name + '.log')
+        self.lock_path = self.index_path.with_name(self.index_path.name + '.lock')
+        self.index_type = index_type
+        self.k = k
+        self.min_similarity = min_similarity
+        self.dtype = dtype
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.index = None
+        self.correction_ids = set()  # id корректировок в индексе
+        self.last_id = 0  # id последней корректировки в индексе
+        self.logged = 0  # примеров, дописанных этим процессом в журнал после слияния
+        self.synced_at = 0.0
+        self.stale = True
+        self._lock = threading.Lock()  # один sync за раз
+        self._index_lock = threading.Lock()  # векторы и ids индекса меняются и читаются вместе
+
+        if self.index_path.exists():
+            try:
+                self.index = load_index(str(self.index_path))
+                # id хранятся как [correction_id, category]
+                self.correction_ids = {correction_id for correction_id, _ in self.index.ids}
+                with self._file_lock():
+                    self._replay_log()
+                self.last_id = max(self.correction_ids, default=0)
+                print(f"✓ Память корректировок загружена: {len(self.index)} примеров")
+            except Exception as e:
+                print(f"⚠️ Ошибка загрузки памяти корректировок: {e}")
+
+    def __len__(self) -> int:
+        return len(self.index) if self.index is not None else 0
+
+    @contextmanager
+    def _file_lock(self):
+        """Исключительная блокировка журнала и .npz между процессами (flock на <индекс>.lock)"""
+        if fcntl is None:
+            yield
+            return
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _add_to_index(self, embeddings: np.ndarray, ids: List):
+        with self._index_lock:
+            if self.index is None:
+                self.index = create_index(self.index_type, embeddings.shape[1], dtype=self.dtype)
+            self.index.add(embeddings, ids)
+        self.correction_ids.update(correction_id for correction_id, _ in ids)
+        self.last_id = max(self.last_id, max(correction_id for correction_id, _ in ids))
+
+    def _replay_log(self) -> int:
+        """
+        Дочитать журнал добавлений (под _file_lock). Записи корректировок, уже
+        попавших в индекс (сбой между записью .npz и удалением журнала, повтор
+        от другого процесса), пропускаются; неполная последняя запись отбрасывается
+
+        Returns:
+            количество добавленных примеров
+        """
+        if not self.log_path.exists():
+            return 0
+        added = 0
+        with open(self.log_path, 'rb') as f:
+            while True:
+                header = f.readline()
+                if not header.endswith(b'\n'):
+                    break
+                meta = json.loads(header)
+                size = meta['rows'] * meta['dim'] * 4
+                data = f.read(size)
+                if len(data) < size:
+                    break
+                rows = [i for i, (correction_id, _) in enumerate(meta['ids'])
+                        if correction_id not in self.correction_ids]
+                if rows:
+                    embeddings = np.frombuffer(data, dtype=np.float32).reshape(meta['rows'], meta['dim'])
+                    self._add_to_index(embeddings[rows], [meta['ids'][i] for i in rows])
+                    added += len(rows)
+        return added
+
+    def _append_log(self, embeddings: np.ndarray, ids: List):
+        """Дописать пачку в журнал (под _file_lock): строка JSON (rows, dim, ids) + векторы float32"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        meta = {'rows': len(embeddings), 'dim': embeddings.shape[1], 'ids': ids}
+        with open(self.log_path, 'ab') as f:
+            f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n' + embeddings.tobytes())
+        self.logged += len(embeddings)
+
+    def _save(self):
+        """
+        Записать индекс целиком и очистить журнал (под _file_lock). Сначала дочитываются
+        записи журнала от других процессов, .npz заменяется атомарно
+        """
+        self._replay_log()
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with self._index_lock:
+            self.index.save(str(tmp_path))
+        os.replace(tmp_path, self.index_path)
+        if self.log_path.exists():
+            self.log_path.unlink()
+        self.logged = 0
+
+    def add(self, examples: List[Dict]) -> int:
+        """
+        Добавить исправленные примеры: новый индекс сохраняется целиком,
+        дальше пачки дописываются в журнал (сливается каждые compact_every примеров).
+        Корректировки, которые уже есть в индексе, пропускаются
+
+        Args:
+            examples: словари с ключами id, text, corrected_category
+                      (формат Database.get_corrected_examples)
+
+        Returns:
+            количество добавленных примеров
+        """
+        examples = [ex for ex in examples if ex.get('text') and int(ex['id']) not in self.correction_ids]
+        if not examples:
+            return 0
+
+        # Кодирование - без блокировок: классификация в это время идёт по старому индексу
+        embeddings = np.atleast_2d(self.model.encode([ex['text'] for ex in examples]))
+        ids = [[int(ex['id']), ex['corrected_category']] for ex in examples]
+        self._add_to_index(embeddings, ids)
+        with self._file_lock():
+            if not self.index_path.exists():
+                self._save()
+            else:
+                self._append_log(embeddings, ids)
+                if self.logged >= self.compact_every:
+                    self._save()
+        return len(examples)
+
+    def sync(self, db) -> int:
+        """Догрузить из БД корректировки, которых ещё нет в индексе"""
+        with self._lock:
+            added = self.add(db.get_corrected_examples(after_id=self.last_id))
+            self.synced_at = time.monotonic()
+            self.stale = False
+            return added
+
+    def maybe_sync(self, db) -> int:
+        """sync, если пришла новая корректировка (mark_stale) или прошло sync_interval секунд"""
+        if not self.stale and time.monotonic() - self.synced_at < self.sync_interval:
+            return 0
+        return self.sync(db)
+
+    def mark_stale(self):
+        """В БД появилась корректировка - следующая классификация её подхватит"""
+        self.stale = True
+
+    def vote(self, embeddings: np.ndarray) -> List[Dict[str, float]]:
+        """
+        Голосование ближайших исправленных примеров
+
+        Returns:
+            для каждого эмбеддинга {категория: доля голосов 0-1}, взвешенных по сходству;
+            пустой словарь, если близких примеров нет
+        """
+        if not self:
+            return [{} for _ in range(len(embeddings))]
+
+        # Поиск и чтение ids - под одной блокировкой с add: векторы и метки согласованы
+        with self._index_lock:
+            scores, positions = self.index.search(embeddings, self.k)
+            labels = [[self.index.ids[pos][1] if pos >= 0 else None for pos in row] for row in positions]
+        votes = []
+        for row_scores, row_positions, row_labels in zip(scores, positions, labels):
+            row_votes = {}
+            for score, pos, category in zip(row_scores, row_positions, row_labels):
+                if pos < 0 or score < self.min_similarity:
+                    continue
+                row_votes[category] = row_votes.get(category, 0.0) + float(score)
+            total = sum(row_votes.values())
+            votes.append({category: weight / total for category, weight in row_votes.items()})
+        return votes
@@ -7,6 +7,8 @@ from pathlib import Path
 from typing import Dict, List
 from config import COMPANIES_FILE, CLASSIFIED_OUTPUT, REPORT_FILE
 from classifier import CompanyClassifier
+from data_processor_enhanced import DataProcessorEnhanced
+from loaders import read_csv, sniff
 import json
 from tqdm import tqdm
 
@@ -15,13 +17,18 @@ class DataProcessor:
     
     def __init__(self):
         self.companies_df = None
+        self.companies_file = None
+        self.companies_format = None
         self.classified_df = None
         self.classifier = CompanyClassifier()
         
     def load_companies(self, filepath: str) -> pd.DataFrame:
         """Загрузить компании из CSV (формат 2GIS)"""
         print(f"📂 Загрузка компаний из {filepath}...")
-        self.companies_df = pd.read_csv(filepath, encoding='utf-8')
+        # Формат запоминается - экспорт пишет в той же кодировке и с тем же разделителем
+        self.companies_format = sniff(filepath)
+        self.companies_df = read_csv(filepath, self.companies_format)
+        self.companies_file = filepath
         print(f"✓ Загружено {len(self.companies_df)} компаний")
         print(f"  Колонки: {self.companies_df.columns.tolist()}")
         return self.companies_df
@@ -97,20 +104,34 @@ class DataProcessor:
         
         return report
     
-    def export_for_2gis_parser(self, filepath: str) -> pd.DataFrame:
-        """Экспортировать результаты в расширенном формате 2GIS"""
+    def export_for_2gis_parser(self, filepath: str) -> str:
+        """
+        Экспортировать результаты в расширенном формате 2GIS
+        
+        Исходный CSV копируется построчно в его формате (кодировка, разделитель,
+        служебные строки), колонки классификации дописываются по индексу строки
+        (без объединения DataFrame)
+        
+        Returns:
+            путь к созданному файлу (объединённый DataFrame не строится)
+        """
         if self.classified_df is None:
             raise ValueError("Нет классифицированных данных")
         
-        # Объединяем с оригинальными данными
-        merged = pd.concat([
-            self.companies_df,
-            self.classified_df[['final_category', 'final_confidence', 'level1_category', 'level2_category']]
-        ], axis=1)
+        columns = ['final_category', 'final_confidence', 'level1_category', 'level2_category']
+        rows = self.classified_df[columns].itertuples(index=False, name=None)
+        
+        if self.companies_file and Path(self.companies_file).exists():
+            DataProcessorEnhanced.stream_merge_csv(self.companies_file, columns, rows, filepath,
+                                                   self.companies_format)
+        else:
+            # Исходного файла нет - пишем из памяти
+            self.companies_df.join(self.classified_df[columns]).to_csv(
+                filepath, index=False, encoding='utf-8'
+            )
         
-        merged.to_csv(filepath, index=False, encoding='utf-8')
         print(f"✓ Данные экспортированы в {filepath}")
-        return merged
+        return filepath
     
     def get_low_confidence_items(self, threshold: float = 0.6) -> pd.DataFrame:
         """Получить компании с низкой уверенностью"""
@@ -4,10 +4,20 @@
 """
 
 import pandas as pd
+import csv
+import io
 import json
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict, Tuple
+from itertools import chain, islice, zip_longest
+from typing import BinaryIO, Iterable, Iterator, List, Dict, Optional, Sequence, Tuple
 import openpyxl
+from openpyxl.utils import get_column_letter
+from config import EXCEL_MAX_ROWS, EXCEL_FALLBACK_FORMAT, EXCEL_WIDTH_SAMPLE_ROWS
+from json_stream import iter_json_array, iter_ndjson
+from loaders import (detect_encoding, iter_csv_records, iter_text_lines, read_csv,
+                     read_sample, sniff)
+import metrics
 
 class DataProcessorEnhanced:
     """Расширенный обработчик данных"""
@@ -25,37 +35,90 @@ class DataProcessorEnhanced:
         if not path.exists():
             raise FileNotFoundError(f"Файл не найден: {filepath}")
         
-        suffix = path.suffix.lower()
+        with open(path, 'rb') as f:
+            return DataProcessorEnhanced.load_stream(f, path.name)
+    
+    @staticmethod
+    def load_stream(stream: BinaryIO, filename: str) -> Tuple[List[str], str]:
+        """
+        Загрузить данные из бинарного потока (например, загруженного файла) без записи на диск
+        Формат - по расширению filename. Возвращает: (список элементов, формат файла)
+        """
+        suffix = Path(filename).suffix.lower()
+        
+        with metrics.timer('file_parse'):
+            if suffix == '.csv':
+                # Берем первый столбец - остальные не разбираем
+                df = read_csv(stream, usecols=[0])
+                items, fmt = df.iloc[:, 0].astype(str).tolist(), 'csv'
+            elif suffix == '.txt':
+                items, fmt = DataProcessorEnhanced._load_txt(stream), 'txt'
+            elif suffix in ['.xlsx', '.xls']:
+                items, fmt = pd.read_excel(stream).iloc[:, 0].astype(str).tolist(), 'excel'
+            else:
+                raise ValueError(f"Неподдерживаемый формат: {suffix}")
+        metrics.add_rows('file_parse', len(items))
+        return items, fmt
+    
+    @staticmethod
+    def iter_records(source, filename: str = None) -> Iterator[Dict]:
+        """
+        Записи файла или бинарного потока словарями, лениво (память не растёт с размером файла)
         
+        CSV - {столбец: значение}, Excel - по заголовку первой строки листа,
+        TXT - {'text': строка}, JSON-массив / NDJSON (.json, .ndjson, .jsonl) - объекты
+        как есть, строки - {'text': строка}. Формат - по расширению filename (или пути).
+        """
+        suffix = Path(filename or source).suffix.lower()
         if suffix == '.csv':
-            return DataProcessorEnhanced._load_csv(filepath), 'csv'
+            yield from iter_csv_records(source)
         elif suffix == '.txt':
-            return DataProcessorEnhanced._load_txt(filepath), 'txt'
+            yield from ({'text': line} for line in iter_text_lines(source))
         elif suffix in ['.xlsx', '.xls']:
-            return DataProcessorEnhanced._load_excel(filepath), 'excel'
+            rows = DataProcessorEnhanced._iter_excel_rows(filename or source,
+                                                          None if isinstance(source, (str, Path)) else source)
+            header = ['' if value is None else str(value) for value in next(rows, ())]
+            for row in rows:
+                names = header + [str(i) for i in range(len(header), len(row))]
+                yield {name: value for name, value in zip(names, row)}
+        elif suffix in ['.json', '.ndjson', '.jsonl']:
+            parse = iter_json_array if suffix == '.json' else iter_ndjson
+            with (open(source, 'rb') if isinstance(source, (str, Path)) else nullcontext(source)) as f:
+                for item in parse(f):
+                    yield item if isinstance(item, dict) else {'text': item}
         else:
             raise ValueError(f"Неподдерживаемый формат: {suffix}")
     
     @staticmethod
-    def _load_csv(filepath: str) -> List[str]:
-        """Загрузить CSV файл"""
-        df = pd.read_csv(filepath, encoding='utf-8')
-        # Берем первый столбец
-        return df.iloc[:, 0].astype(str).tolist()
-    
-    @staticmethod
-    def _load_txt(filepath: str) -> List[str]:
-        """Загрузить TXT файл"""
-        with open(filepath, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f.readlines() if line.strip()]
-        return lines
+    def read_table_stream(stream: BinaryIO, filename: str) -> pd.DataFrame:
+        """Таблица целиком (CSV или Excel) из бинарного потока"""
+        suffix = Path(filename).suffix.lower()
+        with metrics.timer('file_parse'):
+            if suffix in ['.xlsx', '.xls']:
+                df = pd.read_excel(stream)
+            else:
+                df = read_csv(stream)
+        metrics.add_rows('file_parse', len(df))
+        return df
     
     @staticmethod
-    def _load_excel(filepath: str) -> List[str]:
-        """Загрузить Excel файл"""
-        df = pd.read_excel(filepath)
-        # Берем первый столбец
-        return df.iloc[:, 0].astype(str).tolist()
+    def _load_txt(stream: BinaryIO) -> List[str]:
+        """Загрузить TXT из бинарного потока"""
+        if not stream.seekable():
+            stream = io.BytesIO(stream.read())
+        encoding = detect_encoding(read_sample(stream))
+        # cp1251 - если не-UTF-8 байты встретились дальше образца
+        for attempt in dict.fromkeys([encoding, 'cp1251']):
+            stream.seek(0)
+            text = io.TextIOWrapper(stream, encoding=attempt)
+            try:
+                return [line.strip() for line in text if line.strip()]
+            except UnicodeDecodeError:
+                if attempt == 'cp1251':
+                    raise
+            finally:
+                # Поток принадлежит вызывающему - не закрываем его вместе с обёрткой
+                text.detach()
     
     @staticmethod
     def export_with_results(original_file: str, results: List[Dict], 
@@ -79,38 +142,140 @@ class DataProcessorEnhanced:
         
         suffix = path.suffix.lower()
         
-        if suffix == '.csv':
-            return DataProcessorEnhanced._export_csv(original_file, results, output_file)
-        elif suffix == '.txt':
-            return DataProcessorEnhanced._export_txt(original_file, results, output_file)
-        elif suffix in ['.xlsx', '.xls']:
-            return DataProcessorEnhanced._export_excel(original_file, results, output_file)
-        else:
-            raise ValueError(f"Неподдерживаемый формат: {suffix}")
+        with metrics.timer('export', rows=len(results)):
+            if suffix == '.csv':
+                return DataProcessorEnhanced._export_csv(original_file, results, output_file)
+            elif suffix == '.txt':
+                return DataProcessorEnhanced._export_txt(original_file, results, output_file)
+            elif suffix in ['.xlsx', '.xls']:
+                return DataProcessorEnhanced._export_excel(original_file, results, output_file)
+            else:
+                raise ValueError(f"Неподдерживаемый формат: {suffix}")
     
     @staticmethod
-    def _export_csv(original_file: str, results: List[Dict], output_file: str) -> str:
-        """Экспортировать в CSV"""
-        # Читаем исходный файл
-        df = pd.read_csv(original_file, encoding='utf-8')
+    def _result_columns(results: List[Dict]) -> Tuple[List[str], Iterable[tuple]]:
+        """
+        Колонки результатов, которые дописываются к исходным строкам
+        Возвращает: (названия колонок, генератор значений по строкам)
+        """
+        columns = ['predicted_category', 'confidence']
+        with_top_3 = bool(results) and 'top_3' in results[0]
+        if with_top_3:
+            columns.append('top_3_variants')
         
-        # Добавляем новые столбцы
-        categories = [r['category'] for r in results]
-        confidences = [r['confidence'] for r in results]
+        def rows():
+            for r in results:
+                values = (r['category'], r['confidence'])
+                if with_top_3:
+                    top_3 = '; '.join([f"{cat} ({conf:.1%})" for cat, conf in r['top_3']])
+                    values += (top_3,)
+                yield values
         
-        df['predicted_category'] = categories
-        df['confidence'] = confidences
+        return columns, rows()
+    
+    @staticmethod
+    def stream_merge_csv(original_file: str, columns: Sequence[str],
+                         rows: Iterable[Sequence], output_file: str,
+                         fmt: Optional[Dict] = None) -> int:
+        """
+        Дописать колонки к исходному CSV за один проход, без повторного парсинга
         
-        # Если есть top_3, добавляем еще один столбец
-        if 'top_3' in results[0]:
-            top_3_str = []
-            for r in results:
-                top_3 = '; '.join([f"{cat} ({conf:.1%})" for cat, conf in r['top_3']])
-                top_3_str.append(top_3)
-            df['top_3_variants'] = top_3_str
+        Формат (кодировка, разделитель, кавычки, служебные строки до заголовка) - тот же,
+        что при загрузке (loaders.sniff), результат пишется в том же формате.
+        Исходные записи копируются как есть (байты нетронутых колонок не меняются),
+        к концу каждой записи добавляются значения из rows по порядку строк.
+        Служебные строки до заголовка копируются без изменений, пустые строки
+        пропускаются так же, как в pd.read_csv, и значений не получают.
+        
+        Args:
+            fmt: готовый результат loaders.sniff (иначе определяется здесь)
+        
+        Returns:
+            количество записей данных (без заголовка)
+        """
+        fmt = fmt or sniff(original_file)
+        delimiter, quotechar, escapechar = fmt['delimiter'], fmt['quotechar'], fmt['escapechar']
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=delimiter, quotechar=quotechar,
+                            doublequote=fmt['doublequote'], escapechar=escapechar, lineterminator='')
+        
+        def format_tail(values) -> str:
+            buffer.seek(0)
+            buffer.truncate()
+            # Пропуски пишутся пустыми, как na_rep в DataFrame.to_csv
+            writer.writerow(['' if v is None or v != v else v for v in values])
+            return delimiter + buffer.getvalue()
         
-        # Сохраняем
-        df.to_csv(output_file, index=False, encoding='utf-8')
+        def quotes(body: str) -> int:
+            if escapechar:
+                # Экранированная кавычка не открывает и не закрывает поле
+                body = body.replace(escapechar + escapechar, '').replace(escapechar + quotechar, '')
+            return body.count(quotechar)
+        
+        rows = iter(rows)
+        preamble = fmt['header_row']
+        header_written = not fmt['has_header']
+        in_quotes = False
+        count = 0
+        
+        try:
+            # surrogateescape - байты, не подходящие под кодировку образца, копируются как есть
+            with open(original_file, 'r', encoding=fmt['encoding'], errors='surrogateescape',
+                      newline='') as src, \
+                 open(output_file, 'w', encoding=fmt['encoding'], errors='surrogateescape',
+                      newline='') as dst:
+                for line in src:
+                    body = line.rstrip('\r\n')
+                    terminator = line[len(body):]
+                    
+                    # Чётное число кавычек в строке не меняет состояние ("" - экранирование)
+                    if quotes(body) % 2:
+                        in_quotes = not in_quotes
+                    if in_quotes:
+                        # Запись продолжается на следующей строке
+                        dst.write(line)
+                        continue
+                    
+                    if preamble:
+                        # Служебная строка до заголовка (read_csv пропускает её через skiprows)
+                        preamble -= 1
+                        dst.write(line)
+                        continue
+                    
+                    if not body:
+                        # Пустая строка вне кавычек - не запись
+                        dst.write(line)
+                        continue
+                    
+                    if not header_written:
+                        tail = format_tail(columns)
+                        header_written = True
+                    else:
+                        values = next(rows, None)
+                        if values is None:
+                            raise ValueError(
+                                f"Результатов меньше, чем строк в файле {original_file}"
+                            )
+                        tail = format_tail(values)
+                        count += 1
+                    
+                    dst.write(body + tail + terminator)
+                
+                if next(rows, None) is not None:
+                    raise ValueError(
+                        f"Результатов больше, чем строк в файле {original_file} ({count})"
+                    )
+        except Exception:
+            Path(output_file).unlink(missing_ok=True)
+            raise
+        
+        return count
+    
+    @staticmethod
+    def _export_csv(original_file: str, results: List[Dict], output_file: str) -> str:
+        """Экспортировать в CSV (потоково, в формате исходного файла, без повторного чтения через pandas)"""
+        columns, rows = DataProcessorEnhanced._result_columns(results)
+        DataProcessorEnhanced.stream_merge_csv(original_file, columns, rows, output_file)
         return output_file
     
     @staticmethod
@@ -133,50 +298,133 @@ class DataProcessorEnhanced:
         
         return output_file
     
+    @staticmethod
+    def _iter_excel_rows(filepath: str, stream: BinaryIO = None) -> Iterable[tuple]:
+        """
+        Построчно читать первый лист Excel без загрузки всего файла в DataFrame
+        stream - бинарный поток вместо файла (filepath тогда задаёт только формат)
+        """
+        if Path(filepath).suffix.lower() == '.xls':
+            # openpyxl не читает старый формат - остаётся pandas
+            df = pd.read_excel(stream or filepath)
+            yield tuple(df.columns)
+            yield from df.itertuples(index=False, name=None)
+            return
+        
+        workbook = openpyxl.load_workbook(stream or filepath, read_only=True, data_only=True)
+        try:
+            worksheet = workbook.worksheets[0]
+            blank_rows = []
+            for row in worksheet.iter_rows(values_only=True):
+                if all(value is None for value in row):
+                    # Пустые строки в конце листа pandas отбрасывает
+                    blank_rows.append(row)
+                    continue
+                yield from blank_rows
+                blank_rows = []
+                yield row
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _iter_merged_excel_rows(original_file: str, results: List[Dict]) -> Iterable[list]:
+        """Заголовок и строки исходного листа с дописанными колонками результатов"""
+        columns, rows = DataProcessorEnhanced._result_columns(results)
+        source = DataProcessorEnhanced._iter_excel_rows(original_file)
+        
+        header = next(source, ())
+        yield list(header) + columns
+        
+        # Исходные строки идут насквозь, колонки результатов дописываются по индексу
+        count = 0
+        for values, original_row in zip(rows, source):
+            yield list(original_row) + list(values)
+            count += 1
+        
+        if count != len(results) or next(source, None) is not None:
+            raise ValueError(
+                f"Количество результатов ({len(results)}) не совпадает "
+                f"с количеством строк в {original_file}"
+            )
+    
+    @staticmethod
+    def _estimate_column_widths(sample: List[list]) -> List[int]:
+        """Ширина столбцов по выборке строк (вместо обхода каждой ячейки листа)"""
+        widths = []
+        for column in zip_longest(*sample):
+            max_length = max((len(str(value)) for value in column if value is not None), default=0)
+            widths.append(min(max_length + 2, 50))
+        return widths
+    
     @staticmethod
     def _export_excel(original_file: str, results: List[Dict], output_file: str) -> str:
-        """Экспортировать в Excel"""
-        # Читаем исходный файл
-        df = pd.read_excel(original_file)
+        """Экспортировать в Excel (потоковая запись, ширина столбцов по выборке)"""
+        if len(results) > EXCEL_MAX_ROWS:
+            return DataProcessorEnhanced._export_excel_fallback(original_file, results, output_file)
         
-        # Добавляем новые столбцы
-        categories = [r['category'] for r in results]
-        confidences = [r['confidence'] for r in results]
+        merged = DataProcessorEnhanced._iter_merged_excel_rows(original_file, results)
+        sample = list(islice(merged, EXCEL_WIDTH_SAMPLE_ROWS + 1))
         
-        df['predicted_category'] = categories
-        df['confidence'] = confidences
+        workbook = openpyxl.Workbook(write_only=True)
+        worksheet = workbook.create_sheet('Sheet1')
         
-        # Если есть top_3, добавляем еще один столбец
-        if 'top_3' in results[0]:
-            top_3_str = []
-            for r in results:
-                top_3 = '; '.join([f"{cat} ({conf:.1%})" for cat, conf in r['top_3']])
-                top_3_str.append(top_3)
-            df['top_3_variants'] = top_3_str
+        # В режиме write_only ширину можно задать только до первой строки
+        for idx, width in enumerate(DataProcessorEnhanced._estimate_column_widths(sample), 1):
+            worksheet.column_dimensions[get_column_letter(idx)].width = width
         
-        # Сохраняем с форматированием
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-            
-            # Форматирование (опционально)
-            workbook = writer.book
-            worksheet = writer.sheets['Sheet1']
-            
-            # Автоширина столбцов
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+        for row in chain(sample, merged):
+            worksheet.append(row)
         
+        workbook.save(output_file)
         return output_file
     
+    @staticmethod
+    def _export_excel_fallback(original_file: str, results: List[Dict], output_file: str) -> str:
+        """
+        Слишком большой результат для Excel - сохраняем в CSV или Parquet
+        Формат задаётся config.EXCEL_FALLBACK_FORMAT
+        """
+        merged = DataProcessorEnhanced._iter_merged_excel_rows(original_file, results)
+        print(f"⚠️ {len(results)} строк больше порога EXCEL_MAX_ROWS ({EXCEL_MAX_ROWS}), "
+              f"экспорт в {EXCEL_FALLBACK_FORMAT}")
+        
+        if EXCEL_FALLBACK_FORMAT == 'parquet':
+            parquet_file = str(Path(output_file).with_suffix('.parquet'))
+            header = DataProcessorEnhanced._unique_columns(next(merged))
+            try:
+                df = pd.DataFrame(list(merged), columns=header)
+                # Столбцы Excel со смешанными типами pyarrow не пишет - приводим к строкам
+                for column in df.columns[df.dtypes == object]:
+                    df[column] = df[column].map(lambda value: value if value is None else str(value))
+                df.to_parquet(parquet_file, index=False)
+                return parquet_file
+            except (ImportError, ValueError, TypeError, NotImplementedError) as e:
+                print(f"⚠️ Parquet недоступен ({e}), сохраняю в CSV")
+                Path(parquet_file).unlink(missing_ok=True)
+                merged = DataProcessorEnhanced._iter_merged_excel_rows(original_file, results)
+        
+        csv_file = str(Path(output_file).with_suffix('.csv'))
+        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            for row in merged:
+                writer.writerow(['' if value is None else value for value in row])
+        return csv_file
+    
+    @staticmethod
+    def _unique_columns(header: List) -> List[str]:
+        """Имена столбцов для Parquet: пустые -> column_N, повторы -> имя_2, имя_3..."""
+        columns, seen = [], {}
+        for idx, name in enumerate(header, 1):
+            name = f'column_{idx}' if name is None or str(name).strip() == '' else str(name)
+            unique = name
+            while unique in seen:
+                seen[name] += 1
+                unique = f'{name}_{seen[name]}'
+            seen.setdefault(name, 1)
+            seen.setdefault(unique, 1)
+            columns.append(unique)
+        return columns
+    
     @staticmethod
     def get_file_type(filepath: str) -> str:
         """Определить тип файла"""
@@ -10,6 +10,7 @@ import sqlite3
 from pathlib import Path
 from datetime import datetime
 import json
+import metrics
 
 DATABASE_DIR = Path("data")
 DATABASE_FILE = DATABASE_DIR / "classifier.db"
@@ -17,9 +18,13 @@ DATABASE_FILE = DATABASE_DIR / "classifier.db"
 class Database:
     """Управление БД классификаций"""
     
-    def __init__(self):
-        DATABASE_DIR.mkdir(parents=True, exist_ok=True)
-        self.db_path = DATABASE_FILE
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path: файл БД (по умолчанию data/classifier.db)
+        """
+        self.db_path = Path(db_path) if db_path else DATABASE_FILE
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.init_db()
     
     def get_connection(self):
@@ -89,6 +94,19 @@ class Database:
                 )
             ''')
             
+            # ✅ ТАБЛИЦА: result_cache (хеш нормализованного текста + версия модели -> результат)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    text_hash TEXT NOT NULL,
+                    model_version TEXT NOT NULL,
+                    predicted_category TEXT,
+                    confidence REAL DEFAULT 0.0,
+                    top_3 TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (text_hash, model_version)
+                )
+            ''')
+            
             # ✅ ТАБЛИЦА: reports
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS reports (
@@ -150,6 +168,7 @@ class Database:
         finally:
             conn.close()
     
+    @metrics.timed('db_insert', db_op='insert_classification')
     def save_classification(self, company_id: int = None, company_name: str = "", 
                            text: str = "", predicted_category: str = "", 
                            confidence: float = 0.0, top_3: list = None, 
@@ -185,6 +204,51 @@ class Database:
         finally:
             conn.close()
     
+    @metrics.timed('db_insert', db_op='insert_classifications')
+    def save_classifications(self, records):
+        """
+        Сохранить пачку результатов классификации одной транзакцией
+
+        Args:
+            records: словари с ключами как у save_classification
+
+        Returns:
+            список id (None для всех - при ошибке)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            now = datetime.now().isoformat()
+            ids = []
+            for record in records:
+                top_3 = record.get('top_3')
+                cursor.execute('''
+                    INSERT INTO classifications
+                    (company_id, company_name, text, predicted_category, confidence, top_3, rules_applied, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    record.get('company_id'),
+                    record.get('company_name', ''),
+                    record.get('text', ''),
+                    record.get('predicted_category', ''),
+                    record.get('confidence', 0.0),
+                    json.dumps(top_3) if top_3 else "[]",
+                    1 if record.get('rules_applied') else 0,
+                    now
+                ))
+                ids.append(cursor.lastrowid)
+
+            conn.commit()
+            return ids
+        except Exception as e:
+            print(f"❌ Ошибка сохранения классификаций: {e}")
+            conn.rollback()
+            return [None] * len(records)
+        finally:
+            conn.close()
+
+    @metrics.timed('db_insert', db_op='insert_company')
     def save_company(self, name: str, description: str = "", rubrics: str = ""):
         """Сохранить компанию"""
         conn = self.get_connection()
@@ -205,6 +269,80 @@ class Database:
         finally:
             conn.close()
     
+    @metrics.timed('db_query', db_op='get_cached_results')
+    def get_cached_results(self, text_hashes, model_version: str):
+        """
+        Сохранённые результаты для хешей текстов, посчитанные моделью model_version
+        
+        Returns:
+            {хеш: (категория, уверенность, топ-3)}
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            found = {}
+            text_hashes = list(text_hashes)
+            # Не больше 500 параметров в запросе (лимит SQLite на старых версиях - 999)
+            for start in range(0, len(text_hashes), 500):
+                batch = text_hashes[start:start + 500]
+                cursor.execute(f'''
+                    SELECT text_hash, predicted_category, confidence, top_3 FROM result_cache
+                    WHERE model_version = ? AND text_hash IN ({','.join('?' * len(batch))})
+                ''', (model_version, *batch))
+                for row in cursor.fetchall():
+                    top_3 = [tuple(item) for item in json.loads(row['top_3'] or '[]')]
+                    found[row['text_hash']] = (row['predicted_category'], row['confidence'], top_3)
+            return found
+        except Exception as e:
+            print(f"❌ Ошибка чтения кэша результатов: {e}")
+            return {}
+        finally:
+            conn.close()
+    
+    @metrics.timed('db_insert', db_op='save_cached_results')
+    def save_cached_results(self, results, model_version: str):
+        """
+        Запомнить результаты одной транзакцией
+        
+        Args:
+            results: {хеш текста: (категория, уверенность, топ-3)}
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            now = datetime.now().isoformat()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO result_cache
+                (text_hash, model_version, predicted_category, confidence, top_3, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(text_hash, model_version, category, float(confidence), json.dumps(top_3, ensure_ascii=False), now)
+                  for text_hash, (category, confidence, top_3) in results.items()])
+            conn.commit()
+        except Exception as e:
+            print(f"❌ Ошибка сохранения кэша результатов: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def iter_companies(self, chunk_size: int = 10000):
+        """Компании по порядку id, словарями - курсор читается кусками по chunk_size"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT id, name, description, rubrics FROM companies ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+    
+    @metrics.timed('db_query', db_op='get_classifications')
     def get_classifications(self, limit: int = 100, offset: int = 0):
         """Получить классификации"""
         conn = self.get_connection()
@@ -245,6 +383,7 @@ class Database:
         finally:
             conn.close()
     
+    @metrics.timed('db_insert', db_op='insert_correction')
     def add_correction(self, classification_id: int, corrected_category: str, reason: str = ""):
         """Добавить корректировку"""
         conn = self.get_connection()
@@ -279,6 +418,135 @@ class Database:
         finally:
             conn.close()
     
+    @metrics.timed('db_query', db_op='get_corrected_examples')
+    def get_corrected_examples(self, after_id: int = 0):
+        """
+        Получить исправленные примеры (текст + правильная категория)
+        
+        Args:
+            after_id: вернуть только корректировки с id больше этого (для инкрементальной загрузки)
+        
+        Returns:
+            список словарей с ключами id, text, corrected_category по возрастанию id
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT co.id, c.text, co.corrected_category
+                FROM corrections co
+                JOIN classifications c ON c.id = co.classification_id
+                WHERE co.id > ? AND co.corrected_category IS NOT NULL AND co.corrected_category != ''
+                ORDER BY co.id
+            ''', (after_id,))
+            
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"❌ Ошибка получения исправленных примеров: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def add_training_examples(self, examples, source: str = 'import'):
+        """
+        Добавить размеченные примеры в training_data (база для полного переобучения)
+        
+        Args:
+            examples: пары (text, category)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.executemany('''
+                INSERT INTO training_data (text, category, source, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', [(text, category, source, datetime.now().isoformat()) for text, category in examples])
+        
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"❌ Ошибка добавления обучающих примеров: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    def replace_training_examples(self, examples, source: str = 'train'):
+        """
+        Заменить содержимое training_data примерами, на которых обучена модель
+        
+        Вызывается после обучения (CompanyClassifier.train(..., db=...)), чтобы полное
+        переобучение (online_learning.py) шло по тем же данным. Одна транзакция:
+        при ошибке прежние примеры остаются.
+        
+        Args:
+            examples: пары (text, category), можно генератором
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            now = datetime.now().isoformat()
+            cursor.execute('DELETE FROM training_data')
+            cursor.executemany('''
+                INSERT INTO training_data (text, category, source, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', ((text, category, source, now) for text, category in examples))
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"❌ Ошибка сохранения обучающих примеров: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    def count_training_examples(self):
+        """Количество примеров в training_data"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT COUNT(*) FROM training_data')
+            return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"❌ Ошибка подсчёта обучающих примеров: {e}")
+            return 0
+        finally:
+            conn.close()
+    
+    def iter_training_examples(self, chunk_size: int = 10000):
+        """
+        Куски (texts, labels) для полного переобучения: training_data
+        и последняя корректировка каждой классификации
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT text, category FROM training_data
+                UNION ALL
+                SELECT c.text, co.corrected_category
+                FROM corrections co
+                JOIN classifications c ON c.id = co.classification_id
+                WHERE co.id IN (
+                    SELECT MAX(id) FROM corrections
+                    WHERE corrected_category IS NOT NULL AND corrected_category != ''
+                    GROUP BY classification_id
+                )
+            ''')
+        
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [row[0] for row in rows], [row[1] for row in rows]
+        finally:
+            conn.close()
+    
     def save_report(self, title: str, report_type: str, content: str, 
                    total_classified: int = 0, accuracy_rate: float = 0.0):
         """Сохранить отчет"""
@@ -301,6 +569,7 @@ class Database:
         finally:
             conn.close()
     
+    @metrics.timed('db_stats', db_op='get_statistics')
     def get_statistics(self):
         """Получить статистику"""
         conn = self.get_connection()
@@ -340,6 +609,7 @@ class Database:
         finally:
             conn.close()
     
+    @metrics.timed('export', db_op='export_classifications_csv')
     def export_classifications_csv(self, filepath: str = None):
         """Экспортировать классификации в CSV"""
         try:
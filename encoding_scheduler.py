@@ -0,0 +1,223 @@
+"""
+Планировщик кодирования текстов для энкодера предложений
+
+- EncodingScheduler: сортирует тексты по длине в токенах, собирает батчи по бюджету
+  токенов (короткие рубрики - большими батчами, длинные описания - маленькими),
+  возвращает эмбеддинги в исходном порядке
+- MicroBatcher: объединяет одиночные вызовы из разных потоков (веб-запросы)
+  в один батч в пределах короткого окна ожидания
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+import metrics
+from config import ENCODE_MAX_BATCH_SIZE, ENCODE_MAX_TOKENS_PER_BATCH
+
+# Размер батча - степени двойки до 1024
+BATCH_SIZE_BUCKETS = tuple(2 ** i for i in range(11))
+MICROBATCH_SECONDS = metrics.Histogram('app_microbatch_seconds',
+                                       'Задержка запроса в микробатчере (wait - ожидание батча, total - до результата)',
+                                       ['batcher', 'phase'])
+MICROBATCH_SIZE = metrics.Histogram('app_microbatch_size', 'Размер собранного батча', ['batcher'],
+                                    buckets=BATCH_SIZE_BUCKETS)
+metrics.REGISTRY.extend([MICROBATCH_SECONDS, MICROBATCH_SIZE])
+
+
+class EncodingScheduler:
+    """Кодирование с группировкой по длине и динамическим размером батча"""
+
+    def __init__(self, model, max_tokens_per_batch: int = ENCODE_MAX_TOKENS_PER_BATCH,
+                 max_batch_size: int = ENCODE_MAX_BATCH_SIZE):
+        """
+        Args:
+            model: энкодер с методом encode (SentenceTransformer или OnnxSentenceEncoder)
+            max_tokens_per_batch: бюджет батча = размер батча * длина самого длинного текста
+            max_batch_size: верхняя граница размера батча
+        """
+        self.model = model
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_batch_size = max_batch_size
+        self.max_seq_length = getattr(model, 'max_seq_length', None) or 128
+
+        tokenizer = getattr(model, 'tokenizer', None)
+        # У HF-токенизатора быстрый токенизатор лежит в backend_tokenizer
+        tokenizer = getattr(tokenizer, 'backend_tokenizer', tokenizer)
+        self._tokenizer = tokenizer if hasattr(tokenizer, 'encode_batch') else None
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Длина каждого текста в токенах (с учётом обрезки до max_seq_length)"""
+        if self._tokenizer is not None:
+            lengths = [sum(e.attention_mask) for e in self._tokenizer.encode_batch(texts)]
+        else:
+            # Без токенизатора - оценка по символам
+            lengths = [len(text) // 3 + 2 for text in texts]
+        return np.minimum(np.array(lengths, dtype=np.int64), self.max_seq_length)
+
+    def plan_batches(self, lengths: np.ndarray) -> List[np.ndarray]:
+        """Разбить индексы текстов на батчи: по возрастанию длины, в пределах бюджета токенов"""
+        order = np.argsort(lengths, kind='stable')
+        batches = []
+        current = []
+        for idx in order:
+            # В отсортированном порядке текущий текст - самый длинный в батче
+            padded_tokens = (len(current) + 1) * max(int(lengths[idx]), 1)
+            if current and (len(current) >= self.max_batch_size or padded_tokens > self.max_tokens_per_batch):
+                batches.append(np.array(current))
+                current = []
+            current.append(idx)
+        if current:
+            batches.append(np.array(current))
+        return batches
+
+    def encode(self, sentences: Union[str, List[str]], show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        """
+        Закодировать тексты, как model.encode, но с батчами по длине
+
+        Returns:
+            вектор (для строки) или матрица (n, dim) в исходном порядке
+        """
+        if isinstance(sentences, str):
+            return self.model.encode(sentences, **kwargs)
+
+        texts = list(sentences)
+        if not texts:
+            return np.asarray(self.model.encode(texts, **kwargs))
+
+        batches = self.plan_batches(self.token_lengths(texts))
+        if show_progress_bar:
+            from tqdm import tqdm
+            batches = tqdm(batches, desc="Batches")
+
+        embeddings = None
+        for batch in batches:
+            batch_embeddings = np.asarray(
+                self.model.encode([texts[i] for i in batch], batch_size=len(batch), **kwargs)
+            )
+            if embeddings is None:
+                embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+            embeddings[batch] = batch_embeddings
+        return embeddings
+
+
+class MicroBatcher:
+    """
+    Объединение одиночных вызовов в батчи
+
+    Первый запрос в очереди ждёт не больше max_wait_ms, пока подойдут другие,
+    затем все собранные (до max_batch_size) обрабатываются одним вызовом
+    batch_fn, и результаты раздаются по Future.
+
+    Задержки последних stats_window запросов и размеры батчей - в stats()
+    (перцентили) и в metrics (app_microbatch_seconds, app_microbatch_size).
+    """
+
+    def __init__(self, batch_fn: Callable[[List], List], max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, name: str = 'micro-batcher', stats_window: int = 10000):
+        """
+        Args:
+            batch_fn: функция список входов -> список результатов той же длины
+            max_batch_size: максимум элементов в одном вызове batch_fn
+            max_wait_ms: окно ожидания попутных запросов
+            name: имя потока и метка в метриках
+            stats_window: сколько последних запросов учитывать в перцентилях
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self._wait_times = deque(maxlen=stats_window)
+        self._total_times = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._requests = 0
+        self._batches = 0
+        self._queue: Queue = Queue()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item) -> Future:
+        """Поставить элемент в очередь, результат - через Future"""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout: Optional[float] = None):
+        """Обработать один элемент (блокирует до готовности батча)"""
+        return self.submit(item).result(timeout)
+
+    def _collect(self) -> list:
+        pending = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in pending]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(pending):
+                    # Иначе часть запросов не получит ответа и повиснет до таймаута
+                    raise ValueError(f"{self.name}: batch_fn вернула {len(results)} результатов "
+                                     f"на {len(pending)} входов")
+            except Exception as e:
+                for _, future, _ in pending:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(pending, results):
+                    future.set_result(result)
+            self._record(pending, started, time.perf_counter())
+
+    def _record(self, pending: list, started: float, finished: float) -> None:
+        waits = [started - enqueued for _, _, enqueued in pending]
+        totals = [finished - enqueued for _, _, enqueued in pending]
+        self._wait_times.extend(waits)
+        self._total_times.extend(totals)
+        self._batch_sizes.append(len(pending))
+        self._requests += len(pending)
+        self._batches += 1
+        if metrics.is_enabled():
+            MICROBATCH_SIZE.observe(len(pending), self.name)
+            for wait, total in zip(waits, totals):
+                MICROBATCH_SECONDS.observe(wait, self.name, 'wait')
+                MICROBATCH_SECONDS.observe(total, self.name, 'total')
+
+    def stats(self) -> Dict:
+        """Перцентили задержки (мс) и размеры батчей по последним запросам"""
+        def percentiles(values) -> Dict:
+            if not values:
+                return {}
+            ms = np.asarray(values) * 1000
+            result = {f'p{q}': round(float(np.percentile(ms, q)), 3) for q in (50, 90, 95, 99)}
+            result['max'] = round(float(ms.max()), 3)
+            return result
+
+        sizes = list(self._batch_sizes)
+        return {
+            'name': self.name,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'requests': self._requests,
+            'batches': self._batches,
+            'queue_size': self._queue.qsize(),
+            'avg_batch_size': round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            'max_batch_size_seen': max(sizes) if sizes else 0,
+            'wait_ms': percentiles(list(self._wait_times)),
+            'latency_ms': percentiles(list(self._total_times)),
+        }
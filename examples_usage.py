@@ -7,6 +7,7 @@ import json
 import csv
 import pandas as pd
 from rubrics_classifier import RubricsClassifier, prepare_categories_from_dict
+from loaders import read_csv
 from pathlib import Path
 
 
@@ -42,7 +43,7 @@ def load_categories_from_json(json_path: str) -> list:
 def load_rubrics_from_file(file_path: str) -> list:
     """Загрузка рубрик из CSV или JSON"""
     if file_path.endswith('.csv'):
-        df = pd.read_csv(file_path, encoding='utf-8')
+        df = read_csv(file_path)
         return df['rubric'].tolist() if 'rubric' in df.columns else df.iloc[:, 0].tolist()
     
     elif file_path.endswith('.json'):
@@ -240,7 +241,7 @@ def example_2_from_csv_files():
         rubrics = load_rubrics_from_file(rubrics_csv)
         
         classifier = RubricsClassifier()
-        classifier.load_categories(categories)
+        classifier.load_categories(categories, source_file=categories_csv)
         results = classifier.classify_batch(rubrics[:20], top_n=3)  # Первые 20 для теста
         
         export_results_with_summary(results, 'classification_results', min_confidence=0.6)
@@ -0,0 +1,94 @@
+"""
+Признаки фиксированного размера для CompanyClassifier (режим VECTORIZER_MODE = 'hashing')
+
+HashingVectorizer по символьным n-граммам внутри слов (устойчив к падежам и
+окончаниям в русском) + IDF, который досчитывается по мере поступления данных.
+Словаря нет: размер модели и время загрузки не зависят от объёма текстов,
+обучать можно потоком, кусками (partial_fit).
+"""
+
+from typing import Iterable, List
+
+import numpy as np
+from sklearn.base import BaseEstimator
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from config import HASHING_N_FEATURES, HASHING_NGRAM_RANGE, TRAIN_CHUNK_SIZE
+
+
+class IncrementalHashingVectorizer(BaseEstimator):
+    """TF-IDF поверх хеширования признаков с инкрементальным IDF"""
+
+    def __init__(self, n_features: int = HASHING_N_FEATURES, ngram_range=HASHING_NGRAM_RANGE,
+                 analyzer: str = 'char_wb', sublinear_tf: bool = True):
+        """
+        Args:
+            n_features: размер пространства признаков (фиксирован, коллизии допустимы)
+            ngram_range: диапазон длин n-грамм
+            analyzer: 'char_wb' - символьные n-граммы внутри слов, 'word' - слова
+            sublinear_tf: 1 + log(tf) вместо tf
+        """
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.analyzer = analyzer
+        self.sublinear_tf = sublinear_tf
+        self._hasher = self._make_hasher()
+
+    def _make_hasher(self) -> HashingVectorizer:
+        return HashingVectorizer(n_features=self.n_features, ngram_range=self.ngram_range,
+                                 analyzer=self.analyzer, lowercase=True,
+                                 alternate_sign=False, norm=None)
+
+    def __getstate__(self):
+        # Хешер не хранит состояния - в pickle только параметры и частоты
+        state = self.__dict__.copy()
+        state.pop('_hasher', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._hasher = self._make_hasher()
+
+    @property
+    def idf_(self) -> np.ndarray:
+        """Сглаженный IDF, как в TfidfVectorizer: ln((1 + n) / (1 + df)) + 1"""
+        return np.log((1.0 + self.n_docs_) / (1.0 + self.document_frequency_)) + 1.0
+
+    def partial_fit(self, texts: Iterable[str]) -> 'IncrementalHashingVectorizer':
+        """Учесть документы в частотах IDF"""
+        counts = self._hasher.transform(texts)
+        if not hasattr(self, 'document_frequency_'):
+            self.document_frequency_ = np.zeros(self.n_features, dtype=np.int32)
+            self.n_docs_ = 0
+        # В строке CSR каждый признак встречается один раз - bincount даёт df
+        self.document_frequency_ += np.bincount(counts.indices, minlength=self.n_features).astype(np.int32)
+        self.n_docs_ += counts.shape[0]
+        return self
+
+    def fit(self, texts: Iterable[str], chunk_size: int = TRAIN_CHUNK_SIZE) -> 'IncrementalHashingVectorizer':
+        """Посчитать IDF с нуля (тексты читаются кусками по chunk_size)"""
+        for attr in ('document_frequency_', 'n_docs_'):
+            self.__dict__.pop(attr, None)
+        chunk: List[str] = []
+        for text in texts:
+            chunk.append(text)
+            if len(chunk) >= chunk_size:
+                self.partial_fit(chunk)
+                chunk = []
+        if chunk or not hasattr(self, 'n_docs_'):
+            self.partial_fit(chunk)
+        return self
+
+    def transform(self, texts: Iterable[str]):
+        """Разреженная матрица TF-IDF (строки нормированы по L2)"""
+        counts = self._hasher.transform(texts).astype(np.float64)
+        if self.sublinear_tf:
+            np.log(counts.data, out=counts.data)
+            counts.data += 1
+        counts.data *= self.idf_[counts.indices]
+        return normalize(counts, norm='l2', copy=False)
+
+    def fit_transform(self, texts: Iterable[str]):
+        texts = list(texts)
+        return self.fit(texts).transform(texts)
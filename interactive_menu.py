@@ -10,6 +10,7 @@
 """
 
 from rubrics_classifier import RubricsClassifier
+from loaders import read_csv
 import pandas as pd
 import json
 import sys
@@ -35,7 +36,7 @@ class RubricsApp:
         
         try:
             if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path, encoding='utf-8')
+                df = read_csv(file_path)
                 self.categories = [
                     {
                         'id': row['№'],
@@ -56,7 +57,7 @@ class RubricsApp:
             # Инициализируем классификатор
             print("\nИнициализирую классификатор...")
             self.classifier = RubricsClassifier()
-            self.classifier.load_categories(self.categories)
+            self.classifier.load_categories(self.categories, source_file=file_path)
             print("✓ Классификатор готов")
             
             return True
@@ -86,7 +87,7 @@ class RubricsApp:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     rubrics = [line.strip() for line in f if line.strip()]
             elif file_path.endswith('.csv'):
-                df = pd.read_csv(file_path, encoding='utf-8')
+                df = read_csv(file_path)
                 # Берём первый столбец
                 rubrics = df.iloc[:, 0].tolist()
             elif file_path.endswith('.json'):
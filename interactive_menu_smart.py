@@ -13,19 +13,7 @@ import pandas as pd
 import json
 import sys
 from pathlib import Path
-
-def detect_csv_separator(file_path):
-    """Автоматически определяет разделитель в CSV"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        first_line = f.readline()
-    
-    comma_count = first_line.count(',')
-    semicolon_count = first_line.count(';')
-    
-    if semicolon_count > comma_count:
-        return ';'
-    else:
-        return ','
+from loaders import read_csv, sniff
 
 def find_columns(df):
     """Находит нужные столбцы в DataFrame"""
@@ -73,10 +61,10 @@ class RubricsAppSmart:
         try:
             if file_path.endswith('.csv'):
                 # СМАРТ-обнаружение разделителя
-                separator = detect_csv_separator(file_path)
-                print(f"  ℹ️  Обнаружен разделитель: {repr(separator)}")
+                csv_format = sniff(file_path)
+                print(f"  ℹ️  Обнаружен разделитель: {repr(csv_format['delimiter'])}, кодировка: {csv_format['encoding']}")
                 
-                df = pd.read_csv(file_path, encoding='utf-8', sep=separator)
+                df = read_csv(file_path, fmt=csv_format)
                 df.columns = df.columns.str.strip()
                 
                 # СМАРТ-поиск столбцов
@@ -107,7 +95,7 @@ class RubricsAppSmart:
             # Инициализируем классификатор
             print("\nИнициализирую классификатор...")
             self.classifier = RubricsClassifier()
-            self.classifier.load_categories(self.categories)
+            self.classifier.load_categories(self.categories, source_file=file_path)
             print("✓ Классификатор готов")
             
             return True
@@ -139,10 +127,10 @@ class RubricsAppSmart:
             
             elif file_path.endswith('.csv'):
                 # СМАРТ-обнаружение разделителя
-                separator = detect_csv_separator(file_path)
-                print(f"  ℹ️  Обнаружен разделитель: {repr(separator)}")
+                csv_format = sniff(file_path)
+                print(f"  ℹ️  Обнаружен разделитель: {repr(csv_format['delimiter'])}, кодировка: {csv_format['encoding']}")
                 
-                df = pd.read_csv(file_path, encoding='utf-8', sep=separator)
+                df = read_csv(file_path, fmt=csv_format)
                 rubrics = df.iloc[:, 0].tolist()
             
             elif file_path.endswith('.json'):
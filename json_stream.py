@@ -0,0 +1,139 @@
+"""
+Потоковый разбор JSON / NDJSON из файлового потока (тело HTTP-запроса)
+
+Элементы разбираются по мере чтения, весь массив в памяти не собирается:
+- iter_json_array: верхнеуровневый JSON-массив [elem, elem, ...]
+- iter_ndjson: по одному JSON-значению в строке (application/x-ndjson)
+- iter_chunks: группировка элементов по size для векторизованной обработки
+
+Использование:
+    for chunk in iter_chunks(iter_json_array(request.stream), 256):
+        results = classifier.classify_batch(chunk)
+"""
+
+import codecs
+import json
+from itertools import islice
+from typing import IO, Iterable, Iterator, List
+
+READ_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl',
+                        'application/x-jsonlines')
+
+
+class JSONStreamError(ValueError):
+    """Некорректный JSON во входном потоке"""
+
+
+def iter_json_array(stream: IO[bytes], read_size: int = READ_SIZE) -> Iterator:
+    """
+    Элементы верхнеуровневого JSON-массива из потока байт
+
+    Raises:
+        JSONStreamError: поток - не JSON-массив или массив оборван
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    json_decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    exhausted = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, exhausted
+        if exhausted:
+            return False
+        chunk = stream.read(read_size)
+        exhausted = not chunk
+        buffer = buffer[pos:] + decoder.decode(chunk, final=exhausted)
+        pos = 0
+        return True
+
+    def skip_whitespace() -> bool:
+        """Сдвинуть pos до значимого символа; False - поток кончился"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return True
+            if not fill():
+                return False
+
+    if not skip_whitespace() or buffer[pos] != '[':
+        raise JSONStreamError("Ожидался JSON-массив")
+    pos += 1
+    expect_value = True
+    first = True
+
+    while True:
+        if not skip_whitespace():
+            raise JSONStreamError("Оборванный JSON-массив")
+        char = buffer[pos]
+        if char == ']' and (first or not expect_value):
+            return
+        if not expect_value:
+            if char != ',':
+                raise JSONStreamError(f"Ожидалась ',' или ']', получено {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        while True:
+            try:
+                value, end = json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # Значение могло не поместиться в буфер - дочитываем
+                if fill():
+                    continue
+                raise JSONStreamError(f"Некорректный JSON: {e}") from None
+            # Число на границе буфера могло быть обрезано ("12" от "1234", "1" от "1.5"):
+            # оно закончено, только если за ним уже виден разделитель
+            is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if (is_number and not exhausted
+                    and (end == len(buffer) or buffer[end] not in WHITESPACE + ',]')):
+                fill()
+                continue
+            break
+        pos = end
+        first = False
+        expect_value = False
+        yield value
+
+
+def iter_ndjson(stream: IO[bytes]) -> Iterator:
+    """
+    JSON-значения из NDJSON-потока, пустые строки пропускаются
+
+    Raises:
+        JSONStreamError: строка - не JSON
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if line_number == 1 and line.startswith(b'\xef\xbb\xbf'):
+            line = line[3:]
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise JSONStreamError(f"Строка {line_number}: некорректный JSON: {e}") from None
+
+
+def iter_request_items(stream: IO[bytes], content_type: str = '') -> Iterator:
+    """Элементы тела запроса: NDJSON по Content-Type, иначе JSON-массив"""
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if mimetype in NDJSON_CONTENT_TYPES:
+        return iter_ndjson(stream)
+    return iter_json_array(stream)
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[List]:
+    """Группировать элементы в списки по size (последний - меньше)"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,354 @@
+"""
+Общий загрузчик CSV: формат определяется один раз, файл читается за один проход
+
+По началу файла (SNIFF_SAMPLE_BYTES) определяются:
+- кодировка: utf-8, utf-8-sig (BOM) или cp1251;
+- разделитель (',', ';', табуляция, '|') - по согласованности числа полей в строках,
+  с учётом кавычек (запятые внутри описаний не сбивают);
+- кавычки: символ и удвоение внутри поля;
+- строка заголовка: служебные строки перед таблицей (например, "Выгрузка от ...") пропускаются.
+
+Затем файл читается быстрым движком: pyarrow, если установлен (CSV_ENGINE = 'auto'),
+иначе C-движок pandas.
+
+Для очень больших файлов (гигабайты рубрик) есть ленивый режим: файл отображается в память
+(mmap), поток читается окнами, и строки TXT / записи CSV выдаются по одному.
+Декодируется только текущее окно LAZY_READ_BYTES, поэтому память не растёт с размером файла.
+
+Использование:
+    from loaders import read_csv, sniff, iter_text_lines, iter_csv_records
+
+    df = read_csv('data/companies.csv')        # путь или бинарный поток
+    fmt = sniff('data/categories.csv')         # {'encoding': 'utf-8', 'delimiter': ';', ...}
+    for record in iter_csv_records('data/rubrics.csv'):
+        ...
+"""
+
+import codecs
+import csv
+import io
+import mmap
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Union
+
+import pandas as pd
+
+from config import CSV_ENGINE, LAZY_READ_BYTES, SNIFF_SAMPLE_BYTES
+
+try:
+    import pyarrow  # noqa: F401 - движок pandas read_csv(engine='pyarrow')
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+DELIMITERS = ',;\t|'
+SNIFF_MAX_ROWS = 50  # строк образца для выбора разделителя и заголовка
+# Параметры read_csv, которые не поддерживает движок pyarrow
+PYARROW_UNSUPPORTED = {'chunksize', 'iterator', 'nrows', 'skipfooter', 'converters', 'on_bad_lines',
+                       'low_memory', 'thousands', 'comment'}
+
+Source = Union[str, Path, BinaryIO]
+
+
+def read_sample(source: Source, sample_size: int = SNIFF_SAMPLE_BYTES) -> bytes:
+    """Первые sample_size байт файла или потока (позиция потока сохраняется)"""
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as f:
+            return f.read(sample_size)
+    start = source.tell()
+    sample = source.read(sample_size)
+    source.seek(start)
+    return sample
+
+
+def detect_encoding(sample: bytes) -> str:
+    """utf-8-sig, utf-8 или cp1251 по образцу байт"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # final=False - символ, обрезанный концом образца, не ошибка
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1251'
+
+
+def _sample_text(sample: bytes, encoding: str, complete: bool) -> str:
+    text = sample.decode(encoding, errors='ignore')
+    if not complete and '\n' in text:
+        # Последняя строка образца может быть неполной
+        text = text[:text.rindex('\n')]
+    return text
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value.replace(',', '.'))
+        return True
+    except ValueError:
+        return False
+
+
+def sniff_sample(sample: bytes, complete: bool = True) -> Dict:
+    """
+    Формат CSV по образцу байт
+
+    Args:
+        complete: образец - весь файл (иначе последняя строка отбрасывается)
+
+    Returns:
+        словарь: encoding, delimiter, quotechar, doublequote, escapechar, header_row
+        (сколько строк пропустить до заголовка), has_header
+    """
+    encoding = detect_encoding(sample)
+    text = _sample_text(sample, encoding, complete)
+
+    # Кавычки внутри поля - удвоением (стандарт CSV), если не найден escape-символ
+    quotechar, doublequote, escapechar = '"', True, None
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=DELIMITERS)
+        quotechar = dialect.quotechar or '"'
+        if dialect.escapechar:
+            doublequote, escapechar = False, dialect.escapechar
+    except csv.Error:
+        pass
+
+    # Разделитель: большинство строк с одинаковым числом полей (> 1)
+    best = (',', 0, (-1, 0))
+    for delimiter in DELIMITERS:
+        rows = list(csv.reader(io.StringIO(text), delimiter=delimiter, quotechar=quotechar,
+                               doublequote=doublequote))[:SNIFF_MAX_ROWS]
+        counts = [len(row) for row in rows if any(cell.strip() for cell in row)]
+        if not counts:
+            continue
+        fields, frequency = Counter(counts).most_common(1)[0]
+        score = (frequency, fields) if fields > 1 else (0, 0)
+        if score > best[2]:
+            best = (delimiter, fields, score)
+    delimiter, fields, _ = best
+
+    # Заголовок - первая строка с полным числом полей; строки до неё - служебные
+    header_row = 0
+    first_row = []
+    reader = csv.reader(io.StringIO(text), delimiter=delimiter, quotechar=quotechar, doublequote=doublequote)
+    for index, row in enumerate(reader):
+        if index >= SNIFF_MAX_ROWS:
+            break
+        if fields <= 1 or len(row) == fields:
+            header_row, first_row = index, row
+            break
+    # Числа в названиях столбцов не встречаются - такая строка уже данные
+    has_header = bool(first_row) and not any(_is_number(cell.strip()) for cell in first_row if cell.strip())
+
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'doublequote': doublequote,
+        'escapechar': escapechar,
+        'header_row': header_row,
+        'has_header': has_header,
+    }
+
+
+def sniff(source: Source, sample_size: int = SNIFF_SAMPLE_BYTES) -> Dict:
+    """Формат CSV-файла или потока по его началу (см. sniff_sample)"""
+    sample = read_sample(source, sample_size)
+    return sniff_sample(sample, complete=len(sample) < sample_size)
+
+
+def _has_binary_columns(df: pd.DataFrame) -> bool:
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if len(values) and isinstance(values.iloc[0], bytes):
+            return True
+    return False
+
+
+def _engine(engine: str, kwargs: Dict) -> str:
+    if engine == 'auto':
+        engine = 'pyarrow' if PYARROW_AVAILABLE else 'c'
+    if engine == 'pyarrow' and (not PYARROW_AVAILABLE or PYARROW_UNSUPPORTED & kwargs.keys()):
+        engine = 'c'
+    # pyarrow принимает usecols только именами столбцов, не номерами
+    usecols = kwargs.get('usecols')
+    if engine == 'pyarrow' and usecols is not None and not callable(usecols) \
+            and any(isinstance(column, int) for column in usecols):
+        engine = 'c'
+    return engine
+
+
+def read_csv(source: Source, fmt: Optional[Dict] = None, engine: str = CSV_ENGINE, **kwargs):
+    """
+    Прочитать CSV за один проход с автоопределением формата
+
+    Args:
+        source: путь или бинарный поток (для потока нужен seek)
+        fmt: готовый результат sniff (иначе определяется здесь)
+        engine: 'auto', 'pyarrow', 'c' или 'python'
+        **kwargs: параметры pd.read_csv (usecols, dtype, chunksize, ...)
+
+    Returns:
+        DataFrame (или итератор при chunksize)
+    """
+    if not isinstance(source, (str, Path)) and not source.seekable():
+        source = io.BytesIO(source.read())
+    start = None if isinstance(source, (str, Path)) else source.tell()
+    fmt = fmt or sniff(source)
+
+    options = {
+        'encoding': fmt['encoding'],
+        'sep': fmt['delimiter'],
+        'quotechar': fmt['quotechar'],
+        'doublequote': fmt['doublequote'],
+        'escapechar': fmt['escapechar'],
+        'skiprows': fmt['header_row'] or None,
+        'header': 0 if fmt['has_header'] else None,
+    }
+    options.update(kwargs)
+    engine = _engine(engine, options)
+    if engine == 'pyarrow' and options['skiprows']:
+        # pyarrow считает пропускаемые строки иначе (без пустых) - служебные строки через C-движок
+        engine = 'c'
+
+    def parse(engine: str, encoding: str):
+        if start is not None:
+            source.seek(start)
+        return pd.read_csv(source, **{**options, 'encoding': encoding}, engine=engine)
+
+    if engine == 'pyarrow':
+        try:
+            df = parse('pyarrow', options['encoding'])
+            if _has_binary_columns(df):
+                # pyarrow не падает на не-UTF-8 байтах дальше образца, а отдаёт столбец байтами
+                df = parse('pyarrow', 'cp1251')
+            return df
+        except Exception as e:
+            # Нестандартный файл (например, не-UTF-8 байты дальше образца) - C-движок
+            print(f"⚠️ pyarrow не разобрал файл ({e}), чтение C-движком")
+            engine = 'c'
+    try:
+        return parse(engine, options['encoding'])
+    except UnicodeDecodeError:
+        # Не-UTF-8 байты встретились дальше образца
+        return parse(engine, 'cp1251')
+
+
+def _decode_window(chunk, encoding: str, name) -> tuple:
+    """(текст, кодировка) окна; не-UTF-8 байты дальше образца - переход на cp1251"""
+    try:
+        return str(chunk, encoding), encoding
+    except UnicodeDecodeError:
+        print(f"⚠️ {name}: не-{encoding} байты дальше начала файла, чтение как cp1251")
+        return str(chunk, 'cp1251'), 'cp1251'
+
+
+def _iter_stream_text(stream: BinaryIO, encoding: str, window: int) -> Iterator[str]:
+    """Окна потока (например, загруженного файла) - чтение по window байт до границы строки"""
+    name = getattr(stream, 'name', 'поток')
+    tail = b''
+    while True:
+        block = stream.read(window)
+        data = tail + block
+        if not data:
+            return
+        if block:
+            cut = data.rfind(b'\n') + 1
+            if not cut:
+                tail = data  # строка длиннее окна - дочитываем
+                continue
+            data, tail = data[:cut], data[cut:]
+        else:
+            tail = b''
+        text, encoding = _decode_window(data, encoding, name)
+        yield text
+        if not block:
+            return
+
+
+def iter_text_windows(source: Source, encoding: Optional[str] = None,
+                      window: int = LAZY_READ_BYTES) -> Iterator[str]:
+    """
+    Текст файла или потока окнами около window байт, каждое окно кончается на границе строки
+
+    Файл отображается в память (mmap), поток читается по window байт - в каждый момент
+    декодируется только одно окно. Если дальше образца встретились не-UTF-8 байты,
+    остаток читается как cp1251.
+    """
+    encoding = encoding or detect_encoding(read_sample(source))
+    bom = encoding == 'utf-8-sig'
+    if bom:
+        encoding = 'utf-8'
+
+    if not isinstance(source, (str, Path)):
+        start = source.tell()
+        if bom and source.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+            source.seek(start)
+        yield from _iter_stream_text(source, encoding, window)
+        return
+
+    with open(source, 'rb') as f:
+        if not f.seek(0, io.SEEK_END):
+            return  # пустой файл mmap не отображает
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            size = len(mapped)
+            start = 0
+            if bom and mapped[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+                start = len(codecs.BOM_UTF8)
+
+            with memoryview(mapped) as view:
+                while start < size:
+                    end = mapped.find(b'\n', min(start + window, size))
+                    end = size if end < 0 else end + 1
+                    chunk = view[start:end]
+                    try:
+                        text, encoding = _decode_window(chunk, encoding, source)
+                    finally:
+                        # Срез держит отображение - освобождаем до закрытия mmap
+                        chunk.release()
+                    yield text
+                    start = end
+
+
+def _iter_lines(source: Source, encoding: Optional[str], newline: Optional[str],
+                window: int) -> Iterator[str]:
+    for text in iter_text_windows(source, encoding, window):
+        yield from io.StringIO(text, newline=newline)
+
+
+def iter_text_lines(source: Source, encoding: Optional[str] = None,
+                    window: int = LAZY_READ_BYTES) -> Iterator[str]:
+    """Непустые строки TXT без пробелов по краям, лениво (см. iter_text_windows)"""
+    for line in _iter_lines(source, encoding, None, window):
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _iter_csv_rows(source: Source, fmt: Optional[Dict], window: int):
+    """(заголовок или None, итератор строк-списков) после служебных строк"""
+    fmt = fmt or sniff(source)
+    lines = _iter_lines(source, fmt['encoding'], '', window)
+    reader = csv.reader(lines, delimiter=fmt['delimiter'], quotechar=fmt['quotechar'],
+                        doublequote=fmt['doublequote'], escapechar=fmt['escapechar'])
+    for _ in range(fmt['header_row']):
+        next(reader, None)
+    header = next(reader, []) if fmt['has_header'] else None
+    # Пустые строки пропускаются, как в read_csv
+    return header, (row for row in reader if row)
+
+
+def iter_csv_records(source: Source, fmt: Optional[Dict] = None,
+                     window: int = LAZY_READ_BYTES) -> Iterator[Dict[str, str]]:
+    """
+    Строки CSV словарями {столбец: значение}, лениво (см. iter_text_windows)
+
+    Без заголовка ключи - номера столбцов строкой ('0', '1', ...), как имена столбцов
+    в read_csv(header=None).
+    """
+    header, rows = _iter_csv_rows(source, fmt, window)
+    header = header or []
+    for row in rows:
+        names = header + [str(i) for i in range(len(header), len(row))]
+        yield dict(zip(names, row + [''] * (len(names) - len(row))))
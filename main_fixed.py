@@ -4,12 +4,14 @@
 import sys
 import argparse
 from pathlib import Path
-from data_processor import DataProcessor
 from classifier import CompanyClassifier
 from training_manager import TrainingManager, RubricClassifier
 from ui import CLI
-import pandas as pd
+from config import OUTPUT_DIR
 import json
+import profiling
+import pipeline
+from checkpoint import Checkpoint, model_fingerprint
 
 def main():
     """Главная функция"""
@@ -33,6 +35,12 @@ def main():
 
   # Генерировать отчет
   python main.py --input data/companies.csv --report output/report.json
+
+  # Продолжить прерванную классификацию большого файла
+  python main.py --input data/companies.csv --output output/result.csv --resume
+
+  # Профилировать запуск (profile_main.* рядом с отчетом)
+  python main.py --input data/companies.csv --report output/report.json --profile
         """
     )
     
@@ -45,13 +53,50 @@ def main():
     parser.add_argument('--priority', type=int, default=50, 
                        help='Приоритет правила (1-100, default: 50)')
     parser.add_argument('--classify-rubrics', help='Классифицировать рубрики из файла')
+    parser.add_argument('--resume', action='store_true',
+                       help='Контрольные точки: продолжить прерванный запуск с последнего чанка, '
+                            'не изменившийся файл не классифицировать повторно')
     parser.add_argument('--show-rules', action='store_true', 
                        help='Показать все правила обучения')
     parser.add_argument('--version', '-v', action='store_true', 
                        help='Показать версию')
+    profiling.add_arguments(parser)
     
     args = parser.parse_args()
     
+    # Профиль пишется рядом с report.json / результатом
+    target = args.report or args.output
+    profile_dir = Path(target).parent if target else OUTPUT_DIR
+    with profiling.from_args(args, profile_dir, 'main'):
+        run(args)
+
+def rubric_row(all_categories):
+    """Строка CSV рубрик - как DataFrame результатов RubricClassifier.classify_rubrics_batch"""
+    def row(record):
+        return {
+            'rubric': record['text'],
+            'category': record['category'],
+            'confidence': record['confidence'],
+            'top_3': str(record['top_3']),
+            'all_categories': str(all_categories)
+        }
+    return row
+
+def rubric_batch(rubric_classifier):
+    """Функция классификации чанка через RubricClassifier.classify_rubrics_batch"""
+    def classify_texts(texts):
+        return [(result['category'], result['confidence'], result['top_3'])
+                for result in rubric_classifier.classify_rubrics_batch(texts)]
+    return classify_texts
+
+def _checkpoint(args, target):
+    """Checkpoint рядом с результатом, если указан --resume"""
+    if not args.resume or not target:
+        return None
+    return Checkpoint(f"{target}.checkpoint.json")
+
+def run(args):
+    """Выполнить команду CLI"""
     # Версия
     if args.version:
         print("Classification System Pro v2.0 (FIXED)")
@@ -73,7 +118,6 @@ def main():
         return
     
     # Пакетная обработка
-    processor = DataProcessor()
     classifier = CompanyClassifier()
     
     # Добавить правило
@@ -100,13 +144,18 @@ def main():
         rubric_classifier.classifier.load_model()
         
         if Path(args.classify_rubrics).exists():
-            df = pd.read_csv(args.classify_rubrics, encoding='utf-8')
-            rubrics = df.iloc[:, 0].tolist()  # Первая колонка
-            results = rubric_classifier.classify_rubrics_batch(rubrics)
-            
-            output_file = 'output/rubrics_classified.csv'
-            pd.DataFrame(results).to_csv(output_file, index=False, encoding='utf-8')
-            print(f"✓ Результаты сохранены в {output_file}")
+            output_file = args.output or 'output/rubrics_classified.csv'
+            # Потоком: рубрики читаются и классифицируются чанками, результаты сразу пишутся в файл
+            all_categories = rubric_classifier.classifier.label_encoder.classes_.tolist()
+            report = pipeline.classify_file(args.classify_rubrics, rubric_batch(rubric_classifier),
+                                            kind='rubrics', output=output_file, report=args.report,
+                                            row=rubric_row(all_categories),
+                                            checkpoint=_checkpoint(args, output_file),
+                                            model=model_fingerprint(rubric_classifier.classifier))
+            if report['total']:
+                print(f"✓ Результаты сохранены в {output_file}")
+            else:
+                print(f"✗ В файле нет рубрик: {args.classify_rubrics}")
         return
     
     # Классификация компаний
@@ -115,18 +164,19 @@ def main():
             print(f"✗ Файл не найден: {args.input}")
             return
         
-        print(f"📂 Загрузка компаний из {args.input}...")
-        processor.load_companies(args.input)
-        
-        print("🔄 Классификация компаний...")
-        processor.classify_companies()
+        print(f"🔄 Классификация компаний из {args.input}...")
+        report = pipeline.classify_file(args.input, pipeline.company_batch(classifier), kind='companies',
+                                        output=args.output, report=args.report,
+                                        row=pipeline.company_row, report_keys=pipeline.COMPANY_REPORT_KEYS,
+                                        checkpoint=_checkpoint(args, args.output or args.report),
+                                        model=model_fingerprint(classifier))
+        print(f"✓ Классифицировано {report['total_companies']} компаний, "
+              f"средняя уверенность: {report['avg_confidence']:.2%}")
         
         if args.output:
-            processor.save_classified(args.output)
             print(f"✓ Результаты сохранены в {args.output}")
         
         if args.report:
-            processor.generate_report(args.report)
             print(f"✓ Отчет сохранен в {args.report}")
 
 if __name__ == '__main__':
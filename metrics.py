@@ -0,0 +1,411 @@
+"""
+Лёгкие метрики: гистограммы времени по этапам и счётчики, вывод в формате Prometheus
+
+Этапы (stage): file_parse, rules, vectorize, predict, encode, search,
+db_insert, export и т.д. Для каждого этапа - гистограмма длительности и счётчик строк
+(скорость строк/с в Prometheus: rate(app_rows_total[1m])). Отдельно - операции БД
+и попадания в кэши.
+
+При METRICS_ENABLED = False все вызовы сводятся к проверке одного флага.
+
+Несколько процессов (serve.py, gunicorn): значения живут в памяти каждого процесса.
+enable_multiprocess(каталог) - каждый процесс раз в METRICS_FLUSH_INTERVAL секунд пишет
+свои значения в <каталог>/<pid>.json, а render() на любом воркере суммирует файлы всех
+процессов (свой - по текущим значениям). Счётчики завершившихся воркеров остаются
+в сумме, поэтому она не убывает.
+
+Использование:
+    import metrics
+
+    with metrics.timer('vectorize', rows=len(texts)):
+        X = vectorizer.transform(texts)
+
+    @metrics.timed('db_insert', db_op='insert')
+    def save(...): ...
+
+    metrics.cache('warm_start', hit=True)
+    text = metrics.render()  # /api/metrics
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from config import METRICS_ENABLED, METRICS_FLUSH_INTERVAL
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = METRICS_ENABLED
+
+
+def enable(flag: bool = True) -> None:
+    """Включить/выключить сбор метрик во время работы"""
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, *labelvalues) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total: Dict, samples: Dict) -> None:
+        for labelvalues, value in samples.items():
+            total[labelvalues] = total.get(labelvalues, 0) + value
+
+    def render(self, samples: Optional[Dict] = None) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labelvalues, value in sorted((samples if samples is not None else self.samples()).items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            return {labels: ([*counts], total, count) for labels, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def merge(total: Dict, samples: Dict) -> None:
+        for labelvalues, (counts, value_sum, count) in samples.items():
+            entry = total.get(labelvalues)
+            if entry is None:
+                total[labelvalues] = ([*counts], value_sum, count)
+            else:
+                total[labelvalues] = ([a + b for a, b in zip(entry[0], counts)],
+                                      entry[1] + value_sum, entry[2] + count)
+
+    def render(self, samples: Optional[Dict] = None) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labelvalues, (counts, total, count) in sorted((samples if samples is not None else self.samples()).items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}')
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return '\n'.join(lines)
+
+
+STAGE_SECONDS = Histogram('app_stage_seconds', 'Длительность этапа обработки', ['stage'])
+ROWS = Counter('app_rows_total', 'Обработано строк/текстов на этапе', ['stage'])
+DB_SECONDS = Histogram('app_db_seconds', 'Длительность операции БД', ['op'])
+DB_OPERATIONS = Counter('app_db_operations_total', 'Операции БД', ['op', 'status'])
+CACHE = Counter('app_cache_requests_total', 'Обращения к кэшам', ['cache', 'result'])
+HTTP_SECONDS = Histogram('app_http_request_seconds', 'Длительность HTTP-запроса', ['endpoint', 'method'])
+HTTP_REQUESTS = Counter('app_http_requests_total', 'HTTP-запросы', ['endpoint', 'method', 'status'])
+
+REGISTRY = [STAGE_SECONDS, ROWS, DB_SECONDS, DB_OPERATIONS, CACHE, HTTP_SECONDS, HTTP_REQUESTS]
+
+
+class _NullTimer:
+    """Таймер-заглушка при выключенных метриках"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+# Подписчики на начало/конец этапа: fn(stage, entering) (например, замер памяти в profiling.py)
+_stage_listeners = []
+
+
+def add_stage_listener(fn) -> None:
+    _stage_listeners.append(fn)
+
+
+def remove_stage_listener(fn) -> None:
+    if fn in _stage_listeners:
+        _stage_listeners.remove(fn)
+
+
+class _StageTimer:
+    __slots__ = ('stage', 'rows', 'db_op', 'start')
+
+    def __init__(self, stage: str, rows: int, db_op: Optional[str]):
+        self.stage = stage
+        self.rows = rows
+        self.db_op = db_op
+
+    def __enter__(self):
+        for listener in _stage_listeners:
+            listener(self.stage, True)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        for listener in _stage_listeners:
+            listener(self.stage, False)
+        STAGE_SECONDS.observe(elapsed, self.stage)
+        if self.rows:
+            ROWS.inc(self.rows, self.stage)
+        if self.db_op:
+            DB_SECONDS.observe(elapsed, self.db_op)
+            DB_OPERATIONS.inc(1, self.db_op, 'error' if exc_type else 'ok')
+        return False
+
+
+def timer(stage: str, rows: int = 0, db_op: Optional[str] = None):
+    """
+    Контекстный менеджер замера этапа
+
+    Args:
+        stage: имя этапа
+        rows: сколько строк обработано на этапе (для скорости строк/с)
+        db_op: имя операции БД - дополнительно учитывается в метриках БД
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _StageTimer(stage, rows, db_op)
+
+
+def timed(stage: str, db_op: Optional[str] = None):
+    """Декоратор: замер каждого вызова функции как этапа stage"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _StageTimer(stage, 0, db_op):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_rows(stage: str, rows: int) -> None:
+    """Учесть строки этапа, когда их число известно только после обработки"""
+    if _enabled and rows:
+        ROWS.inc(rows, stage)
+
+
+def cache(name: str, hit: bool) -> None:
+    """Учесть попадание/промах кэша name"""
+    if _enabled:
+        CACHE.inc(1, name, 'hit' if hit else 'miss')
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float) -> None:
+    if _enabled:
+        HTTP_SECONDS.observe(seconds, endpoint, method)
+        HTTP_REQUESTS.inc(1, endpoint, method, str(status))
+
+
+def render() -> str:
+    """
+    Все метрики в текстовом формате Prometheus (version 0.0.4)
+    При enable_multiprocess - суммы по всем процессам
+    """
+    if _multiprocess_dir is None:
+        return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+    merged = {metric.name: metric.samples() for metric in REGISTRY}
+    for data in _other_processes():
+        for metric in REGISTRY:
+            samples = {tuple(labels): value for labels, value in data['metrics'].get(metric.name, [])}
+            metric.merge(merged[metric.name], samples)
+    return '\n'.join(metric.render(merged[metric.name]) for metric in REGISTRY) + '\n'
+
+
+# ==================== НЕСКОЛЬКО ПРОЦЕССОВ ====================
+
+_multiprocess_dir: Optional[Path] = None
+_flusher_pid = None
+_process_info: Dict[str, Callable[[], Dict]] = {}
+
+
+def enable_multiprocess(directory, clear: bool = False) -> None:
+    """
+    Суммировать метрики процессов через общий каталог (вызывать в мастере до fork)
+
+    Args:
+        clear: удалить файлы прошлого запуска (при старте сервера)
+    """
+    global _multiprocess_dir
+    _multiprocess_dir = Path(directory)
+    _multiprocess_dir.mkdir(parents=True, exist_ok=True)
+    if clear:
+        for path in _multiprocess_dir.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+def is_multiprocess() -> bool:
+    return _multiprocess_dir is not None
+
+
+def add_process_info(name: str, fn: Callable[[], Dict]) -> None:
+    """Сведения процесса, которые не суммируются (например, перцентили батчера) - см. process_info"""
+    _process_info[name] = fn
+
+
+def _payload() -> Dict:
+    info = {}
+    for name, fn in list(_process_info.items()):
+        try:
+            info[name] = fn()
+        except Exception as e:
+            info[name] = {'error': str(e)}
+    return {
+        'pid': os.getpid(),
+        'time': time.time(),
+        'metrics': {metric.name: [[list(labels), value] for labels, value in metric.samples().items()]
+                    for metric in REGISTRY},
+        'info': info
+    }
+
+
+def flush() -> None:
+    """Записать значения текущего процесса в общий каталог (атомарной заменой файла)"""
+    if _multiprocess_dir is None:
+        return
+    path = _multiprocess_dir / f'{os.getpid()}.json'
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_payload(), f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _other_processes():
+    """Последние записанные значения остальных процессов"""
+    for path in _multiprocess_dir.glob('*.json'):
+        if path.stem == str(os.getpid()):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def process_info(name: str) -> Dict[int, Dict]:
+    """{pid: сведения name} по всем процессам (свой - текущие)"""
+    result = {data['pid']: data['info'][name]
+              for data in _other_processes() if name in data.get('info', {})}
+    if name in _process_info:
+        result[os.getpid()] = _process_info[name]()
+    return result
+
+
+def start_flusher(interval: float = METRICS_FLUSH_INTERVAL) -> None:
+    """Фоновая запись значений процесса раз в interval секунд (в каждом процессе после fork)"""
+    global _flusher_pid
+    if _multiprocess_dir is None or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+
+    def run():
+        while True:
+            try:
+                flush()
+            except Exception as e:
+                print(f"⚠️ Ошибка записи метрик процесса: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+
+def after_fork() -> None:
+    """
+    В воркере после fork: значения мастера не наследуются (мастер пишет их сам),
+    блокировки пересоздаются - в момент fork их мог держать поток мастера
+    """
+    for metric in REGISTRY:
+        metric._lock = threading.Lock()
+        metric._values.clear()
+    start_flusher()
+
+
+def snapshot() -> Dict:
+    """Сводка для JSON/логов: по этапам - количество, сумма, среднее (мс), строки; по кэшам - доля попаданий"""
+    rows = ROWS.samples()
+    stages = {}
+    for (stage,), (_, total, count) in STAGE_SECONDS.samples().items():
+        stages[stage] = {
+            'count': count,
+            'total_s': round(total, 6),
+            'avg_ms': round(total * 1000 / count, 3) if count else 0.0,
+            'rows': rows.get((stage,), 0),
+            'rows_per_s': round(rows.get((stage,), 0) / total, 1) if total > 0 else None,
+        }
+    caches = {}
+    for (name, result), value in CACHE.samples().items():
+        caches.setdefault(name, {'hit': 0, 'miss': 0})[result] = value
+    for entry in caches.values():
+        total = entry['hit'] + entry['miss']
+        entry['hit_rate'] = round(entry['hit'] / total, 4) if total else 0.0
+    return {'stages': stages, 'caches': caches}
+
+
+def reset() -> None:
+    """Сбросить все значения (для тестовых прогонов и бенчмарков)"""
+    for metric in REGISTRY:
+        with metric._lock:
+            metric._values.clear()
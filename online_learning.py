@@ -0,0 +1,204 @@
+"""
+Дообучение CompanyClassifier по корректировкам оператора
+
+Новые записи таблицы corrections применяются микробатчами через
+MultinomialNB.partial_fit (признаки фиксированы, векторайзер не переобучается).
+Каждое обновление увеличивает версию модели. Страховка от накопления
+дрейфа - полное переобучение (training_data + все корректировки) каждые
+ONLINE_REBUILD_EVERY дообучений или при появлении новой категории.
+training_data заполняется при обучении модели (CompanyClassifier.train(..., db=...),
+TrainingManager.train_model); неудачная попытка откладывает следующую
+на ONLINE_REBUILD_EVERY дообучений.
+
+Состояние (версия, id последней учтённой корректировки) - в ONLINE_STATE_FILE.
+
+Использование:
+python online_learning.py            # учесть новые корректировки
+python online_learning.py --rebuild  # полное переобучение
+python online_learning.py --rebuild --profile  # с профилем в output/profile_online_rebuild.*
+"""
+
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+from config import ONLINE_BATCH_SIZE, ONLINE_REBUILD_EVERY, ONLINE_STATE_FILE, TRAIN_CHUNK_SIZE
+from hashing_features import IncrementalHashingVectorizer
+
+
+class OnlineLearner:
+    """Инкрементальное обучение классификатора из таблицы corrections"""
+
+    def __init__(self, classifier, db, batch_size: int = ONLINE_BATCH_SIZE,
+                 rebuild_every: int = ONLINE_REBUILD_EVERY, state_file: str = ONLINE_STATE_FILE):
+        """
+        Args:
+            classifier: CompanyClassifier
+            db: экземпляр Database
+            batch_size: корректировок в одном partial_fit
+            rebuild_every: полное переобучение после стольких учтённых корректировок
+            state_file: JSON с версией модели и прогрессом
+        """
+        self.classifier = classifier
+        self.db = db
+        self.batch_size = batch_size
+        self.rebuild_every = rebuild_every
+        self.state_file = Path(state_file)
+        self._lock = threading.Lock()
+        self.state = {
+            'version': 0,
+            'last_correction_id': 0,
+            'updates_since_rebuild': 0,
+            'last_rebuild_at': None,
+            'updated_at': None,
+        }
+        self.load_state()
+
+    def load_state(self) -> None:
+        """Перечитать состояние из state_file (после переобучения в другом процессе)"""
+        if self.state_file.exists():
+            try:
+                self.state.update(json.loads(self.state_file.read_text(encoding='utf-8')))
+            except Exception as e:
+                print(f"⚠️ Ошибка чтения {self.state_file}: {e}")
+        self.classifier.model_version = self.state['version']
+
+    @property
+    def version(self) -> int:
+        return self.state['version']
+
+    def _save_state(self, **changes) -> None:
+        self.state.update(changes)
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        self.state_file.write_text(json.dumps(self.state, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    def _bump(self, **changes) -> None:
+        """Новая версия модели"""
+        self.state['version'] += 1
+        self.state['updated_at'] = datetime.now().isoformat()
+        self.classifier.model_version = self.state['version']
+        self._save_state(**changes)
+
+    def _known_labels(self) -> set:
+        classes = getattr(self.classifier.classifier, 'classes_', None)
+        return set(str(c) for c in classes) if classes is not None else set()
+
+    def sync(self) -> Dict:
+        """
+        Учесть новые корректировки
+
+        Returns:
+            словарь: applied (учтено через partial_fit), skipped, rebuilt, version
+        """
+        with self._lock:
+            examples = self.db.get_corrected_examples(after_id=self.state['last_correction_id'])
+            report = {'applied': 0, 'skipped': 0, 'rebuilt': False, 'version': self.version}
+            if not examples:
+                return report
+
+            last_seen = examples[-1]['id']
+            known = self._known_labels()
+            new_labels = {ex['corrected_category'] for ex in examples} - known
+            if not known or new_labels:
+                # Новую категорию partial_fit не добавит - только полное переобучение
+                if self._rebuild(f"новые категории: {sorted(new_labels)}" if known else "модель не обучена"):
+                    report.update(rebuilt=True, version=self.version)
+                    return report
+                skipped = [ex for ex in examples if ex['corrected_category'] not in known]
+                examples = [ex for ex in examples if ex['corrected_category'] in known]
+                report['skipped'] = len(skipped)
+                print(f"⚠️ Пропущено {len(skipped)} корректировок с новыми категориями "
+                      f"(будут учтены при полном переобучении)")
+
+            failed = False
+            for start in range(0, len(examples), self.batch_size):
+                batch = examples[start:start + self.batch_size]
+                try:
+                    self.classifier.partial_update([ex['text'] for ex in batch],
+                                                   [ex['corrected_category'] for ex in batch])
+                except Exception as e:
+                    print(f"❌ Ошибка дообучения: {e}")
+                    failed = True
+                    break
+                report['applied'] += len(batch)
+                self._bump(last_correction_id=batch[-1]['id'],
+                           updates_since_rebuild=self.state['updates_since_rebuild'] + len(batch))
+
+            if not failed and self.state['last_correction_id'] < last_seen:
+                # Пропущенные корректировки больше не запрашиваем
+                self._save_state(last_correction_id=last_seen)
+
+            if report['applied']:
+                self.classifier.save_model()
+                print(f"✅ Дообучение на {report['applied']} корректировках, версия модели {self.version}")
+
+            if self.state['updates_since_rebuild'] >= self.rebuild_every:
+                report['rebuilt'] = self._rebuild(f"{self.state['updates_since_rebuild']} дообучений")
+                if not report['rebuilt']:
+                    # Следующая попытка - через rebuild_every дообучений, а не на каждом sync
+                    self._save_state(updates_since_rebuild=0)
+                    print(f"⚠️ Следующая попытка полного переобучения - "
+                          f"через {self.rebuild_every} дообучений")
+            report['version'] = self.version
+            return report
+
+    def rebuild(self) -> bool:
+        """Полное переобучение: training_data + последние корректировки"""
+        with self._lock:
+            return self._rebuild("запрошено вручную")
+
+    def _rebuild(self, reason: str) -> bool:
+        if not self.db.count_training_examples():
+            # Из одних корректировок модель не собрать - она забудет исходные данные
+            print(f"⚠️ Полное переобучение ({reason}) невозможно: таблица training_data пуста - "
+                  f"обучите модель с сохранением примеров (CompanyClassifier.train(..., db=...))")
+            return False
+
+        print(f"🔄 Полное переобучение модели ({reason})...")
+        last_id = max([ex['id'] for ex in self.db.get_corrected_examples(after_id=0)] or [0])
+        if isinstance(self.classifier.vectorizer, IncrementalHashingVectorizer):
+            success = self.classifier.train_streaming(
+                lambda: self.db.iter_training_examples(chunk_size=TRAIN_CHUNK_SIZE)
+            )
+        else:
+            texts, labels = [], []
+            for chunk_texts, chunk_labels in self.db.iter_training_examples(chunk_size=TRAIN_CHUNK_SIZE):
+                texts.extend(chunk_texts)
+                labels.extend(chunk_labels)
+            success = self.classifier.train(texts, labels)
+
+        if success:
+            now = datetime.now().isoformat()
+            self._bump(last_correction_id=last_id, updates_since_rebuild=0, last_rebuild_at=now)
+            print(f"✅ Модель переобучена, версия {self.version}")
+        return success
+
+    def sync_async(self) -> threading.Thread:
+        """Запустить sync в фоне (например, после /api/submit_correction)"""
+        thread = threading.Thread(target=self.sync, name='online-learner', daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import profiling
+    from classifier import CompanyClassifier
+    from config import OUTPUT_DIR
+    from database import Database
+
+    parser = argparse.ArgumentParser(description='Дообучение классификатора по корректировкам')
+    parser.add_argument('--rebuild', action='store_true', help='Полное переобучение')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    with profiling.from_args(args, OUTPUT_DIR, 'online_rebuild' if args.rebuild else 'online_sync'):
+        learner = OnlineLearner(CompanyClassifier(), Database())
+        if args.rebuild:
+            learner.rebuild()
+        else:
+            print(learner.sync())
+    print(f"📌 Версия модели: {learner.version}")
@@ -0,0 +1,280 @@
+"""
+ONNX-бэкенд энкодера предложений для CPU (без PyTorch при работе)
+
+Та же модель paraphrase-multilingual-MiniLM-L12-v2, экспортированная в ONNX
+(опционально с int8-квантованием весов), и локальный токенизатор.
+Загружается только из локальной папки, сеть не нужна.
+
+Установка зависимостей:
+pip install onnxruntime tokenizers
+(для экспорта дополнительно: pip install torch transformers onnx)
+
+Использование:
+# 1. Один раз экспортировать модель (нужна сеть или кэш HuggingFace)
+python onnx_encoder.py --export
+
+# 2. Проверить совпадение с PyTorch и сравнить скорость
+python onnx_encoder.py --parity --bench
+
+# 3. Включить в config.py: ENCODER_BACKEND = 'onnx'
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+
+from config import ONNX_MODEL_DIR, ONNX_QUANTIZED, ONNX_THREADS
+
+DEFAULT_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+MODEL_FILE = 'model.onnx'
+QUANTIZED_MODEL_FILE = 'model_quantized.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+ENCODER_CONFIG_FILE = 'encoder_config.json'
+
+
+class OnnxSentenceEncoder:
+    """
+    Энкодер с интерфейсом SentenceTransformer.encode поверх onnxruntime
+
+    Пулинг - среднее по токенам с учётом attention mask, как у исходной модели.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED,
+                 threads: int = ONNX_THREADS):
+        """
+        Args:
+            model_dir: папка с model.onnx / model_quantized.onnx, tokenizer.json
+                       и encoder_config.json (создаётся через export_onnx)
+            quantized: использовать int8-модель, если она есть
+            threads: число потоков onnxruntime (0 - по числу ядер)
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir)
+        if not self.model_dir.exists():
+            raise FileNotFoundError(
+                f"ONNX модель не найдена: {model_dir} (экспорт: python onnx_encoder.py --export)"
+            )
+
+        config_path = self.model_dir / ENCODER_CONFIG_FILE
+        self.config = json.loads(config_path.read_text(encoding='utf-8')) if config_path.exists() else {}
+        self.max_seq_length = self.config.get('max_seq_length', 128)
+
+        model_file = self.model_dir / MODEL_FILE
+        if quantized and (self.model_dir / QUANTIZED_MODEL_FILE).exists():
+            model_file = self.model_dir / QUANTIZED_MODEL_FILE
+        self.model_file = model_file
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_file), options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        pad_token = self.config.get('pad_token', '<pad>')
+        pad_id = self.tokenizer.token_to_id(pad_token)
+        self.tokenizer.enable_padding(pad_id=pad_id if pad_id is not None else 0, pad_token=pad_token)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.session.get_outputs()[0].shape[-1]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        # Среднее по значимым токенам
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return (summed / counts).astype(np.float32)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """
+        Закодировать текст(ы), как SentenceTransformer.encode
+
+        Returns:
+            вектор (для строки) или матрица (n, dim) для списка
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        batches = range(0, len(texts), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            batches = tqdm(batches, desc="Batches")
+
+        embeddings = np.vstack([self._encode_batch(texts[i:i + batch_size]) for i in batches])
+        return embeddings[0] if single else embeddings
+
+
+def export_onnx(model_name: str = DEFAULT_MODEL_NAME, output_dir: str = ONNX_MODEL_DIR,
+                quantize: bool = True) -> str:
+    """
+    Экспортировать трансформер модели в ONNX (+ int8-версию) вместе с токенизатором
+
+    Returns:
+        путь к папке модели
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"🔄 Экспорт {model_name} в {output_dir}...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    dummy = tokenizer(['Кафе', 'Стоматологии и поликлиники'], padding=True, return_tensors='pt')
+    dynamic = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy['input_ids'], dummy['attention_mask']),
+            str(output_dir / MODEL_FILE),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'],
+            dynamic_axes={'input_ids': dynamic, 'attention_mask': dynamic, 'last_hidden_state': dynamic},
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(str(output_dir))
+
+    config = {
+        'model_name': model_name,
+        'pooling': 'mean',
+        'max_seq_length': min(getattr(tokenizer, 'model_max_length', 128), 128),
+        'pad_token': tokenizer.pad_token,
+    }
+    (output_dir / ENCODER_CONFIG_FILE).write_text(json.dumps(config, ensure_ascii=False, indent=2),
+                                                  encoding='utf-8')
+    print(f"✓ {MODEL_FILE} сохранён")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(output_dir / MODEL_FILE), str(output_dir / QUANTIZED_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+        print(f"✓ {QUANTIZED_MODEL_FILE} сохранён (int8)")
+
+    return str(output_dir)
+
+
+# ======================= ПРОВЕРКА И БЕНЧМАРК =======================
+
+SAMPLE_TEXTS = [
+    'Кафе', 'Рестораны', 'Кофейни', 'Быстрое питание', 'Библиотеки', 'Спортивные клубы',
+    'Тренажерные залы', 'Бассейны', 'Больницы', 'Поликлиники', 'Стоматологии', 'Автомойки',
+    'Шиномонтаж', 'Парикмахерская', 'Салон красоты', 'Администрации районов / округов городской власти',
+    'Супермаркеты', 'Аптеки', 'Жилые комплексы', 'Строительные материалы',
+    'Кинотеатр с 3D залом и кафе на первом этаже торгового центра',
+]
+
+
+def parity_check(reference_model, onnx_model, texts: List[str] = SAMPLE_TEXTS,
+                 min_cosine: float = 0.99) -> Dict:
+    """
+    Сравнить эмбеддинги ONNX и PyTorch на одних текстах
+
+    Returns:
+        словарь с минимальным/средним косинусом и флагом passed (min >= min_cosine)
+    """
+    reference = np.asarray(reference_model.encode(texts), dtype=np.float32)
+    candidate = np.asarray(onnx_model.encode(texts), dtype=np.float32)
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        'texts': len(texts),
+        'min_cosine': round(float(cosines.min()), 6),
+        'mean_cosine': round(float(cosines.mean()), 6),
+        'threshold': min_cosine,
+        'passed': bool(cosines.min() >= min_cosine),
+    }
+
+
+def throughput(model, texts: List[str], repeats: int = 20, batch_size: int = 32) -> Dict:
+    """Скорость кодирования: тексты в секунду на batch и по одному"""
+    corpus = texts * repeats
+    model.encode(texts[:4])  # прогрев
+
+    start = time.perf_counter()
+    model.encode(corpus, batch_size=batch_size)
+    batch_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        model.encode(text)
+    single_elapsed = time.perf_counter() - start
+
+    return {
+        'batch_texts_per_s': round(len(corpus) / batch_elapsed, 1),
+        'single_ms_per_text': round(single_elapsed * 1000 / len(texts), 2),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='ONNX-бэкенд энкодера: экспорт, проверка, бенчмарк')
+    parser.add_argument('--export', action='store_true', help='Экспортировать модель в ONNX')
+    parser.add_argument('--no-quantize', action='store_true', help='Не создавать int8-версию при экспорте')
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME, help='Модель HuggingFace или локальный путь')
+    parser.add_argument('--model-dir', default=ONNX_MODEL_DIR, help='Папка ONNX модели')
+    parser.add_argument('--parity', action='store_true', help='Сравнить эмбеддинги с PyTorch')
+    parser.add_argument('--bench', action='store_true', help='Сравнить скорость с PyTorch')
+    parser.add_argument('--output', '-o', help='Сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    if args.export:
+        export_onnx(args.model, args.model_dir, quantize=not args.no_quantize)
+
+    report = {}
+    if args.parity or args.bench:
+        from sentence_transformers import SentenceTransformer
+
+        torch_model = SentenceTransformer(args.model)
+        variants = {'onnx': OnnxSentenceEncoder(args.model_dir, quantized=False)}
+        if (Path(args.model_dir) / QUANTIZED_MODEL_FILE).exists():
+            variants['onnx_int8'] = OnnxSentenceEncoder(args.model_dir, quantized=True)
+
+        if args.parity:
+            # int8 допускает больше отклонений, чем float32-экспорт
+            report['parity'] = {
+                name: parity_check(torch_model, model, min_cosine=0.95 if name == 'onnx_int8' else 0.999)
+                for name, model in variants.items()
+            }
+            for name, result in report['parity'].items():
+                status = '✓' if result['passed'] else '✗'
+                print(f"{status} {name}: мин. косинус {result['min_cosine']}, средний {result['mean_cosine']}")
+
+        if args.bench:
+            report['throughput'] = {'torch': throughput(torch_model, SAMPLE_TEXTS)}
+            for name, model in variants.items():
+                report['throughput'][name] = throughput(model, SAMPLE_TEXTS)
+            for name, result in report['throughput'].items():
+                print(f"  {name:10} {result['batch_texts_per_s']:8} текстов/с (batch), "
+                      f"{result['single_ms_per_text']:6} мс на текст (по одному)")
+
+    if args.output and report:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Результаты сохранены в {args.output}")
+
+    if 'parity' in report and not all(r['passed'] for r in report['parity'].values()):
+        sys.exit(1)
@@ -0,0 +1,924 @@
+"""
+Потоковый конвейер классификации
+
+    источник -> normalize -> dedupe -> classify (чанками) -> write_to (приёмники)
+
+Каждая стадия - генератор: следующий элемент вычисляется, только когда его запросила
+следующая стадия, поэтому медленная модель сама притормаживает чтение (обратное давление),
+а в памяти одновременно не больше одного чанка. buffered() читает источник заранее
+в фоновом потоке через ограниченную очередь - разбор файла идёт параллельно с моделью,
+но быстрый источник не копит данные сверх PIPELINE_PREFETCH записей. prefetch_files()
+так же заранее начинает разбор следующих файлов каталога в общем пуле потоков.
+
+Записи - словари: index (позиция в источнике), text, name, id (id клиента), data (исходная
+запись); после классификации - category, confidence, top_3; после DatabaseSink -
+classification_id. Некорректная запись идёт дальше как {'index', 'error', 'data'}.
+
+Источники:  file_source (CSV / TXT / Excel / JSON / NDJSON - путь или поток), db_source
+            (таблица companies) или любой итерируемый объект строк / словарей
+Приёмники:  CsvSink, NdjsonSink, DatabaseSink, ReportSink - пишут по чанкам
+
+Использование:
+    records = normalize(file_source('data/companies.csv'), kind='companies')
+    report = ReportSink('output/report.json')
+    run(classify(records, company_batch(CompanyClassifier())),
+        [CsvSink('output/classified.csv'), report])
+
+    python pipeline.py rubrics.txt -o output/rubrics.csv -r output/report.json --dedupe
+    python pipeline.py data/companies.csv --kind companies -o output/classified.csv --db
+    python pipeline.py huge.csv -o output/huge.csv --resume    # с контрольными точками
+    python pipeline.py data/companies.csv --kind companies -o output/c.csv --reuse  # только изменённые
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from queue import Full, Queue
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import metrics
+from config import (BATCH_PARSE_WORKERS, BATCH_PREFETCH_FILES, PIPELINE_CHUNK_SIZE,
+                    PIPELINE_DEDUPE_MAX, PIPELINE_LOW_CONFIDENCE, PIPELINE_PREFETCH)
+from json_stream import iter_chunks
+
+# Поля записей: английские (API) и колонки выгрузки 2GIS
+TEXT_FIELDS = ('text', 'rubric', 'Рубрика')
+NAME_FIELDS = ('company_name', 'name', 'Наименование', 'Название')
+DESCRIPTION_FIELDS = ('description', 'Описание')
+RUBRICS_FIELDS = ('rubrics', 'Рубрики')
+
+# Функция классификации чанка: тексты -> [(категория, уверенность, [(категория, уверенность), ...])]
+ClassifyTexts = Callable[[List[str]], List[Tuple]]
+
+# ==================== ИСТОЧНИКИ ====================
+
+def file_source(source, filename: str = None) -> Iterator[Dict]:
+    """Записи файла или бинарного потока, лениво (DataProcessorEnhanced.iter_records)"""
+    from data_processor_enhanced import DataProcessorEnhanced
+    return DataProcessorEnhanced.iter_records(source, filename)
+
+
+def db_source(db, chunk_size: int = PIPELINE_CHUNK_SIZE) -> Iterator[Dict]:
+    """Компании из таблицы companies, курсор читается кусками"""
+    return db.iter_companies(chunk_size)
+
+# ==================== НОРМАЛИЗАЦИЯ ====================
+
+def _first(item: Dict, fields: Sequence[str]):
+    for field in fields:
+        value = item.get(field)
+        # None и NaN (пустые ячейки Excel / pandas) - как отсутствие значения
+        if value is not None and value == value and str(value).strip():
+            return value
+    return None
+
+
+def rubric_record(item) -> Tuple[str, str, Optional[str]]:
+    """(текст, имя, id клиента) рубрики: строка или объект с полем text (иначе первое поле)"""
+    if isinstance(item, str):
+        return item, 'Rubric', None
+    if isinstance(item, dict):
+        text = _first(item, TEXT_FIELDS)
+        if text is None:
+            text = _first(item, list(item)[:1])
+        return str(text or ''), 'Rubric', item.get('id')
+    raise ValueError('Элемент должен быть строкой или объектом с полем text')
+
+
+def company_record(item) -> Tuple[str, str, Optional[str]]:
+    """(текст, имя, id клиента) компании: название + описание + рубрики"""
+    if not isinstance(item, dict):
+        raise ValueError('Элемент должен быть объектом с полем company_name')
+    company_name = str(_first(item, NAME_FIELDS) or '')
+    description = _first(item, DESCRIPTION_FIELDS) or ''
+    rubrics = _first(item, RUBRICS_FIELDS) or ''
+    return f"{company_name} {description} {rubrics}", company_name, item.get('id')
+
+
+RECORD_PARSERS = {'rubrics': rubric_record, 'companies': company_record}
+
+
+def normalize(items: Iterable, kind='rubrics', skip_empty: bool = True,
+              stats: Optional[Counter] = None, start: int = 0) -> Iterator[Dict]:
+    """
+    Записи конвейера из элементов источника; пробелы в тексте схлопываются
+
+    Args:
+        kind: 'rubrics', 'companies' или функция элемент -> (текст, имя, id клиента)
+        skip_empty: пропускать записи без текста (stats['empty'])
+        start: index первого элемента (продолжение с контрольной точки)
+    """
+    parse = RECORD_PARSERS[kind] if isinstance(kind, str) else kind
+    for index, item in enumerate(items, start):
+        try:
+            text, name, client_id = parse(item)
+        except ValueError as e:
+            yield {'index': index, 'error': str(e), 'data': item}
+            continue
+        text = ' '.join(str(text).split())
+        if not text and skip_empty:
+            if stats is not None:
+                stats['empty'] += 1
+            continue
+        yield {'index': index, 'text': text, 'name': name, 'id': client_id, 'data': item}
+
+
+def _remember(seen: OrderedDict, key: bytes, max_size: int) -> bool:
+    """Учесть ключ в LRU-множестве seen; True - ключ новый"""
+    if key in seen:
+        seen.move_to_end(key)
+        return False
+    seen[key] = None
+    if len(seen) > max_size:
+        seen.popitem(last=False)
+    return True
+
+
+def replay_keys(keys: Iterable[bytes], max_size: int = PIPELINE_DEDUPE_MAX) -> OrderedDict:
+    """Состояние dedupe после ключей из журнала (продолжение с контрольной точки)"""
+    seen = OrderedDict()
+    for key in keys:
+        _remember(seen, key, max_size)
+    return seen
+
+
+def dedupe(records: Iterable[Dict], max_size: int = PIPELINE_DEDUPE_MAX,
+           stats: Optional[Counter] = None, seen: Optional[OrderedDict] = None,
+           journal: Optional[List[bytes]] = None) -> Iterator[Dict]:
+    """
+    Пропустить повторы текста (без учёта регистра)
+
+    Помнит не больше max_size последних различных текстов (8-байтовые хеши), поэтому
+    память ограничена и на файлах любого размера.
+
+    Args:
+        seen: начальное состояние (replay_keys)
+        journal: сюда дописывается ключ каждой записи - для контрольных точек
+    """
+    seen = OrderedDict() if seen is None else seen
+    for record in records:
+        if 'error' in record:
+            yield record
+            continue
+        key = hashlib.blake2b(record['text'].casefold().encode('utf-8'), digest_size=8).digest()
+        if journal is not None:
+            journal.append(key)
+        if not _remember(seen, key, max_size):
+            if stats is not None:
+                stats['duplicates'] += 1
+            continue
+        yield record
+
+# ==================== ОГРАНИЧЕННЫЙ БУФЕР ====================
+
+class _End:
+    """Конец потока в очереди buffered (error - исключение источника)"""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+class Prefetcher:
+    """
+    Итератор, который читает items заранее в фоновом потоке, держа не больше max_items
+    элементов. Чтение начинается сразу при создании; spawn(функция) запускает поток
+    (по умолчанию - отдельный, для общего пула - executor.submit).
+
+    Ошибка источника поднимается у потребителя в момент, когда он до неё дошёл.
+    close() останавливает фоновый поток, и тот закрывает источник.
+    """
+
+    def __init__(self, items: Iterable, max_items: int = PIPELINE_PREFETCH,
+                 spawn: Callable = None):
+        self.queue = Queue(maxsize=max(1, max_items))
+        self.stop = threading.Event()
+        self.done = False
+        if spawn is None:
+            spawn = lambda target: threading.Thread(target=target, name='pipeline-prefetch',
+                                                    daemon=True).start()
+        spawn(lambda: self._produce(items))
+
+    def _put(self, item) -> bool:
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _produce(self, items: Iterable):
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    return
+            self._put(_End())
+        except BaseException as e:
+            self._put(_End(e))
+        finally:
+            if self.stop.is_set() and hasattr(iterator, 'close'):
+                iterator.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.done:
+            raise StopIteration
+        # Фоновый поток всегда завершает очередь маркером _End
+        item = self.queue.get()
+        if isinstance(item, _End):
+            self.done = True
+            self.stop.set()
+            if item.error is not None:
+                raise item.error
+            raise StopIteration
+        return item
+
+    def close(self):
+        self.done = True
+        self.stop.set()
+
+
+def buffered(items: Iterable, max_items: int = PIPELINE_PREFETCH) -> Iterator:
+    """
+    Читать items заранее в фоновом потоке (Prefetcher), держа не больше max_items элементов
+
+    Фоновый поток стартует при первом запросе элемента. Если потребитель остановился
+    раньше, фоновый поток закрывает источник.
+    """
+    if max_items <= 0:
+        yield from items
+        return
+
+    reader = Prefetcher(items, max_items)
+    try:
+        yield from reader
+    finally:
+        reader.close()
+
+# ==================== ЗАГРУЗКА СТАДИЙ ====================
+
+class StageClock:
+    """
+    Время работы стадии, просуммированное по её потокам, и число элементов
+
+    Загрузка (utilisation) = время работы / (длительность запуска × потоков стадии)
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = workers
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, items: int = 0):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def report(self, wall: float) -> Dict:
+        return {
+            'workers': self.workers,
+            'busy_seconds': round(self.busy, 3),
+            'items': self.items,
+            'utilisation': round(self.busy / (wall * self.workers), 3) if wall > 0 else 0.0
+        }
+
+
+def timed(items: Iterable, clock: StageClock) -> Iterator:
+    """Учитывать в clock время получения каждого элемента items (разбор, ожидание очереди)"""
+    iterator = iter(items)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                clock.add(time.perf_counter() - started)
+                return
+            clock.add(time.perf_counter() - started, 1)
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+
+def timed_batch(classify_texts: ClassifyTexts, clock: StageClock) -> ClassifyTexts:
+    """classify_texts, учитывающая в clock время вызовов модели и число текстов"""
+    def classify_timed(texts):
+        started = time.perf_counter()
+        try:
+            return classify_texts(texts)
+        finally:
+            clock.add(time.perf_counter() - started, len(texts))
+    return classify_timed
+
+# ==================== НЕСКОЛЬКО ФАЙЛОВ ====================
+
+def prefetch_files(paths: Iterable, depth: int = BATCH_PREFETCH_FILES,
+                   workers: int = BATCH_PARSE_WORKERS, max_items: int = PIPELINE_PREFETCH,
+                   clock: Optional[StageClock] = None) -> Iterator[Tuple[str, Iterator[Dict]]]:
+    """
+    Разбирать следующие файлы, пока обрабатывается текущий (производитель/потребитель)
+
+    Общий пул из workers потоков читает текущий файл и до depth следующих; у каждого
+    файла - ограниченная очередь на max_items записей, поэтому память не зависит от
+    размера файлов. Пул выполняет задачи по порядку, так что текущий файл читается всегда.
+
+    Yields:
+        (путь, записи) по порядку paths. Записи файла, брошенные потребителем
+        (пропуск по контрольной точке, ошибка), закрываются при переходе к следующему.
+    """
+    paths = list(paths)
+    readers = deque()
+    submitted = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='pipeline-parse') as executor:
+        try:
+            for _ in paths:
+                while submitted < len(paths) and len(readers) <= max(0, depth):
+                    items = file_source(paths[submitted])
+                    if clock is not None:
+                        items = timed(items, clock)
+                    readers.append((paths[submitted], Prefetcher(items, max_items, executor.submit)))
+                    submitted += 1
+                path, reader = readers.popleft()
+                try:
+                    yield path, reader
+                finally:
+                    reader.close()
+        finally:
+            for _, reader in readers:
+                reader.close()
+
+# ==================== КЛАССИФИКАЦИЯ ====================
+
+def company_batch(classifier, n: int = 3) -> ClassifyTexts:
+    """Функция классификации чанка для CompanyClassifier - один вызов модели на чанк"""
+    if hasattr(classifier, 'classify_batch'):
+        return lambda texts: classifier.classify_batch(texts, n=n)
+    return lambda texts: [(*classifier.classify_text(text), classifier.classify_top_n(text, n=n))
+                          for text in texts]
+
+
+def rubrics_batch(classifier, top_n: int = 3) -> ClassifyTexts:
+    """Функция классификации чанка для RubricsClassifier (семантический поиск категорий)"""
+    def classify_texts(texts):
+        results = []
+        for result in classifier.classify_batch(texts, top_n=top_n, show_progress=False):
+            top = [(item['category_name'], item['confidence']) for item in result['classifications']]
+            results.append((*top[0], top) if top else ('Неизвестно', 0.0, top))
+        return results
+    return classify_texts
+
+
+def company_version(classifier, n: int = 3) -> str:
+    """Версия результатов CompanyClassifier для ResultCache: отпечаток модели и правил + n"""
+    return f"company:{classifier.fingerprint()}:top{n}"
+
+
+class ResultCache:
+    """
+    Повторное использование результатов между запусками (таблица result_cache):
+    хеш нормализованного текста + версия модели -> категория, уверенность, топ-3
+
+    Результат, посчитанный другой версией модели или правил, не используется -
+    такой текст классифицируется заново.
+    """
+
+    def __init__(self, db, model_version: str):
+        self.db = db
+        self.model_version = model_version
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def lookup(self, texts: Iterable[str]) -> Dict[str, Tuple]:
+        """{текст: результат} для текстов, уже классифицированных этой версией модели"""
+        keys = {self.key(text): text for text in texts}
+        found = self.db.get_cached_results(keys, self.model_version)
+        return {keys[key]: result for key, result in found.items()}
+
+    def store(self, results: Dict[str, Tuple]):
+        """Запомнить {текст: результат} одной транзакцией"""
+        self.db.save_cached_results(
+            {self.key(text): (category, float(confidence), [(cat, float(conf)) for cat, conf in top])
+             for text, (category, confidence, top) in results.items()},
+            self.model_version)
+
+    def store_chunk(self, chunk: List[Dict]):
+        """
+        Запомнить результаты чанка, посчитанные моделью (поле fresh от classify)
+
+        Вызывается после записи чанка в приёмники и контрольную точку: иначе
+        продолженный после сбоя запуск взял бы из кэша строки, которые
+        непрерывный запуск классифицировал бы. Ошибки и ответ 'Неизвестно'
+        (запасной результат модели) не сохраняются.
+        """
+        results = {
+            record['text']: (record['category'], record['confidence'], record['top_3'])
+            for record in chunk
+            if record.get('fresh') and 'error' not in record and record['category'] != 'Неизвестно'
+        }
+        if results:
+            self.store(results)
+
+
+def _set_result(record: Dict, result: Tuple):
+    category, confidence, top = result
+    record['category'] = category
+    record['confidence'] = float(confidence)
+    record['top_3'] = [(cat, float(conf)) for cat, conf in top]
+
+
+def classify(records: Iterable[Dict], classify_texts: ClassifyTexts,
+             chunk_size: int = PIPELINE_CHUNK_SIZE, cache: Optional[ResultCache] = None,
+             stats: Optional[Counter] = None) -> Iterator[List[Dict]]:
+    """
+    Классифицировать записи чанками: один вызов classify_texts на чанк
+
+    Args:
+        cache: ResultCache - тексты с сохранённым результатом этой версии модели не
+               классифицируются (stats['reused']); посчитанные моделью записи
+               помечаются fresh, сохраняет их вызывающий (ResultCache.store_chunk)
+
+    Yields:
+        списки записей (чанки) с category, confidence, top_3. Ошибка модели
+        помечает записи чанка полем error и не останавливает конвейер.
+    """
+    for chunk in iter_chunks(records, chunk_size):
+        valid = [record for record in chunk if 'error' not in record]
+        cached = {}
+        if valid and cache is not None:
+            with metrics.timer('cache_lookup', rows=len(valid)):
+                cached = cache.lookup(record['text'] for record in valid)
+        pending = [record for record in valid if record['text'] not in cached]
+        if pending:
+            texts = [record['text'] for record in pending]
+            try:
+                with metrics.timer('classify_batch', rows=len(pending)):
+                    results = classify_texts(texts)
+            except Exception as e:
+                print(f"❌ Ошибка классификации чанка: {e}")
+                for record in pending:
+                    record['error'] = str(e)
+                results = []
+            for record, result in zip(pending, results):
+                _set_result(record, result)
+                record['fresh'] = True
+        for record in valid:
+            if record['text'] in cached:
+                _set_result(record, cached[record['text']])
+                if stats is not None:
+                    stats['reused'] += 1
+        yield chunk
+
+# ==================== ПРИЁМНИКИ ====================
+
+def result_line(record: Dict) -> Dict:
+    """Результат записи для NDJSON-ответа / файла: index, id, category, confidence, top_3"""
+    if 'error' in record:
+        return {'index': record['index'], 'error': record['error']}
+    return {
+        'index': record['index'],
+        'id': record.get('id'),
+        'category': record['category'],
+        'confidence': round(record['confidence'], 4),
+        'top_3': [{'category': cat, 'confidence': round(conf, 4)} for cat, conf in record['top_3']],
+        'classification_id': record.get('classification_id')
+    }
+
+
+def _truncate(path: Path, size: int):
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+
+
+class CsvSink:
+    """
+    CSV: исходные поля записи + category, confidence, top_3; каждый чанк сразу на диск
+
+    row(запись) -> словарь столбцов задаёт другой формат строки (например, прежний формат CLI)
+    """
+
+    def __init__(self, path: str, encoding: str = 'utf-8', row: Callable[[Dict], Dict] = None):
+        self.path = Path(path)
+        self.encoding = encoding
+        self.row = row or self._row
+        self.file = None
+        self.writer = None
+        self.count = 0
+
+    @staticmethod
+    def _row(record: Dict) -> Dict:
+        data = record.get('data')
+        row = dict(data) if isinstance(data, dict) else {'text': record['text']}
+        row['category'] = record['category']
+        row['confidence'] = round(record['confidence'], 4)
+        row['top_3'] = '; '.join(f"{cat} ({conf:.2f})" for cat, conf in record['top_3'])
+        return row
+
+    def write(self, chunk: List[Dict]):
+        rows = [self.row(record) for record in chunk if 'error' not in record]
+        if not rows:
+            return
+        if self.writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, 'w', encoding=self.encoding, newline='')
+            # Столбцы - по первой записи; лишние поля следующих записей не пишутся
+            self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0]), restval='',
+                                         extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerows(rows)
+        self.file.flush()
+        self.count += len(rows)
+
+    def state(self) -> Dict:
+        """Состояние для контрольной точки (checkpoint.py): столбцы и размер файла"""
+        if self.writer is None:
+            return {'count': self.count, 'path': None}
+        size = os.fstat(self.file.fileno()).st_size if self.file else self.path.stat().st_size
+        return {'count': self.count, 'path': str(self.path), 'size': size,
+                'fieldnames': self.writer.fieldnames}
+
+    def restore(self, state: Dict):
+        """Продолжить файл с зафиксированного размера (хвост незавершённого чанка отрезается)"""
+        self.count = state['count']
+        if not state.get('path'):
+            return
+        _truncate(self.path, state['size'])
+        self.file = open(self.path, 'a', encoding=self.encoding, newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=state['fieldnames'], restval='',
+                                     extrasaction='ignore')
+
+    def close(self) -> int:
+        if self.file:
+            self.file.close()
+            self.file = None
+        return self.count
+
+
+class NdjsonSink:
+    """NDJSON: строка result_line на запись, включая ошибки"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.file = None
+        self.count = 0
+
+    def write(self, chunk: List[Dict]):
+        if self.file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write(''.join(json.dumps(result_line(record), ensure_ascii=False) + '\n'
+                                for record in chunk))
+        self.file.flush()
+        self.count += len(chunk)
+
+    def state(self) -> Dict:
+        if self.file is None and not self.count:
+            return {'count': 0, 'path': None}
+        size = os.fstat(self.file.fileno()).st_size if self.file else self.path.stat().st_size
+        return {'count': self.count, 'path': str(self.path), 'size': size}
+
+    def restore(self, state: Dict):
+        self.count = state['count']
+        if state.get('path'):
+            _truncate(self.path, state['size'])
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self) -> int:
+        if self.file:
+            self.file.close()
+            self.file = None
+        return self.count
+
+
+class DatabaseSink:
+    """Таблица classifications: одна транзакция на чанк, id записываются в classification_id"""
+
+    def __init__(self, db):
+        self.db = db
+        self.count = 0
+
+    def write(self, chunk: List[Dict]):
+        valid = [record for record in chunk if 'error' not in record]
+        if not valid:
+            return
+        ids = self.db.save_classifications([{
+            'company_name': record['name'],
+            'text': record['text'],
+            'predicted_category': record['category'],
+            'confidence': record['confidence'],
+            'top_3': record['top_3']
+        } for record in valid])
+        for record, classification_id in zip(valid, ids):
+            record['classification_id'] = classification_id
+        self.count += sum(classification_id is not None for classification_id in ids)
+
+    def state(self) -> Dict:
+        return {'count': self.count}
+
+    def restore(self, state: Dict):
+        self.count = state['count']
+
+    def close(self) -> int:
+        return self.count
+
+
+class ReportSink:
+    """
+    Отчёт по ходу потока: распределение категорий и уверенность без хранения результатов
+
+    stats - счётчики стадий (empty, duplicates, reused), попадают в отчёт
+    keys - переименование ключей отчёта ({'total': 'total_companies'} - прежний формат CLI)
+    """
+
+    def __init__(self, path: str = None, low_confidence: float = PIPELINE_LOW_CONFIDENCE,
+                 stats: Optional[Counter] = None, keys: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.keys = keys or {}
+        self.low_confidence = low_confidence
+        self.stats = stats if stats is not None else Counter()
+        self.categories = Counter()
+        self.total = 0
+        self.errors = 0
+        self.low = 0
+        self.confidence_sum = 0.0
+        self.confidence_min = None
+        self.confidence_max = None
+        self.closed = False
+
+    def write(self, chunk: List[Dict]):
+        for record in chunk:
+            if 'error' in record:
+                self.errors += 1
+                continue
+            confidence = record['confidence']
+            self.total += 1
+            self.categories[record['category']] += 1
+            self.confidence_sum += confidence
+            self.low += confidence < self.low_confidence
+            self.confidence_min = confidence if self.confidence_min is None else min(self.confidence_min, confidence)
+            self.confidence_max = confidence if self.confidence_max is None else max(self.confidence_max, confidence)
+
+    def report(self) -> Dict:
+        report = {
+            'total': self.total,
+            'errors': self.errors,
+            **self.stats,
+            'unique_categories': len(self.categories),
+            'avg_confidence': self.confidence_sum / self.total if self.total else 0.0,
+            'min_confidence': self.confidence_min or 0.0,
+            'max_confidence': self.confidence_max or 0.0,
+            'low_confidence_items': self.low,
+            'categories_distribution': dict(self.categories.most_common())
+        }
+        return {self.keys.get(key, key): value for key, value in report.items()}
+
+    def state(self) -> Dict:
+        """Счётчики отчёта; файл отчёта - выход только после close"""
+        state = {
+            'total': self.total,
+            'errors': self.errors,
+            'low': self.low,
+            'confidence_sum': self.confidence_sum,
+            'confidence_min': self.confidence_min,
+            'confidence_max': self.confidence_max,
+            'categories': dict(self.categories),
+            'path': None
+        }
+        if self.closed and self.path:
+            state.update(path=str(self.path), size=Path(self.path).stat().st_size)
+        return state
+
+    def restore(self, state: Dict):
+        self.total = state['total']
+        self.errors = state['errors']
+        self.low = state['low']
+        self.confidence_sum = state['confidence_sum']
+        self.confidence_min = state['confidence_min']
+        self.confidence_max = state['confidence_max']
+        self.categories = Counter(state['categories'])
+
+    def close(self) -> Dict:
+        report = self.report()
+        if self.path and not self.closed:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        self.closed = True
+        return report
+
+
+def write_to(chunks: Iterable[List[Dict]], sinks: Sequence) -> Iterator[List[Dict]]:
+    """Передать каждый чанк во все приёмники и отдать дальше; приёмники закрываются в конце"""
+    try:
+        for chunk in chunks:
+            for sink in sinks:
+                sink.write(chunk)
+            yield chunk
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+def run(chunks: Iterable[List[Dict]], sinks: Sequence) -> int:
+    """Прогнать конвейер до конца; возвращает число записей"""
+    total = 0
+    for chunk in write_to(chunks, sinks):
+        total += len(chunk)
+    return total
+
+# ==================== ГОТОВЫЙ КОНВЕЙЕР ДЛЯ ФАЙЛА ====================
+
+# Формат результатов компаний (README, "Формат результатов") - общий для
+# main_fixed.py --input и batch_process.py: столбцы CSV и ключи отчёта
+COMPANY_REPORT_KEYS = {'total': 'total_companies'}
+
+
+def company_row(record: Dict) -> Dict:
+    """Строка CSV компаний: название, итоговая категория модели и топ-3 вариантов"""
+    return {
+        'company_name': record['name'],
+        'final_category': record['category'],
+        'final_confidence': round(record['confidence'], 4),
+        'top_3': '; '.join(f"{cat} ({conf:.2f})" for cat, conf in record['top_3'])
+    }
+
+
+def output_sink(path: str, row: Callable[[Dict], Dict] = None):
+    """CsvSink (row - формат строки) или NdjsonSink по расширению"""
+    if Path(path).suffix.lower() in ('.ndjson', '.jsonl'):
+        return NdjsonSink(path)
+    return CsvSink(path, row=row)
+
+
+def classify_file(source, classify_texts: ClassifyTexts, kind: str = 'rubrics',
+                  output: str = None, report: str = None, db=None,
+                  unique: bool = False, filename: str = None,
+                  chunk_size: int = PIPELINE_CHUNK_SIZE, prefetch: int = PIPELINE_PREFETCH,
+                  progress: bool = True, checkpoint=None, model: Dict = None,
+                  cache: Optional[ResultCache] = None, items: Iterable = None,
+                  row: Callable[[Dict], Dict] = None, report_keys: Dict[str, str] = None) -> Dict:
+    """
+    Классифицировать файл потоком: результаты пишутся в output по мере готовности чанков
+
+    Args:
+        source: путь или бинарный поток (тогда формат - по filename)
+        kind: 'rubrics' или 'companies'
+        output: CSV / NDJSON с результатами
+        report: JSON-отчёт (ReportSink)
+        db: Database - сохранить классификации
+        unique: пропускать повторы текста (dedupe)
+        checkpoint: checkpoint.Checkpoint - фиксировать каждый чанк и продолжать
+                    прерванный запуск (только для пути к файлу)
+        model: отпечаток модели (checkpoint.model_fingerprint) - другая модель
+               отменяет продолжение и пропуск
+        cache: ResultCache - классифицировать только новые и изменившиеся тексты
+        items: уже запущенное чтение source (prefetch_files) вместо file_source
+        row: формат строки CSV (CsvSink), report_keys: имена ключей отчёта (ReportSink)
+
+    Returns:
+        отчёт ReportSink
+    """
+    report_sink = ReportSink(report, keys=report_keys)
+    sinks = [output_sink(output, row)] if output else []
+    if db is not None:
+        sinks.append(DatabaseSink(db))
+    sinks.append(report_sink)
+
+    mode = 'fresh'
+    if checkpoint is not None:
+        settings = {'kind': kind, 'unique': unique, 'output': output, 'report': report,
+                    'db': db is not None, 'dedupe_max': PIPELINE_DEDUPE_MAX, 'model': model,
+                    'row': getattr(row, '__qualname__', None), 'report_keys': report_keys}
+        mode = checkpoint.begin(source, settings)
+        if mode == 'skip':
+            if progress:
+                print(f"⏭ {source}: не изменился с прошлого запуска, результаты уже готовы")
+            return checkpoint.manifest['result']
+
+    stats = Counter()
+    position = 0
+    seen = None
+    journal = [] if checkpoint is not None and unique else None
+    if mode == 'resume':
+        position = checkpoint.manifest['position']
+        stats = Counter(checkpoint.manifest['stats'])
+        for sink, state in zip(sinks, checkpoint.manifest['sinks']):
+            sink.restore(state)
+        if unique:
+            seen = replay_keys(checkpoint.restore_keys())
+        if progress:
+            print(f"↩ {source}: продолжение с записи {position} "
+                  f"(чанков готово: {checkpoint.manifest['chunks']})")
+    if cache is not None:
+        stats.setdefault('reused', 0)  # в отчёте и при нуле
+    report_sink.stats = stats
+
+    if items is None:
+        items = buffered(file_source(source, filename), prefetch)
+    if position:
+        # Уже обработанные записи разбираются, но не классифицируются
+        items = islice(items, position, None)
+    records = normalize(items, kind, stats=stats, start=position)
+    if unique:
+        records = dedupe(records, stats=stats, seen=seen, journal=journal)
+
+    for chunk in write_to(classify(records, classify_texts, chunk_size, cache, stats), sinks):
+        if checkpoint is not None:
+            # Генераторы стоят сразу после последней записи чанка - счётчики и журнал точные
+            checkpoint.commit(chunk[-1]['index'] + 1, stats, sinks, journal)
+        if cache is not None:
+            cache.store_chunk(chunk)
+        if progress:
+            reused = f" (повторно использовано: {stats['reused']})" if cache is not None else ''
+            print(f"\r  ... {report_sink.total} записей{reused}", end='', flush=True)
+    if progress:
+        print()
+    result = report_sink.report()
+    if checkpoint is not None:
+        checkpoint.finish(result, sinks)
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+    import profiling
+
+    parser = argparse.ArgumentParser(description='Потоковая классификация файла (CSV / TXT / Excel / JSON / NDJSON)')
+    parser.add_argument('input', help='Входной файл')
+    parser.add_argument('--kind', choices=list(RECORD_PARSERS), default='rubrics',
+                        help='Записи: rubrics (текст) или companies (название, описание, рубрики)')
+    parser.add_argument('--output', '-o', help='Результаты: .csv или .ndjson')
+    parser.add_argument('--report', '-r', help='JSON-отчёт')
+    parser.add_argument('--db', action='store_true', help='Сохранить классификации в БД')
+    parser.add_argument('--dedupe', action='store_true', help='Пропускать повторяющиеся тексты')
+    parser.add_argument('--categories', help='CSV категорий (№, Тип, Общее описание): семантический '
+                                             'RubricsClassifier вместо обученной модели')
+    parser.add_argument('--resume', action='store_true',
+                        help='Контрольные точки (checkpoint.py): продолжить прерванный запуск, '
+                             'не изменившийся файл пропустить')
+    parser.add_argument('--reuse', action='store_true',
+                        help='Кэш результатов в БД (ResultCache): классифицировать только новые '
+                             'и изменившиеся тексты - для обученной модели (без --categories)')
+    parser.add_argument('--chunk-size', type=int, default=PIPELINE_CHUNK_SIZE)
+    parser.add_argument('--prefetch', type=int, default=PIPELINE_PREFETCH)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.categories:
+        from loaders import read_csv
+        from rubrics_classifier import RubricsClassifier
+        categories_df = read_csv(args.categories)
+        model = RubricsClassifier()
+        model.load_categories([
+            {'id': row['№'], 'name': row['Тип'], 'description': row['Общее описание']}
+            for _, row in categories_df.iterrows()
+        ], source_file=args.categories)
+        classify_texts = rubrics_batch(model)
+    else:
+        from classifier import CompanyClassifier
+        model = CompanyClassifier()
+        classify_texts = company_batch(model)
+
+    database = None
+    if args.db or args.reuse:
+        from database import Database
+        database = Database()
+    cache = None
+    if args.reuse and not args.categories:
+        cache = ResultCache(database, company_version(model))
+
+    target = args.report or args.output
+    checkpoint = None
+    fingerprint = None
+    if args.resume and target:
+        from checkpoint import Checkpoint, model_fingerprint
+        checkpoint = Checkpoint(f"{args.output or args.report}.checkpoint.json")
+        fingerprint = model_fingerprint(model)
+    with profiling.from_args(args, Path(target).parent if target else 'output', 'pipeline'):
+        result = classify_file(args.input, classify_texts, kind=args.kind, output=args.output,
+                               report=args.report, db=database if args.db else None, unique=args.dedupe,
+                               chunk_size=args.chunk_size, prefetch=args.prefetch,
+                               checkpoint=checkpoint, model=fingerprint, cache=cache)
+
+    print(f"✓ Классифицировано: {result['total']}, ошибок: {result['errors']}, "
+          f"повторов: {result.get('duplicates', 0)}, пустых: {result.get('empty', 0)}, "
+          f"из кэша: {result.get('reused', 0)}")
+    print(f"  Средняя уверенность: {result['avg_confidence']:.2%}, "
+          f"низкая (<{PIPELINE_LOW_CONFIDENCE:.0%}): {result['low_confidence_items']}")
+    if args.output:
+        print(f"  Результаты: {args.output}")
+    if args.report:
+        print(f"  Отчёт: {args.report}")
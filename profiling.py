@@ -0,0 +1,257 @@
+"""
+Профилирование запусков CLI: python batch_process.py data output --profile
+
+Во время запуска одновременно работают:
+- cProfile - точное время по функциям (сводка топ-функций + .prof для snakeviz/pstats);
+- сэмплер стеков всех потоков раз в PROFILE_SAMPLE_INTERVAL секунд - файл .collapsed
+  в формате "a;b;c count" для flamegraph.pl / speedscope / inferno;
+- опционально (--profile-memory) tracemalloc: пик памяти по этапам metrics.timer
+  (file_parse, vectorize, predict, encode, ...).
+
+Результаты пишутся рядом с batch_summary.json / report.json:
+    profile_<name>.prof, profile_<name>.collapsed, profile_<name>.json
+
+Использование в коде:
+    from profiling import Profiler
+
+    with Profiler('output', 'batch', memory=True):
+        process_all_csv_files(...)
+"""
+
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+from config import PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_N
+
+MB = 1024 * 1024
+
+
+def _frame_label(code) -> str:
+    # ';' - разделитель кадров в формате collapsed stacks (счётчик - после последнего пробела)
+    label = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+    return label.replace(';', ':')
+
+
+class StackSampler:
+    """Периодический сэмплинг стеков всех потоков (кроме своего)"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f'thread-{thread_id}').replace(';', ':'))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class StageMemory:
+    """
+    Пик памяти (tracemalloc) по этапам metrics.timer
+
+    Вложенные этапы учитываются корректно: пик дочернего этапа входит в пик родителя.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict] = {}
+        self.peak = 0  # reset_peak сбрасывает общий пик - храним максимум сами
+        self._local = threading.local()
+
+    def _stack(self) -> List:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def __call__(self, stage: str, entering: bool) -> None:
+        stack = self._stack()
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        if entering:
+            if stack:
+                stack[-1][2] = max(stack[-1][2], peak)
+            tracemalloc.reset_peak()
+            stack.append([stage, current, current])
+            return
+        if not stack or stack[-1][0] != stage:
+            return
+        _, start, seen_peak = stack.pop()
+        peak = max(peak, seen_peak)
+        if stack:
+            stack[-1][2] = max(stack[-1][2], peak)
+        entry = self.stages.setdefault(stage, {'calls': 0, 'peak_mb': 0.0, 'max_delta_mb': 0.0})
+        entry['calls'] += 1
+        entry['peak_mb'] = round(max(entry['peak_mb'], peak / MB), 3)
+        entry['max_delta_mb'] = round(max(entry['max_delta_mb'], (peak - start) / MB), 3)
+
+
+def top_functions(stats: pstats.Stats, n: int = PROFILE_TOP_N, sort: str = 'cumulative') -> List[Dict]:
+    """Топ-n функций из pstats: по cumulative (с вызовами) или tottime (собственное время)"""
+    index = 3 if sort == 'cumulative' else 2
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:n]
+    result = []
+    for (filename, line, name), (primitive_calls, calls, tottime, cumtime, _) in rows:
+        result.append({
+            'function': f"{name} ({Path(filename).name}:{line})" if line else name,
+            'file': filename,
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'tottime_s': round(tottime, 6),
+            'cumtime_s': round(cumtime, 6),
+        })
+    return result
+
+
+class Profiler:
+    """Контекстный менеджер профилирования запуска"""
+
+    def __init__(self, output_dir: str, name: str = 'run', memory: bool = False,
+                 interval: float = PROFILE_SAMPLE_INTERVAL, top_n: int = PROFILE_TOP_N):
+        """
+        Args:
+            output_dir: куда писать результаты (рядом с отчётами запуска)
+            name: имя запуска - часть имён файлов profile_<name>.*
+            memory: пики памяти по этапам через tracemalloc (заметно замедляет работу)
+            interval: период сэмплинга стеков, секунды
+            top_n: сколько функций в сводке
+        """
+        self.output_dir = Path(output_dir)
+        self.name = name
+        self.memory = memory
+        self.top_n = top_n
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(interval)
+        self.stage_memory = StageMemory() if memory else None
+        self.summary: Optional[Dict] = None
+        self._metrics_were_enabled = metrics.is_enabled()
+
+    def __enter__(self):
+        metrics.reset()
+        if self.memory:
+            # Этапы берутся из metrics.timer - без включённых метрик их не видно
+            metrics.enable(True)
+            tracemalloc.start()
+            metrics.add_stage_listener(self.stage_memory)
+        self._started = time.perf_counter()
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.disable()
+        self.sampler.stop()
+        elapsed = time.perf_counter() - self._started
+        memory_peak = None
+        if self.memory:
+            metrics.remove_stage_listener(self.stage_memory)
+            memory_peak = max(tracemalloc.get_traced_memory()[1], self.stage_memory.peak)
+            tracemalloc.stop()
+            metrics.enable(self._metrics_were_enabled)
+        try:
+            self._write(elapsed, memory_peak, failed=exc_type is not None)
+        except Exception as e:
+            print(f"❌ Ошибка сохранения профиля: {e}")
+        return False
+
+    def _write(self, elapsed: float, memory_peak: Optional[int], failed: bool) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        base = f"profile_{self.name}"
+        prof_file = self.output_dir / f"{base}.prof"
+        collapsed_file = self.output_dir / f"{base}.collapsed"
+        summary_file = self.output_dir / f"{base}.json"
+
+        self.profile.dump_stats(str(prof_file))
+        self.sampler.write_collapsed(collapsed_file)
+        stats = pstats.Stats(self.profile)
+
+        self.summary = {
+            'timestamp': datetime.now().isoformat(),
+            'name': self.name,
+            'argv': sys.argv,
+            'failed': failed,
+            'wall_time_s': round(elapsed, 3),
+            'total_calls': stats.total_calls,
+            'samples': self.sampler.samples,
+            'sample_interval_s': self.sampler.interval,
+            'top_cumulative': top_functions(stats, self.top_n, 'cumulative'),
+            'top_tottime': top_functions(stats, self.top_n, 'tottime'),
+            'stages': metrics.snapshot()['stages'],
+            'files': {
+                'pstats': str(prof_file),
+                'collapsed': str(collapsed_file),
+            },
+        }
+        if self.memory:
+            self.summary['memory'] = {
+                'peak_mb': round(memory_peak / MB, 3),
+                'stages': self.stage_memory.stages,
+            }
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(self.summary, f, ensure_ascii=False, indent=2)
+
+        print(f"\n{'='*70}")
+        print(f"⏱️  Профиль запуска: {elapsed:.2f} с, {stats.total_calls} вызовов, {self.sampler.samples} сэмплов")
+        print(f"{'Собств., с':>11} {'Всего, с':>10} {'Вызовов':>9}  Функция")
+        for row in self.summary['top_tottime'][:15]:
+            print(f"{row['tottime_s']:>11.3f} {row['cumtime_s']:>10.3f} {row['calls']:>9}  {row['function']}")
+        if self.memory:
+            print(f"💾 Пик памяти: {self.summary['memory']['peak_mb']:.1f} MB")
+            for stage, entry in sorted(self.stage_memory.stages.items(), key=lambda item: -item[1]['max_delta_mb']):
+                print(f"   {stage:<15} +{entry['max_delta_mb']:.1f} MB (вызовов: {entry['calls']})")
+        print(f"✓ Сводка: {summary_file}")
+        print(f"✓ Flamegraph (collapsed stacks): {collapsed_file}")
+        print(f"✓ pstats: {prof_file}")
+        print(f"{'='*70}")
+
+
+def add_arguments(parser) -> None:
+    """Добавить --profile / --profile-memory в argparse CLI"""
+    parser.add_argument('--profile', action='store_true',
+                        help='Профилировать запуск (cProfile + flamegraph collapsed stacks)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='С --profile: пики памяти по этапам (tracemalloc)')
+
+
+def from_args(args, output_dir: str, name: str):
+    """Profiler, если в args указан --profile, иначе пустой контекст"""
+    if not getattr(args, 'profile', False):
+        return nullcontext()
+    return Profiler(output_dir, name, memory=getattr(args, 'profile_memory', False))
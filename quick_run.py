@@ -12,6 +12,7 @@
 from rubrics_classifier import RubricsClassifier
 import pandas as pd
 import sys
+from loaders import read_csv
 
 def main():
     try:
@@ -22,7 +23,7 @@ def main():
         # 1. ЗАГРУЖАЕМ КАТЕГОРИИ из CSV
         print("\n1️⃣ Загружаю категории из categories.csv...")
         try:
-            categories_df = pd.read_csv('categories.csv', encoding='utf-8')
+            categories_df = read_csv('categories.csv')
         except FileNotFoundError:
             print("❌ Файл categories.csv не найден!")
             print("   Убедись что categories.csv находится в той же папке")
@@ -54,7 +55,7 @@ def main():
         # 3. ИНИЦИАЛИЗИРУЕМ КЛАССИФИКАТОР
         print("\n3️⃣ Инициализирую классификатор...")
         classifier = RubricsClassifier()
-        classifier.load_categories(categories)
+        classifier.load_categories(categories, source_file='categories.csv')
         print("   ✓ Готово")
         
         # 4. КЛАССИФИЦИРУЕМ
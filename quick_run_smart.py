@@ -18,21 +18,7 @@ from rubrics_classifier import RubricsClassifier
 import pandas as pd
 import sys
 from pathlib import Path
-
-def detect_csv_separator(file_path):
-    """Автоматически определяет разделитель в CSV (запятая или точка с запятой)"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        first_line = f.readline()
-    
-    # Считаем количество запятых и точек с запятой
-    comma_count = first_line.count(',')
-    semicolon_count = first_line.count(';')
-    
-    # Выбираем более частый разделитель
-    if semicolon_count > comma_count:
-        return ';'
-    else:
-        return ','
+from loaders import read_csv, sniff
 
 def main():
     try:
@@ -48,12 +34,12 @@ def main():
                 print(f"❌ Файл {categories_file} не найден!")
                 sys.exit(1)
             
-            # Определяем разделитель
-            separator = detect_csv_separator(categories_file)
-            print(f"   Обнаружен разделитель: {repr(separator)}")
+            # Определяем кодировку и разделитель (один раз, по началу файла)
+            csv_format = sniff(categories_file)
+            print(f"   Обнаружен разделитель: {repr(csv_format['delimiter'])}, кодировка: {csv_format['encoding']}")
             
-            # Загружаем с правильным разделителем
-            categories_df = pd.read_csv(categories_file, encoding='utf-8', sep=separator)
+            # Загружаем с найденным форматом
+            categories_df = read_csv(categories_file, fmt=csv_format)
             
             # Нормализуем названия столбцов (убираем пробелы)
             categories_df.columns = categories_df.columns.str.strip()
@@ -123,7 +109,7 @@ def main():
         # 3. ИНИЦИАЛИЗИРУЕМ КЛАССИФИКАТОР
         print("\n3️⃣ Инициализирую классификатор...")
         classifier = RubricsClassifier()
-        classifier.load_categories(categories)
+        classifier.load_categories(categories, source_file=categories_file)
         print("   ✓ Готово")
         
         # 4. КЛАССИФИЦИРУЕМ
@@ -4,42 +4,92 @@
 
 Установка зависимостей:
 pip install sentence-transformers scikit-learn pandas numpy
+(для ENCODER_BACKEND = 'onnx' вместо sentence-transformers: pip install onnxruntime tokenizers)
 """
 
 import json
 import csv
 from typing import List, Dict, Tuple, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 from pathlib import Path
+from vector_index import create_index, load_index
+from corrections_memory import CorrectionsMemory
+from encoding_scheduler import EncodingScheduler, MicroBatcher
+import warm_start
+import metrics
+from config import (CORRECTIONS_KNN_WEIGHT, EMBEDDING_DTYPE, ENCODER_BACKEND, ONNX_MODEL_DIR,
+                    ENCODE_MICROBATCH_WAIT_MS, ENCODE_MICROBATCH_MAX_SIZE, WARM_START)
 
 
 class RubricsClassifier:
     """Классификатор рубрик с использованием семантических эмбеддингов"""
     
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 index_type: str = 'flat', index_params: Optional[Dict] = None,
+                 embedding_dtype: str = EMBEDDING_DTYPE, backend: str = ENCODER_BACKEND,
+                 use_warm_start: bool = WARM_START):
         """
         Инициализация классификатора
         
         Args:
             model_name: Название модели от HuggingFace (поддерживает русский язык)
+            index_type: Индекс категорий - 'flat' (точный) или 'ivf' (приближённый,
+                        для больших таксономий)
+            index_params: Параметры индекса (например {'nprobe': 16} для 'ivf')
+            embedding_dtype: Хранение эмбеддингов в индексах - 'float32', 'float16'
+                             или 'int8' (см. python vector_index.py --quant-report)
+            backend: Энкодер - 'torch' (SentenceTransformer) или 'onnx' (локальная
+                     ONNX модель из ONNX_MODEL_DIR, см. onnx_encoder.py)
+            use_warm_start: Брать модель и эмбеддинги категорий из артефакта
+                            тёплого старта (WARM_START_DIR, см. warm_start.py)
         """
-        print(f"Загружаю модель {model_name}...")
-        self.model = SentenceTransformer(model_name)
+        if backend == 'onnx':
+            from onnx_encoder import OnnxSentenceEncoder
+            print(f"Загружаю ONNX модель из {ONNX_MODEL_DIR}...")
+            self.model = OnnxSentenceEncoder(ONNX_MODEL_DIR)
+            self.model_path = ONNX_MODEL_DIR
+        elif backend == 'torch':
+            # Локальная копия из тёплого старта - без обращения к сети
+            self.model_path = warm_start.resolve_model_path(model_name) if use_warm_start else None
+            from sentence_transformers import SentenceTransformer
+            print(f"Загружаю модель {self.model_path or model_name}...")
+            self.model = SentenceTransformer(self.model_path or model_name)
+        else:
+            raise ValueError(f"Неизвестный бэкенд энкодера: {backend} (доступны: torch, onnx)")
+        self.model_name = model_name
+        self.backend = backend
+        self.use_warm_start = use_warm_start
+        # Кодирование батчами по длине текста (см. encoding_scheduler.py)
+        self.encoder = EncodingScheduler(self.model)
+        self.single_batcher = None
         self.categories = {}
         self.category_embeddings = {}
         self.rubrics = []
+        self.index_type = index_type
+        self.index_params = {'dtype': embedding_dtype, **(index_params or {})}
+        self.index = None
+        self.corrections = None
+        self.corrections_db = None
+        self.corrections_weight = CORRECTIONS_KNN_WEIGHT
         print("✓ Модель загружена")
     
-    def load_categories(self, categories_data: List[Dict]) -> None:
+    def fingerprint(self) -> str:
+        """
+        Версия результатов для контрольных точек (checkpoint.model_fingerprint):
+        модель эмбеддингов + загруженные категории
+        """
+        return f"{self.model_name}:{warm_start.categories_hash(self.categories)}"
+    
+    def load_categories(self, categories_data: List[Dict], source_file: Optional[str] = None) -> None:
         """
         Загрузка категорий для классификации
         
         Args:
             categories_data: Список словарей с полями 'id', 'name', 'description'
                             Пример: [{'id': 1, 'name': 'Жильё', 'description': 'Жилой комплекс; частные дома'}]
+            source_file: Файл, из которого прочитаны категории (его хэш
+                         проверяется при тёплом старте)
         """
         print(f"\nЗагружаю {len(categories_data)} категорий...")
         
@@ -57,15 +107,199 @@ class RubricsClassifier:
                 'combined': combined_text
             }
         
+        # Категории не менялись - эмбеддинги из тёплого старта, без encode
+        restored = self.use_warm_start and warm_start.restore(self, source_file)
+        if self.use_warm_start:
+            metrics.cache('warm_start', hit=restored)
+        if restored:
+            print(f"✓ {len(self.categories)} категорий готовы (тёплый старт)")
+            return
+        
         # Вычисляем эмбеддинги для всех категорий
         combined_texts = [cat['combined'] for cat in self.categories.values()]
-        embeddings = self.model.encode(combined_texts, show_progress_bar=True)
+        with metrics.timer('encode', rows=len(combined_texts)):
+            embeddings = self.encoder.encode(combined_texts, show_progress_bar=True)
         
         for (cat_id, cat_info), embedding in zip(self.categories.items(), embeddings):
             self.category_embeddings[cat_id] = embedding
         
+        self.index = create_index(self.index_type, embeddings.shape[1], **self.index_params)
+        self.index.add(embeddings, list(self.categories.keys()))
+        
+        if self.use_warm_start:
+            try:
+                warm_start.save(self, source_file)
+            except Exception as e:
+                print(f"⚠️ Ошибка сохранения тёплого старта: {e}")
+        
         print(f"✓ {len(self.categories)} категорий готовы")
     
+    def add_categories(self, categories_data: List[Dict]) -> None:
+        """
+        Добавить категории в уже построенный индекс (кодируются только новые)
+        
+        Args:
+            categories_data: Список словарей в формате load_categories
+        """
+        if self.index is None:
+            self.load_categories(categories_data)
+            return
+        
+        new_ids = []
+        for cat in categories_data:
+            cat_id = cat.get('id', cat.get('Тип'))
+            if cat_id in self.categories:
+                continue
+            cat_name = cat.get('name', cat.get('Тип'))
+            cat_desc = cat.get('description', cat.get('Общее описание', ''))
+            self.categories[cat_id] = {
+                'name': cat_name,
+                'description': cat_desc,
+                'combined': f"{cat_name}. {cat_desc}"
+            }
+            new_ids.append(cat_id)
+        
+        if not new_ids:
+            return
+        
+        embeddings = self.encoder.encode([self.categories[cat_id]['combined'] for cat_id in new_ids])
+        for cat_id, embedding in zip(new_ids, embeddings):
+            self.category_embeddings[cat_id] = embedding
+        self.index.add(embeddings, new_ids)
+        print(f"✓ Добавлено {len(new_ids)} категорий (всего {len(self.categories)})")
+    
+    def save_index(self, path: str) -> str:
+        """Сохранить индекс категорий на диск"""
+        return self.index.save(path)
+    
+    def load_index(self, path: str) -> None:
+        """
+        Загрузить индекс категорий с диска
+        Категории (self.categories) должны быть загружены с теми же id
+        """
+        self.index = load_index(path)
+        self.index_type = self.index.kind
+    
+    def use_corrections(self, db=None, weight: float = CORRECTIONS_KNN_WEIGHT, **memory_kwargs) -> None:
+        """
+        Включить режим kNN по исправленным примерам
+        
+        Исправленные оператором рубрики (таблица corrections) кодируются один раз
+        и хранятся в индексе на диске. Итоговый скор категории:
+        (1 - weight) * сходство с описанием + weight * доля голосов соседей.
+        Новые корректировки подхватываются из db не чаще раза в CORRECTIONS_SYNC_INTERVAL
+        секунд или сразу после correction_added().
+        
+        Args:
+            db: экземпляр Database (None - только то, что уже в индексе)
+            weight: вес голосования соседей (0-1)
+            memory_kwargs: параметры CorrectionsMemory (index_path, k, min_similarity, dtype)
+        """
+        memory_kwargs.setdefault('dtype', self.index_params['dtype'])
+        self.corrections = CorrectionsMemory(self.encoder, **memory_kwargs)
+        self.corrections_db = db
+        self.corrections_weight = weight
+        if db is not None:
+            added = self.corrections.sync(db)
+            print(f"✓ Память корректировок: {len(self.corrections)} примеров (новых: {added})")
+    
+    def correction_added(self) -> None:
+        """Оператор сохранил корректировку - подхватить её при следующей классификации"""
+        if self.corrections is not None:
+            self.corrections.mark_stale()
+    
+    def enable_micro_batching(self, max_wait_ms: float = ENCODE_MICROBATCH_WAIT_MS,
+                              max_batch_size: int = ENCODE_MICROBATCH_MAX_SIZE) -> None:
+        """
+        Объединять одновременные вызовы classify_rubric из разных потоков
+        в один вызов энкодера (ожидание попутных запросов до max_wait_ms)
+        """
+        self.single_batcher = MicroBatcher(
+            lambda texts: list(self.encoder.encode(texts)),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name='rubric-encoder'
+        )
+    
+    def _category_id_for_label(self, label: str):
+        """Найти категорию по названию или id из исправления"""
+        for cat_id, cat_info in self.categories.items():
+            if cat_info['name'] == label or str(cat_id) == str(label):
+                return cat_id
+        return None
+    
+    def _rank(self, embeddings: np.ndarray, top_n: int) -> List[List[Tuple[int, float]]]:
+        """
+        Топ категорий для эмбеддингов: поиск по индексу категорий,
+        при включённой памяти корректировок - смешанный с голосами соседей
+        """
+        ranked = self._search(embeddings, top_n)
+        if self.corrections is None or len(embeddings) == 0:
+            return ranked
+        
+        if self.corrections_db is not None:
+            self.corrections.maybe_sync(self.corrections_db)
+        votes = self.corrections.vote(embeddings)
+        
+        weight = self.corrections_weight
+        positions = {cat_id: pos for pos, cat_id in enumerate(self.index.ids)}
+        blended = []
+        for embedding, top, row_votes in zip(embeddings, ranked, votes):
+            category_votes = {}
+            for label, share in row_votes.items():
+                cat_id = self._category_id_for_label(label)
+                if cat_id is not None:
+                    category_votes[cat_id] = category_votes.get(cat_id, 0.0) + share
+            if not category_votes:
+                blended.append(top)
+                continue
+            
+            scores = dict(top)
+            missing = [cat_id for cat_id in category_votes if cat_id not in scores]
+            if missing:
+                # Сходство с описанием для категорий, которых нет в топе индекса
+                cosines = self.index.score(embedding[None, :], np.array([positions[c] for c in missing]))[0]
+                for cat_id, cosine in zip(missing, cosines):
+                    scores[cat_id] = (float(cosine) + 1) / 2
+            
+            scores = {
+                cat_id: (1 - weight) * score + weight * category_votes.get(cat_id, 0.0)
+                for cat_id, score in scores.items()
+            }
+            blended.append(sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n])
+        return blended
+    
+    def rank_embeddings(self, embeddings: np.ndarray, top_n: int = 3) -> List[List[Tuple[int, str, float]]]:
+        """
+        Топ категорий для уже посчитанных эмбеддингов (без энкодера)
+
+        Учитывает память корректировок так же, как classify_rubric / classify_batch.
+
+        Returns:
+            Для каждого эмбеддинга список (category_id, category_name, score), score 0-1
+        """
+        return [
+            [(cat_id, self.categories[cat_id]['name'], score) for cat_id, score in top]
+            for top in self._rank(np.atleast_2d(embeddings), top_n)
+        ]
+
+    def _search(self, embeddings: np.ndarray, top_n: int) -> List[List[Tuple[int, float]]]:
+        """
+        Найти top_n категорий для каждого эмбеддинга через индекс
+        
+        Returns:
+            Для каждого эмбеддинга список (category_id, score), score в диапазоне 0-1
+        """
+        if len(embeddings) == 0:
+            return []
+        scores, positions = self.index.search(embeddings, top_n)
+        # Косинусное сходство (-1..1) нормализуем в диапазон 0-1
+        scores = (scores + 1) / 2
+        return [
+            [(self.index.ids[pos], float(score)) for score, pos in zip(row_scores, row_positions) if pos >= 0]
+            for row_scores, row_positions in zip(scores, positions)
+        ]
+    
     def classify_rubric(self, rubric_name: str, top_n: int = 3, 
                        threshold: float = 0.0) -> List[Tuple[int, str, float]]:
         """
@@ -80,33 +314,26 @@ class RubricsClassifier:
             Список кортежей (category_id, category_name, confidence_score)
             Отсортирован по убыванию уверенности
         """
-        # Вычисляем эмбеддинг рубрики
-        rubric_embedding = self.model.encode(rubric_name)
+        # Вычисляем эмбеддинг рубрики (через общий батч, если включено объединение)
+        with metrics.timer('encode', rows=1):
+            if self.single_batcher is not None:
+                rubric_embedding = np.atleast_2d(self.single_batcher(rubric_name))
+            else:
+                rubric_embedding = self.encoder.encode([rubric_name])
         
-        # Сравниваем со всеми категориями
-        scores = {}
-        for cat_id, cat_embedding in self.category_embeddings.items():
-            # Косинусное сходство (значение от -1 до 1, обычно 0 до 1 для текстов)
-            similarity = cosine_similarity(
-                [rubric_embedding], 
-                [cat_embedding]
-            )[0][0]
-            # Нормализуем в диапазон 0-1
-            similarity = (similarity + 1) / 2
-            scores[cat_id] = similarity
-        
-        # Сортируем по убыванию и фильтруем по threshold
-        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        # Ищем ближайшие категории в индексе и фильтруем по threshold
+        with metrics.timer('search', rows=1):
+            ranked = self._rank(rubric_embedding, top_n)[0]
         results = [
             (cat_id, self.categories[cat_id]['name'], score)
-            for cat_id, score in sorted_scores[:top_n]
+            for cat_id, score in ranked
             if score >= threshold
         ]
         
         return results
     
     def classify_batch(self, rubrics: List[str], top_n: int = 3, 
-                      threshold: float = 0.0) -> List[Dict]:
+                      threshold: float = 0.0, show_progress: bool = True) -> List[Dict]:
         """
         Классифицирует несколько рубрик одновременно
         
@@ -114,27 +341,22 @@ class RubricsClassifier:
             rubrics: Список названий рубрик
             top_n: Топ категорий для каждой рубрики
             threshold: Минимальный скор
+            show_progress: Печатать прогресс (False - для вызовов по чанкам, см. pipeline.py)
         
         Returns:
             Список словарей с результатами классификации
         """
-        print(f"\nКлассифицирую {len(rubrics)} рубрик...")
+        if show_progress:
+            print(f"\nКлассифицирую {len(rubrics)} рубрик...")
         
-        # Вычисляем эмбеддинги для всех рубрик за раз (быстрее)
-        rubric_embeddings = self.model.encode(rubrics, show_progress_bar=True)
+        # Вычисляем эмбеддинги для всех рубрик за раз (батчи по длине текста)
+        with metrics.timer('encode', rows=len(rubrics)):
+            rubric_embeddings = self.encoder.encode(rubrics, show_progress_bar=show_progress)
+        with metrics.timer('search', rows=len(rubrics)):
+            ranked = self._rank(rubric_embeddings, top_n)
         
         results = []
-        for rubric, embedding in zip(rubrics, rubric_embeddings):
-            # Сравниваем со всеми категориями
-            scores = {}
-            for cat_id, cat_embedding in self.category_embeddings.items():
-                similarity = cosine_similarity([embedding], [cat_embedding])[0][0]
-                similarity = (similarity + 1) / 2
-                scores[cat_id] = similarity
-            
-            # Берём топ-N
-            sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-            
+        for rubric, top in zip(rubrics, ranked):
             result = {
                 'rubric': rubric,
                 'classifications': [
@@ -143,13 +365,14 @@ class RubricsClassifier:
                         'category_name': self.categories[cat_id]['name'],
                         'confidence': round(float(score), 4)
                     }
-                    for cat_id, score in sorted_scores[:top_n]
+                    for cat_id, score in top
                     if score >= threshold
                 ]
             }
             results.append(result)
         
-        print(f"✓ Классификация завершена")
+        if show_progress:
+            print(f"✓ Классификация завершена")
         return results
     
     def export_results(self, results: List[Dict], output_path: str, 
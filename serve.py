@@ -0,0 +1,216 @@
+"""
+Продакшн-запуск веб-приложения: gunicorn с несколькими воркерами
+
+Модель загружается один раз в мастере (preload_app) до fork - воркеры делят
+её память copy-on-write. Мастер следит за файлами модели (models/*.pkl,
+ONLINE_STATE_FILE) и при новой версии делает плавную перезагрузку: перечитывает
+модель и запускает новых воркеров, старые дорабатывают текущие запросы.
+
+Дообучение по корректировкам (online_learning.py) в этом режиме выполняет мастер
+раз в SERVE_MODEL_POLL_INTERVAL секунд - у модели один писатель на все процессы.
+
+Проверки: /api/health - процесс жив, /api/ready - модель обучена и БД доступна.
+
+Метрики: счётчики и гистограммы живут в памяти каждого процесса, а запрос /api/metrics
+попадает к случайному воркеру. Поэтому каждый процесс (мастер и воркеры) раз
+в METRICS_FLUSH_INTERVAL секунд пишет свои значения в SERVE_METRICS_DIR (--metrics-dir),
+и /api/metrics отдаёт суммы по всем процессам; данные других процессов отстают
+не больше чем на этот интервал. /api/microbatch - перцентили батчера по каждому воркеру.
+
+Использование:
+python serve.py                           # app_web, настройки из config.py
+python serve.py --workers 4 --threads 8 --port 8000
+python serve.py --app app_simple          # другой модуль с Flask app
+kill -HUP <pid мастера>                   # перезагрузить модель вручную
+
+Без gunicorn (Windows) - многопоточный werkzeug без debug и reloader.
+"""
+
+import gc
+import importlib
+import os
+import signal
+import threading
+from pathlib import Path
+
+import metrics
+from config import (MODELS_DIR, ONLINE_STATE_FILE, SERVE_GRACEFUL_TIMEOUT, SERVE_HOST,
+                    SERVE_METRICS_DIR, SERVE_MODEL_POLL_INTERVAL, SERVE_PORT, SERVE_THREADS,
+                    SERVE_TIMEOUT, SERVE_WORKERS)
+
+try:
+    from gunicorn.app.base import BaseApplication
+    GUNICORN_AVAILABLE = True
+except ImportError:
+    BaseApplication = object
+    GUNICORN_AVAILABLE = False
+
+
+def model_fingerprint(models_dir: str = MODELS_DIR, state_file: str = ONLINE_STATE_FILE) -> tuple:
+    """Отпечаток версии модели: время изменения и размер файлов модели"""
+    paths = sorted(Path(models_dir).glob('*.pkl')) + [Path(state_file)]
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            fingerprint.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            continue
+    return tuple(fingerprint)
+
+
+class ModelWatcher:
+    """
+    Фоновый поток: дообучение по корректировкам и отслеживание новой версии модели
+
+    При изменении файлов модели вызывает on_change (в gunicorn - SIGHUP мастеру).
+    """
+
+    def __init__(self, module, on_change, interval: float = SERVE_MODEL_POLL_INTERVAL,
+                 sync: bool = True):
+        self.module = module
+        self.on_change = on_change
+        self.interval = interval
+        self.sync = sync
+        self._stop = threading.Event()
+        self._fingerprint = model_fingerprint()
+        self._thread = None
+
+    def check(self) -> bool:
+        """Одна итерация; True - если обнаружена новая версия модели"""
+        learner = getattr(self.module, 'online_learner', None)
+        if self.sync and learner:
+            try:
+                learner.sync()
+            except Exception as e:
+                print(f"❌ Ошибка дообучения: {e}")
+        fingerprint = model_fingerprint()
+        if fingerprint == self._fingerprint:
+            return False
+        self._fingerprint = fingerprint
+        print("🔄 Обнаружена новая версия модели - перезагрузка")
+        self.on_change()
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class ServeApplication(BaseApplication):
+    """gunicorn-приложение с предзагрузкой Flask-модуля в мастере"""
+
+    def __init__(self, module_name: str, options: dict, poll_interval: float = SERVE_MODEL_POLL_INTERVAL):
+        self.module_name = module_name
+        self.options = options
+        self.poll_interval = poll_interval
+        self.module = None
+        self.watcher = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set('preload_app', True)
+        self.cfg.set('when_ready', self._when_ready)
+        self.cfg.set('on_reload', self._on_reload)
+        self.cfg.set('post_fork', self._post_fork)
+
+    def load(self):
+        if self.module is None:
+            print(f"📍 Загрузка {self.module_name} в мастере (до fork воркеров)...")
+            self.module = importlib.import_module(self.module_name)
+            if hasattr(self.module, 'online_sync_on_correction'):
+                # Воркеры только отвечают на запросы, дообучает мастер
+                self.module.online_sync_on_correction = False
+        return self.module.app
+
+    def _when_ready(self, server):
+        # Загруженные объекты - в постоянное поколение GC: сборщик в воркерах
+        # не трогает их заголовки, и страницы модели остаются общими
+        gc.freeze()
+        self.watcher = ModelWatcher(self.module, lambda: os.kill(os.getpid(), signal.SIGHUP),
+                                    self.poll_interval)
+        self.watcher.start()
+        metrics.start_flusher()
+        print(f"✅ Мастер готов (pid {os.getpid()}), воркеров: {self.cfg.workers}, потоков на воркер: {self.cfg.threads}")
+
+    def _post_fork(self, server, worker):
+        # Метрики воркера считаются с нуля и пишутся в общий каталог
+        metrics.after_fork()
+
+    def _on_reload(self, server):
+        # Вызывается в мастере по SIGHUP до запуска новых воркеров
+        if hasattr(self.module, 'reload_model'):
+            try:
+                self.module.reload_model()
+            except Exception as e:
+                print(f"❌ Ошибка перезагрузки модели: {e}")
+        gc.freeze()
+
+
+def serve(app_module: str = 'app_web', host: str = SERVE_HOST, port: int = SERVE_PORT,
+          workers: int = SERVE_WORKERS, threads: int = SERVE_THREADS, timeout: int = SERVE_TIMEOUT,
+          poll_interval: float = SERVE_MODEL_POLL_INTERVAL, pidfile: str = None,
+          metrics_dir: str = SERVE_METRICS_DIR):
+    """Запустить приложение app_module (модуль с Flask app)"""
+    if not GUNICORN_AVAILABLE:
+        return serve_threaded(app_module, host, port, poll_interval)
+
+    # До загрузки модуля в мастере: метрики предзагрузки тоже попадут в сумму
+    metrics.enable_multiprocess(metrics_dir, clear=True)
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'timeout': timeout,
+        'graceful_timeout': SERVE_GRACEFUL_TIMEOUT,
+        'accesslog': '-',
+    }
+    if pidfile:
+        options['pidfile'] = pidfile
+    ServeApplication(app_module, options, poll_interval).run()
+
+
+def serve_threaded(app_module: str, host: str, port: int, poll_interval: float):
+    """Запасной вариант без gunicorn: один процесс, потоки, без debug/reloader"""
+    from werkzeug.serving import run_simple
+
+    print("⚠️ gunicorn не установлен (pip install gunicorn) - один процесс werkzeug")
+    module = importlib.import_module(app_module)
+    # В одном процессе дообучение остаётся в обработчике корректировок
+    watcher = ModelWatcher(module, getattr(module, 'reload_model', lambda: None), poll_interval, sync=False)
+    watcher.start()
+    run_simple(host, port, module.app, threaded=True, use_reloader=False, use_debugger=False)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Продакшн-запуск веб-приложения (gunicorn)')
+    parser.add_argument('--app', default='app_web', help='Модуль с Flask app (default: app_web)')
+    parser.add_argument('--host', default=SERVE_HOST)
+    parser.add_argument('--port', type=int, default=SERVE_PORT)
+    parser.add_argument('--workers', '-w', type=int, default=SERVE_WORKERS, help='Процессов-воркеров')
+    parser.add_argument('--threads', '-t', type=int, default=SERVE_THREADS, help='Потоков на воркер')
+    parser.add_argument('--timeout', type=int, default=SERVE_TIMEOUT, help='Таймаут запроса, секунды')
+    parser.add_argument('--poll-interval', type=float, default=SERVE_MODEL_POLL_INTERVAL,
+                        help='Проверка новой версии модели, секунды (0 - выключить)')
+    parser.add_argument('--pidfile', help='Файл с pid мастера (для kill -HUP)')
+    parser.add_argument('--metrics-dir', default=SERVE_METRICS_DIR,
+                        help='Общий каталог метрик процессов (/api/metrics - сумма по воркерам)')
+    args = parser.parse_args()
+
+    serve(args.app, args.host, args.port, args.workers, args.threads, args.timeout,
+          args.poll_interval, args.pidfile, args.metrics_dir)
@@ -6,15 +6,17 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from classifier import EnhancedClassifier
+from classifier import CompanyClassifier
 from config import CATEGORIES_FILE, CLASSIFIED_OUTPUT
+from database import Database
+from loaders import read_csv
 import json
 
 class TrainingManager:
     """Менеджер обучения модели"""
     
     def __init__(self):
-        self.classifier = EnhancedClassifier()
+        self.classifier = CompanyClassifier()
         self.categories_df = None
     
     def load_categories(self, filepath: str = None) -> pd.DataFrame:
@@ -24,7 +26,7 @@ class TrainingManager:
             print(f"✗ Файл категорий не найден: {filepath}")
             return None
         
-        self.categories_df = pd.read_csv(filepath, sep=';', encoding='utf-8')
+        self.categories_df = read_csv(filepath)
         print(f"✓ Загружено {len(self.categories_df)} категорий")
         return self.categories_df
     
@@ -36,7 +38,7 @@ class TrainingManager:
         print("🔄 Подготовка обучающих данных...")
         
         try:
-            df = pd.read_csv(companies_file, encoding='utf-8')
+            df = read_csv(companies_file)
             print(f"✓ Загружено {len(df)} компаний")
             
             # Берем рубрики и названия как текст
@@ -85,7 +87,9 @@ class TrainingManager:
         print("\n🧠 Обучение модели (это может занять 1-2 минуты)...")
         
         try:
-            self.classifier.train(texts, labels)
+            # Примеры - в training_data, по ним идёт полное переобучение (online_learning.py)
+            if not self.classifier.train(texts, labels, db=Database()):
+                return False
             print("✓ Модель успешно обучена и сохранена!")
             return True
         except Exception as e:
@@ -111,7 +115,7 @@ class RubricClassifier:
     """Отдельный классификатор только для рубрик (без фирм)"""
     
     def __init__(self):
-        self.classifier = EnhancedClassifier()
+        self.classifier = CompanyClassifier()
         self.rubrics_data = None
     
     def load_rubrics(self, filepath: str = 'output/classified_companies.csv') -> pd.DataFrame:
@@ -120,7 +124,7 @@ class RubricClassifier:
             print(f"✗ Файл не найден: {filepath}")
             return None
         
-        df = pd.read_csv(filepath, encoding='utf-8')
+        df = read_csv(filepath)
         # Извлекаем уникальные рубрики
         self.rubrics_data = df[['final_category']].drop_duplicates()
         print(f"✓ Загружено {len(self.rubrics_data)} уникальных рубрик")
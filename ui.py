@@ -6,6 +6,7 @@ from colorama import Fore, Back, Style, init
 from pathlib import Path
 import pandas as pd
 from data_processor import DataProcessor
+from loaders import read_csv
 from classifier import CompanyClassifier
 from training_manager import TrainingManager, RubricClassifier
 
@@ -137,7 +138,7 @@ class CLI:
             return
         
         try:
-            df = pd.read_csv(filepath, encoding='utf-8')
+            df = read_csv(filepath)
             rubrics = df.iloc[:, 0].tolist()
             
             print(f"\n{Fore.CYAN}Классификация {len(rubrics)} рубрик...{Style.RESET_ALL}")
@@ -256,7 +257,7 @@ class CLI:
     def menu_categories(self):
         print(f"{Fore.CYAN}📋 СПРАВОЧНИК КАТЕГОРИЙ{Style.RESET_ALL}")
         try:
-            df = pd.read_csv('data/categories.csv', sep=';', encoding='utf-8')
+            df = read_csv('data/categories.csv')
             print(f"\nВсего категорий: {len(df)}\n")
             for idx, row in df.head(10).iterrows():
                 print(f"{row['№']}. {Fore.GREEN}{row['Тип']}{Style.RESET_ALL}")
@@ -0,0 +1,571 @@
+"""
+Векторные индексы для поиска ближайших категорий/примеров по эмбеддингам
+
+- FlatIndex: точный поиск (полное скалярное произведение)
+- IVFIndex: приближённый поиск (k-means разбиение на списки, просмотр nprobe ближайших)
+
+Оба индекса работают с косинусным сходством (векторы нормализуются при добавлении),
+поддерживают добавление векторов по одному/пачками и сохранение на диск.
+
+Хранение векторов (dtype):
+- float32: без потерь
+- float16: в 2 раза меньше памяти
+- int8: в 4 раза меньше, с масштабом на каждый вектор (v ≈ codes * scale)
+
+Бенчмарк полноты и задержки:
+python vector_index.py --n 100000 --dim 384
+
+Отчёт точность/память квантования на своих категориях:
+python vector_index.py --quant-report data/categories.csv [--rubrics rubrics.txt]
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Привести векторы к единичной длине (для косинусного сходства)"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+# Сколько строк матрицы распаковывать за раз при скоринге квантованных векторов
+SCORE_BLOCK_ROWS = 16384
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Квантовать нормализованные векторы
+
+    Returns:
+        (codes, scales); scales только для int8 - масштаб каждой строки (max|v| / 127)
+    """
+    if dtype == 'float32':
+        return vectors.astype(np.float32), None
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    if dtype == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Неизвестный тип хранения: {dtype} (доступны: {', '.join(STORAGE_DTYPES)})")
+
+
+def quantized_scores(queries: np.ndarray, codes: np.ndarray,
+                     scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Скалярные произведения запросов (float32) с квантованной матрицей
+
+    Матрица распаковывается блоками по SCORE_BLOCK_ROWS строк, полная float32-копия
+    не создаётся. Для int8 масштаб применяется к результату, а не к матрице.
+    """
+    if codes.dtype == np.float32:
+        return queries @ codes.T
+
+    scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+    for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+        block = codes[start:start + SCORE_BLOCK_ROWS]
+        scores[:, start:start + len(block)] = queries @ block.T.astype(np.float32)
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Топ-k по строкам без полной сортировки (argpartition + сортировка только k)
+
+    Returns:
+        (scores, positions) формы (n_rows, k); недостающие позиции - -1 / -inf
+    """
+    n_rows, n_cols = scores.shape
+    k_eff = min(k, n_cols)
+
+    out_dtype = scores.dtype if np.issubdtype(scores.dtype, np.floating) else np.float32
+    out_scores = np.full((n_rows, k), -np.inf, dtype=out_dtype)
+    out_positions = np.full((n_rows, k), -1, dtype=np.int64)
+    if k_eff == 0:
+        return out_scores, out_positions
+
+    if k_eff < n_cols:
+        part = np.argpartition(-scores, k_eff - 1, axis=1)[:, :k_eff]
+    else:
+        part = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+
+    out_positions[:, :k_eff] = np.take_along_axis(part, order, axis=1)
+    out_scores[:, :k_eff] = np.take_along_axis(part_scores, order, axis=1)
+    return out_scores, out_positions
+
+
+class FlatIndex:
+    """Точный индекс: сравнение запроса со всеми векторами"""
+
+    kind = 'flat'
+
+    def __init__(self, dim: int, dtype: str = 'float32'):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Неизвестный тип хранения: {dtype} (доступны: {', '.join(STORAGE_DTYPES)})")
+        self.dim = dim
+        self.dtype = dtype
+        # Буферы с запасом ёмкости: add дописывает в них, а не копирует всю матрицу
+        self._codes, self._scales = quantize(np.empty((0, dim), dtype=np.float32), dtype)
+        self._size = 0
+        self.ids: List = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Коды векторов (вид на заполненную часть буфера)"""
+        return self._codes[:self._size]
+
+    @vectors.setter
+    def vectors(self, codes: np.ndarray) -> None:
+        self._codes = codes
+        self._size = len(codes)
+
+    @property
+    def scales(self) -> Optional[np.ndarray]:
+        """Масштабы строк для int8, иначе None"""
+        return self._scales[:self._size] if self._scales is not None else None
+
+    @scales.setter
+    def scales(self, scales: Optional[np.ndarray]) -> None:
+        self._scales = scales
+
+    def _reserve(self, size: int) -> None:
+        """Ёмкость буферов не меньше size; растёт вдвое - добавление по одному за O(1) в среднем"""
+        capacity = len(self._codes)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        codes = np.empty((capacity, self.dim), dtype=self._codes.dtype)
+        codes[:self._size] = self._codes[:self._size]
+        self._codes = codes
+        if self._scales is not None:
+            scales = np.empty(capacity, dtype=self._scales.dtype)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+    @property
+    def memory_bytes(self) -> int:
+        """Память под векторы (и масштабы для int8)"""
+        return self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def add(self, vectors: np.ndarray, ids: Sequence) -> None:
+        """Добавить векторы с их идентификаторами"""
+        vectors = _normalize(vectors)
+        if len(vectors) != len(ids):
+            raise ValueError(f"Векторов {len(vectors)}, идентификаторов {len(ids)}")
+        codes, scales = quantize(vectors, self.dtype)
+        start, end = self._size, self._size + len(codes)
+        self._reserve(end)
+        self._codes[start:end] = codes
+        if scales is not None:
+            self._scales[start:end] = scales
+        self._size = end
+        self.ids.extend(ids)
+
+    def decode(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Векторы в float32 (все или по позициям)"""
+        codes = self.vectors if positions is None else self.vectors[positions]
+        vectors = codes.astype(np.float32)
+        if self.scales is not None:
+            scales = self.scales if positions is None else self.scales[positions]
+            vectors *= scales[:, None]
+        return vectors
+
+    def _codes_at(self, positions: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Коды и масштабы векторов по позициям"""
+        scales = self.scales[positions] if self.scales is not None else None
+        return self.vectors[positions], scales
+
+    def score(self, queries: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Косинусное сходство запросов со всеми векторами или с векторами по позициям"""
+        queries = _normalize(queries)
+        if positions is None:
+            return quantized_scores(queries, self.vectors, self.scales)
+        return quantized_scores(queries, *self._codes_at(positions))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти k ближайших векторов для каждого запроса
+
+        Returns:
+            (scores, positions) формы (n_queries, k); косинусное сходство и
+            позиции в self.ids, -1 если векторов меньше k
+        """
+        return top_k(self.score(queries), k)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {'vectors': self.vectors}
+        if self.scales is not None:
+            arrays['scales'] = self.scales
+        return arrays
+
+    def _restore(self, arrays, meta: Dict) -> None:
+        self.vectors = arrays['vectors']
+        self.scales = arrays['scales'] if 'scales' in arrays else None
+
+    def save(self, path: str) -> str:
+        """Сохранить индекс в .npz"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {'kind': self.kind, 'dim': self.dim, 'dtype': self.dtype, 'ids': self.ids, **self._meta()}
+        with open(path, 'wb') as f:
+            # id категорий могут прийти из pandas как numpy-скаляры
+            meta_json = json.dumps(meta, ensure_ascii=False,
+                                   default=lambda v: v.item() if hasattr(v, 'item') else str(v))
+            np.savez(f, meta=np.array(meta_json), **self._arrays())
+        return str(path)
+
+    def _meta(self) -> Dict:
+        return {}
+
+
+class IVFIndex(FlatIndex):
+    """
+    Приближённый индекс IVF (inverted file) на numpy
+
+    Векторы раскладываются по nlist кластерам (k-means), запрос просматривает
+    только nprobe ближайших кластеров. Пока векторов меньше min_train_size,
+    индекс не обучен и ищет точно, как FlatIndex.
+
+    Векторы хранятся сгруппированными по спискам (каждый список - срез матрицы,
+    без копирования при поиске), поэтому порядок ids меняется при обучении и
+    после накопления добавлений; позиции из search всегда указывают в текущий ids.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, dim: int, dtype: str = 'float32', nlist: Optional[int] = None, nprobe: int = 8,
+                 min_train_size: int = 1024, n_iter: int = 20, seed: int = 42):
+        super().__init__(dim, dtype)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.empty(0, dtype=np.int64)
+        self._lists: Optional[List[Tuple[int, int, np.ndarray]]] = None
+        self._grouped = 0  # первые _grouped векторов упорядочены по спискам
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, nlist: Optional[int] = None) -> None:
+        """Обучить k-means по всем текущим векторам и перераспределить их по спискам"""
+        n = len(self.vectors)
+        nlist = nlist or self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        rng = np.random.default_rng(self.seed)
+        # Обучаем на подвыборке - для центроидов хватает ~256 точек на кластер
+        sample_size = min(n, nlist * 256)
+        sample = self.decode(rng.choice(n, sample_size, replace=False))
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self.assignments = np.concatenate([
+            self._assign(self.decode(np.arange(start, min(start + SCORE_BLOCK_ROWS, n))))
+            for start in range(0, n, SCORE_BLOCK_ROWS)
+        ])
+        self._lists = None
+        self._group()
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int64)
+
+    def add(self, vectors: np.ndarray, ids: Sequence) -> None:
+        """Добавить векторы; новые попадают в ближайший кластер без переобучения"""
+        vectors = _normalize(vectors)
+        super().add(vectors, ids)
+
+        if self.is_trained:
+            self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+            self._lists = None
+        elif len(self.vectors) >= self.min_train_size:
+            self.train()
+
+    def _group(self) -> None:
+        """Переставить векторы, масштабы, ids и назначения так, чтобы списки шли подряд"""
+        order = np.argsort(self.assignments, kind='stable')
+        self.vectors = self.vectors[order]
+        if self.scales is not None:
+            self.scales = self.scales[order]
+        self.ids = [self.ids[i] for i in order]
+        self.assignments = self.assignments[order]
+        self._grouped = len(self.ids)
+
+    def _inverted_lists(self) -> List[Tuple[int, int, np.ndarray]]:
+        """
+        Для каждого списка: (начало, конец) среза сгруппированной части и позиции
+        векторов, добавленных после группировки. Хвост больше 1/8 индекса -
+        перегруппировка (амортизированно O(1) на добавленный вектор)
+        """
+        if self._lists is None:
+            if len(self.ids) - self._grouped > self._grouped // 8:
+                self._group()
+            bounds = np.searchsorted(self.assignments[:self._grouped], np.arange(self.nlist + 1))
+            tail = self._grouped + np.argsort(self.assignments[self._grouped:], kind='stable')
+            tail_bounds = np.searchsorted(self.assignments[tail], np.arange(self.nlist + 1))
+            self._lists = [(bounds[c], bounds[c + 1], tail[tail_bounds[c]:tail_bounds[c + 1]])
+                           for c in range(self.nlist)]
+        return self._lists
+
+    def _list_scores(self, queries: np.ndarray, entry: Tuple[int, int, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Сходство запросов со списком: (scores, позиции векторов списка)"""
+        start, end, tail = entry
+        scales = self.scales[start:end] if self.scales is not None else None
+        scores = quantized_scores(queries, self.vectors[start:end], scales)
+        positions = np.arange(start, end)
+        if len(tail):
+            scores = np.hstack([scores, quantized_scores(queries, *self._codes_at(tail))])
+            positions = np.concatenate([positions, tail])
+        return scores, positions
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.is_trained:
+            return super().search(queries, k)
+
+        queries = _normalize(queries)
+        lists = self._inverted_lists()
+        nprobe = min(self.nprobe, self.nlist)
+        _, probes = top_k(queries @ self.centroids.T, nprobe)
+
+        # Запросы группируются по просматриваемому списку: один матричный скоринг
+        # на список для всех запросов, которые его просматривают. Топ-k каждого
+        # списка ложится в свой слот (номер списка среди nprobe запроса), итог -
+        # один топ-k по nprobe * k кандидатам
+        cand_scores = np.full((len(queries), nprobe, k), -np.inf, dtype=np.float32)
+        cand_positions = np.full((len(queries), nprobe, k), -1, dtype=np.int64)
+        probed = probes.ravel()
+        order = np.argsort(probed, kind='stable')
+        query_rows, slots = np.divmod(order, nprobe)
+        bounds = np.searchsorted(probed[order], np.arange(self.nlist + 1))
+        for c in np.flatnonzero(np.diff(bounds)):
+            rows, row_slots = query_rows[bounds[c]:bounds[c + 1]], slots[bounds[c]:bounds[c + 1]]
+            scores, members = self._list_scores(queries[rows], lists[c])
+            if len(members) > k:
+                # Лучшие k списка без сортировки - порядок наведёт итоговый top_k
+                local = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, local, axis=1)
+            else:
+                local = np.broadcast_to(np.arange(len(members)), scores.shape)
+            width = scores.shape[1]
+            cand_scores[rows[:, None], row_slots[:, None], np.arange(width)] = scores
+            cand_positions[rows[:, None], row_slots[:, None], np.arange(width)] = members[local]
+
+        cand_scores = cand_scores.reshape(len(queries), -1)
+        out_scores, best = top_k(cand_scores, k)
+        out_positions = np.take_along_axis(cand_positions.reshape(len(queries), -1), np.maximum(best, 0), axis=1)
+        out_positions[~np.isfinite(out_scores)] = -1
+        return out_scores, out_positions
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {**super()._arrays(), 'assignments': self.assignments}
+        if self.is_trained:
+            arrays['centroids'] = self.centroids
+        return arrays
+
+    def _meta(self) -> Dict:
+        return {'nlist': self.nlist, 'nprobe': self.nprobe,
+                'min_train_size': self.min_train_size, 'n_iter': self.n_iter, 'seed': self.seed}
+
+    def _restore(self, arrays, meta: Dict) -> None:
+        super()._restore(arrays, meta)
+        self.assignments = arrays['assignments'].astype(np.int64)
+        self.centroids = arrays['centroids'] if 'centroids' in arrays else None
+        self._lists = None
+        self._grouped = 0
+
+
+INDEX_TYPES = {
+    FlatIndex.kind: FlatIndex,
+    IVFIndex.kind: IVFIndex,
+}
+
+
+def create_index(kind: str, dim: int, **kwargs) -> FlatIndex:
+    """Создать индекс по названию типа ('flat' или 'ivf')"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Неизвестный тип индекса: {kind} (доступны: {', '.join(INDEX_TYPES)})")
+    return INDEX_TYPES[kind](dim, **kwargs)
+
+
+def load_index(path: str) -> FlatIndex:
+    """Загрузить индекс, сохранённый через save()"""
+    with np.load(path, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays['meta']))
+        params = {key: meta[key] for key in ('dtype', 'nlist', 'nprobe', 'min_train_size', 'n_iter', 'seed')
+                  if key in meta}
+        index = create_index(meta['kind'], meta['dim'], **params)
+        index.ids = list(meta['ids'])
+        index._restore(arrays, meta)
+    return index
+
+
+# ======================= БЕНЧМАРК =======================
+
+def benchmark(n: int = 100000, dim: int = 384, n_queries: int = 200, k: int = 10,
+              nprobes: Sequence[int] = (1, 4, 8, 16, 32), seed: int = 42) -> Dict:
+    """
+    Сравнить IVFIndex с точным FlatIndex на синтетических кластеризованных данных
+
+    Returns:
+        словарь с временем построения, задержкой на запрос (мс) и полнотой recall@k
+    """
+    rng = np.random.default_rng(seed)
+    # Данные с кластерной структурой, как у эмбеддингов рубрик
+    centers = rng.normal(size=(max(1, n // 100), dim)).astype(np.float32)
+    data = centers[rng.integers(len(centers), size=n)] + 2 * rng.normal(size=(n, dim)).astype(np.float32)
+    queries = data[rng.choice(n, n_queries, replace=False)] + 0.5 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    ids = list(range(n))
+
+    report = {'n': n, 'dim': dim, 'n_queries': n_queries, 'k': k}
+
+    start = time.perf_counter()
+    flat = FlatIndex(dim)
+    flat.add(data, ids)
+    report['flat_build_s'] = round(time.perf_counter() - start, 4)
+
+    start = time.perf_counter()
+    _, exact = flat.search(queries, k)
+    report['flat_ms_per_query'] = round((time.perf_counter() - start) * 1000 / n_queries, 4)
+
+    start = time.perf_counter()
+    ivf = IVFIndex(dim)
+    ivf.add(data, ids)
+    report['ivf_build_s'] = round(time.perf_counter() - start, 4)
+    report['ivf_nlist'] = ivf.nlist
+
+    report['ivf'] = []
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        start = time.perf_counter()
+        _, approx = ivf.search(queries, k)
+        elapsed = time.perf_counter() - start
+        # IVF хранит векторы по спискам - сравниваются ids, а не позиции
+        approx_ids = [{ivf.ids[p] for p in row if p >= 0} for row in approx]
+        recall = np.mean([len(a & set(e)) / k for a, e in zip(approx_ids, exact)])
+        report['ivf'].append({
+            'nprobe': nprobe,
+            'ms_per_query': round(elapsed * 1000 / n_queries, 4),
+            'recall_at_k': round(float(recall), 4),
+        })
+
+    return report
+
+
+def quantization_report(vectors: np.ndarray, queries: np.ndarray, k: int = 3) -> List[Dict]:
+    """
+    Точность и память FlatIndex при разных типах хранения относительно float32
+
+    Args:
+        vectors: векторы индекса (например, эмбеддинги категорий)
+        queries: эмбеддинги запросов (например, рубрик)
+        k: глубина сравнения топа
+
+    Returns:
+        по строке на dtype: память, совпадение топ-1, recall@k, ошибка скора
+    """
+    ids = list(range(len(vectors)))
+    reference = FlatIndex(vectors.shape[1])
+    reference.add(vectors, ids)
+    ref_scores, ref_top = reference.search(queries, k)
+    exact = reference.score(queries)
+
+    rows = []
+    for dtype in STORAGE_DTYPES:
+        index = FlatIndex(vectors.shape[1], dtype=dtype)
+        index.add(vectors, ids)
+        _, top = index.search(queries, k)
+        rows.append({
+            'dtype': dtype,
+            'memory_bytes': index.memory_bytes,
+            'memory_ratio': round(index.memory_bytes / reference.memory_bytes, 4),
+            'top1_agreement': round(float(np.mean(top[:, 0] == ref_top[:, 0])), 4),
+            'recall_at_k': round(float(np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(top, ref_top)])), 4),
+            'max_score_error': round(float(np.abs(index.score(queries) - exact).max()), 6),
+        })
+    return rows
+
+
+def _categories_quantization_report(categories_file: str, rubrics_file: Optional[str], k: int) -> List[Dict]:
+    """Отчёт квантования на категориях из CSV (запросы - рубрики или названия категорий)"""
+    from loaders import read_csv
+    from rubrics_classifier import RubricsClassifier, prepare_categories_from_dict
+
+    categories = prepare_categories_from_dict(read_csv(categories_file).to_dict('records'))
+    classifier = RubricsClassifier()
+    classifier.load_categories(categories)
+    vectors = np.array(list(classifier.category_embeddings.values()))
+
+    if rubrics_file:
+        with open(rubrics_file, 'r', encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        # Без рубрик - запросами служат названия категорий без описаний
+        texts = [str(cat['name']) for cat in categories]
+    queries = np.atleast_2d(classifier.model.encode(texts))
+    return quantization_report(vectors, queries, k)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Бенчмарк векторных индексов (recall/latency)')
+    parser.add_argument('--n', type=int, default=100000, help='Количество векторов')
+    parser.add_argument('--dim', type=int, default=384, help='Размерность')
+    parser.add_argument('--queries', type=int, default=200, help='Количество запросов')
+    parser.add_argument('--k', type=int, default=10, help='Сколько соседей искать')
+    parser.add_argument('--output', '-o', help='Сохранить результаты в JSON')
+    parser.add_argument('--quant-report', metavar='CATEGORIES_CSV',
+                        help='Отчёт точность/память float32/float16/int8 на категориях')
+    parser.add_argument('--rubrics', help='Рубрики (TXT) как запросы для --quant-report')
+    args = parser.parse_args()
+
+    if args.quant_report:
+        print(f"🔄 Отчёт квантования на {args.quant_report}")
+        rows = _categories_quantization_report(args.quant_report, args.rubrics, min(args.k, 3))
+        print(f"\n{'dtype':8} {'память, байт':>14} {'доля':>6} {'топ-1':>7} {'recall@k':>9} {'макс. ошибка':>13}")
+        for row in rows:
+            print(f"{row['dtype']:8} {row['memory_bytes']:14} {row['memory_ratio']:6.2f} "
+                  f"{row['top1_agreement']:7.3f} {row['recall_at_k']:9.3f} {row['max_score_error']:13.6f}")
+        report = rows
+    else:
+        print(f"🔄 Бенчмарк: {args.n} векторов, dim={args.dim}, {args.queries} запросов, k={args.k}")
+        report = benchmark(args.n, args.dim, args.queries, args.k)
+
+        print(f"\nFlat: построение {report['flat_build_s']} с, {report['flat_ms_per_query']} мс/запрос")
+        print(f"IVF (nlist={report['ivf_nlist']}): построение {report['ivf_build_s']} с")
+        for row in report['ivf']:
+            print(f"  nprobe={row['nprobe']:3}  {row['ms_per_query']:8} мс/запрос  recall@{args.k}={row['recall_at_k']:.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Результаты сохранены в {args.output}")
@@ -0,0 +1,153 @@
+"""
+Тёплый старт RubricsClassifier
+
+Артефакт в WARM_START_DIR:
+- model/          локальная копия модели (загрузка без сети)
+- index.npz       закодированные категории (индекс, см. vector_index.py)
+- manifest.json   модель, бэкенд, тип хранения и хэши категорий
+
+Если категории и модель не менялись, классификатор поднимается без вызова
+encode на категориях и без обращения к HuggingFace.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import WARM_START_DIR
+from vector_index import load_index
+
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'index.npz'
+MODEL_SUBDIR = 'model'
+
+
+def file_hash(filepath: str) -> str:
+    """sha256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def categories_hash(categories: Dict) -> str:
+    """sha256 категорий в том виде, в котором они кодируются (id + текст)"""
+    payload = json.dumps([[str(cat_id), cat['combined']] for cat_id, cat in categories.items()],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def read_manifest(warm_start_dir: str = WARM_START_DIR) -> Optional[Dict]:
+    """Прочитать manifest.json артефакта (None, если артефакта нет)"""
+    path = Path(warm_start_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except Exception as e:
+        print(f"⚠️ Ошибка чтения {path}: {e}")
+        return None
+
+
+def resolve_model_path(model_name: str, warm_start_dir: str = WARM_START_DIR) -> Optional[str]:
+    """
+    Локальный путь к модели из артефакта, если он есть для этой модели
+
+    При найденном пути включается офлайн-режим HuggingFace.
+    """
+    manifest = read_manifest(warm_start_dir)
+    if not manifest or manifest.get('model_name') != model_name:
+        return None
+    model_path = manifest.get('model_path')
+    if not model_path or not Path(model_path).exists():
+        return None
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+    return model_path
+
+
+def _artifact_key(classifier, source_file: Optional[str]) -> Dict:
+    key = {
+        'model_name': classifier.model_name,
+        'backend': classifier.backend,
+        'embedding_dtype': classifier.index_params.get('dtype'),
+        'index_type': classifier.index_type,
+        'categories_hash': categories_hash(classifier.categories),
+    }
+    if source_file and Path(source_file).exists():
+        key['categories_file_hash'] = file_hash(source_file)
+    return key
+
+
+def restore(classifier, source_file: Optional[str] = None,
+            warm_start_dir: str = WARM_START_DIR) -> bool:
+    """
+    Восстановить индекс категорий из артефакта, если он актуален
+
+    classifier.categories должны быть уже заполнены (без эмбеддингов).
+
+    Returns:
+        True, если индекс загружен и кодировать категории не нужно
+    """
+    manifest = read_manifest(warm_start_dir)
+    if not manifest:
+        return False
+
+    key = _artifact_key(classifier, source_file)
+    if any(manifest.get(name) != value for name, value in key.items()):
+        return False
+
+    try:
+        index = load_index(str(Path(warm_start_dir) / INDEX_FILE))
+    except Exception as e:
+        print(f"⚠️ Ошибка загрузки тёплого старта: {e}")
+        return False
+    if len(index) != len(classifier.categories):
+        return False
+
+    # IVF хранит векторы сгруппированными по спискам, поэтому сопоставляем по ids, а не по порядку
+    embeddings = index.decode()
+    positions = {cat_id: pos for pos, cat_id in enumerate(index.ids)}
+    try:
+        category_embeddings = {cat_id: embeddings[positions[cat_id]] for cat_id in classifier.categories}
+    except KeyError:
+        return False
+
+    classifier.index = index
+    classifier.category_embeddings = category_embeddings
+    return True
+
+
+def save(classifier, source_file: Optional[str] = None,
+         warm_start_dir: str = WARM_START_DIR) -> str:
+    """
+    Сохранить артефакт: индекс категорий, локальную копию модели и manifest
+
+    Returns:
+        путь к папке артефакта
+    """
+    warm_start_dir = Path(warm_start_dir)
+    warm_start_dir.mkdir(parents=True, exist_ok=True)
+
+    model_path = getattr(classifier, 'model_path', None)
+    if classifier.backend == 'torch' and not (model_path and Path(model_path).exists()):
+        # Первая загрузка была по имени из HuggingFace - сохраняем копию для офлайн-режима
+        model_path = str(warm_start_dir / MODEL_SUBDIR)
+        classifier.model.save(model_path)
+
+    classifier.index.save(str(warm_start_dir / INDEX_FILE))
+
+    manifest = {
+        **_artifact_key(classifier, source_file),
+        'model_path': model_path,
+        'categories_file': str(source_file) if source_file else None,
+        'categories_count': len(classifier.categories),
+        'created_at': datetime.now().isoformat(),
+    }
+    (warm_start_dir / MANIFEST_FILE).write_text(json.dumps(manifest, ensure_ascii=False, indent=2),
+                                                encoding='utf-8')
+    return str(warm_start_dir)